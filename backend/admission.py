@@ -0,0 +1,338 @@
+"""
+Rate Limiting and Admission Control
+Per-client token buckets and a bounded admission queue, in process
+
+Requests pass two gates before reaching the application:
+
+1. Rate limit: one token bucket per client (an X-API-Key listed in
+   RATE_LIMIT_API_KEYS, else the peer address). Unknown keys are ignored,
+   so sending a new key with every request neither escapes the limit nor
+   pushes other clients out of the bucket table. An empty bucket answers
+   429 with Retry-After.
+2. Admission: at most ADMISSION_MAX_IN_FLIGHT requests are inside the
+   application at once. Later ones wait, in arrival order, in a queue of
+   ADMISSION_QUEUE_SIZE; a full queue or a wait longer than
+   ADMISSION_QUEUE_TIMEOUT answers 503 with Retry-After.
+
+Symptom reports that trigger a red flag skip both: when a request would
+be limited or queued, its body is decoded and checked against the red
+flag rules first, and emergencies are admitted straight away. Session
+requests are checked against the session they change. The body is only
+inspected on that slow path, and no more than MAX_INSPECTED_BODY_BYTES
+of it is read ahead of the application.
+
+AI work is shed before anything else: once the application is busy
+(`shedding`), enriched analyses are returned without an enrichment job and
+streams end after the triage event.
+
+All limits are per process; under serve.py each worker applies its own.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, FrozenSet, Optional, Tuple
+
+from pydantic import ValidationError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from analysis import red_flag_rule
+from metrics import ADMISSION_TOTAL
+from models import SessionUpdate, SymptomDataRequest
+from records import decode_record, record_from_request
+from sessions import SESSIONS
+
+# Requests per second each client may sustain; 0 turns rate limiting off
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+# Buckets kept; the least recently seen clients are forgotten first
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+# Comma-separated API keys that get a bucket of their own
+RATE_LIMIT_API_KEYS = frozenset(
+    key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()
+)
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "256"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "1024"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0"))
+# Share of ADMISSION_MAX_IN_FLIGHT above which AI work is shed
+ADMISSION_AI_SHED_RATIO = float(os.getenv("ADMISSION_AI_SHED_RATIO", "0.75"))
+
+# Only these paths are limited; health checks and metrics always answer
+LIMITED_PATH_PREFIX = "/api/"
+# Paths whose body is a single SymptomDataRequest
+TRIAGE_PATHS = frozenset({"/api/analyze", "/api/analyze/enriched", "/api/analyze/stream"})
+# Session creation, updates and submits; bodies are SessionUpdates
+SESSION_PATH_PREFIX = "/api/sessions"
+# Larger bodies are never inspected for red flags
+MAX_INSPECTED_BODY_BYTES = 64 * 1024
+
+
+class RateLimiter:
+    """Token bucket per client: `rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate: float = RATE_LIMIT_RPS, burst: float = RATE_LIMIT_BURST,
+                 max_clients: int = RATE_LIMIT_MAX_CLIENTS, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_clients = max_clients
+        self._clock = clock
+        # client -> (tokens, time they were counted)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, client: str) -> float:
+        """Take a token; 0.0 if one was available, else seconds until the next one"""
+        now = self._clock()
+        tokens, counted_at = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - counted_at) * self.rate)
+        wait = 0.0
+        if tokens >= 1.0:
+            tokens -= 1.0
+        else:
+            wait = (1.0 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class Overloaded(Exception):
+    """No admission slot within the queue limits"""
+
+
+class AdmissionController:
+    """
+    Counts requests inside the application and queues the overflow
+
+    A released slot is handed directly to the oldest waiter, so queued
+    requests are admitted in arrival order.
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+                 max_queue: int = ADMISSION_QUEUE_SIZE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 ai_shed_ratio: float = ADMISSION_AI_SHED_RATIO):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.ai_shed_at = max(1, int(max_in_flight * ai_shed_ratio))
+        self.in_flight = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def shedding(self) -> bool:
+        """True when optional AI work should be skipped"""
+        return self.in_flight >= self.ai_shed_at or bool(self._waiters)
+
+    def try_admit(self) -> bool:
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+        return False
+
+    def admit_priority(self) -> None:
+        """Admit regardless of load; used for emergencies"""
+        self.in_flight += 1
+
+    async def wait(self) -> None:
+        """
+        Queue for a slot
+
+        Raises:
+            Overloaded: if the queue is full or no slot frees up in time
+        """
+        if len(self._waiters) >= self.max_queue:
+            raise Overloaded("admission queue is full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            raise Overloaded("timed out waiting for admission") from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as the client went away
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+
+    def _discard(self, waiter: "asyncio.Future[None]") -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        # Slots taken by emergencies above the limit are not handed on
+        if self.in_flight <= self.max_in_flight:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    # The slot passes straight to the waiter; in_flight is unchanged
+                    waiter.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait before retrying"""
+        return max(1, math.ceil(self.queue_timeout))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inFlight": self.in_flight,
+            "queued": self.queued,
+            "maxInFlight": self.max_in_flight,
+            "maxQueue": self.max_queue,
+            "shedding": self.shedding,
+        }
+
+
+def client_id(scope: Scope, api_keys: FrozenSet[str] = RATE_LIMIT_API_KEYS) -> str:
+    """The rate limit bucket of a request: its API key if that is a known one, else its peer address"""
+    if api_keys:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-api-key":
+                key = value.decode("latin-1")
+                if key in api_keys:
+                    return "key:" + key
+                break
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+async def _read_body(receive: Receive, limit: int = MAX_INSPECTED_BODY_BYTES) -> Tuple[bytes, bool, Optional[Message]]:
+    """
+    The start of the request body: (body read, whether that is all of it,
+    the disconnect message that cut it short)
+
+    Reading stops once more than `limit` bytes have arrived; the rest is
+    left to the application.
+    """
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            return b"".join(chunks), False, message
+        body = message.get("body", b"")
+        chunks.append(body)
+        size += len(body)
+        if not message.get("more_body", False):
+            return b"".join(chunks), True, None
+        if size > limit:
+            return b"".join(chunks), False, None
+
+
+def _replay(body: bytes, complete: bool, disconnect: Optional[Message], receive: Receive) -> Receive:
+    """A receive callable that yields the already-read body first, then the rest of the stream"""
+    pending = [disconnect or {"type": "http.request", "body": body, "more_body": not complete}]
+
+    async def replay_receive() -> Message:
+        if pending:
+            return pending.pop()
+        return await receive()
+
+    return replay_receive
+
+
+def _is_session_path(path: str) -> bool:
+    return path == SESSION_PATH_PREFIX or path.startswith(SESSION_PATH_PREFIX + "/")
+
+
+def _is_emergency(path: str, body: bytes) -> bool:
+    """True if the symptom report, or the session after this request, has a red flag"""
+    try:
+        if path in TRIAGE_PATHS:
+            record = decode_record(body) or record_from_request(SymptomDataRequest.model_validate_json(body))
+            return red_flag_rule(record) is not None
+        session_id, _, action = path[len(SESSION_PATH_PREFIX):].strip("/").partition("/")
+        # A submit (or any other action) leaves the session as it is
+        update = SessionUpdate.model_validate_json(body) if body and not action else SessionUpdate()
+    except ValidationError:
+        return False
+    return SESSIONS.would_be_emergency(session_id or None, update)
+
+
+async def _reject(send: Send, status: int, detail: str, retry_after: int) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(retry_after).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying RateLimiter and AdmissionController to /api/ requests"""
+
+    def __init__(self, app: ASGIApp, limiter: "RateLimiter", controller: AdmissionController):
+        self.app = app
+        self.limiter = limiter
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(LIMITED_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        controller = self.controller
+        rate_wait = self.limiter.acquire(client_id(scope)) if self.limiter.enabled else 0.0
+        if not rate_wait and controller.try_admit():
+            ADMISSION_TOTAL.inc("admitted")
+            await self._run(scope, receive, send)
+            return
+
+        # Slow path: limited or queued, unless this is an emergency
+        emergency = False
+        path = scope["path"]
+        if scope["method"] in ("POST", "PATCH") and (path in TRIAGE_PATHS or _is_session_path(path)):
+            body, complete, disconnect = await _read_body(receive)
+            receive = _replay(body, complete, disconnect, receive)
+            emergency = complete and len(body) <= MAX_INSPECTED_BODY_BYTES and _is_emergency(path, body)
+        if emergency:
+            ADMISSION_TOTAL.inc("priority")
+            controller.admit_priority()
+            await self._run(scope, receive, send)
+            return
+
+        if rate_wait:
+            ADMISSION_TOTAL.inc("rate_limited")
+            await _reject(send, 429, "Rate limit exceeded", max(1, math.ceil(rate_wait)))
+            return
+
+        try:
+            await controller.wait()
+        except Overloaded as e:
+            ADMISSION_TOTAL.inc("shed")
+            await _reject(send, 503, f"Server busy: {e}", controller.retry_after())
+            return
+        ADMISSION_TOTAL.inc("queued")
+        await self._run(scope, receive, send)
+
+    async def _run(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+
+RATE_LIMITER = RateLimiter()
+ADMISSION = AdmissionController()
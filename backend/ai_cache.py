@@ -0,0 +1,195 @@
+"""
+AI Response Cache
+Persistent, size-bounded cache of validated AI responses
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+# Next to this module by default, whatever the working directory
+AI_RESPONSE_CACHE_PATH = os.getenv(
+    "AI_RESPONSE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_response_cache.db"),
+)
+AI_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("AI_RESPONSE_CACHE_MAX_ENTRIES", "50000"))
+AI_RESPONSE_CACHE_MAX_BYTES = int(os.getenv("AI_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Puts between eviction passes; each pass scans the whole table
+AI_RESPONSE_CACHE_EVICT_EVERY = int(os.getenv("AI_RESPONSE_CACHE_EVICT_EVERY", "64"))
+# A hit refreshes an entry's last access at most this often
+AI_RESPONSE_CACHE_TOUCH_SECONDS = float(os.getenv("AI_RESPONSE_CACHE_TOUCH_SECONDS", "60"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return " ".join(prompt.split())
+
+
+def response_cache_key(prompt: str, provider: str, safety_prompt_version: str) -> str:
+    """Cache key: hash of the normalized prompt, provider and safety prompt version"""
+    material = f"{provider}\x00{safety_prompt_version}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class SQLiteResponseCache:
+    """
+    AI response cache stored in a single SQLite file
+
+    Entries are evicted least-recently-used first once either max_entries
+    or max_bytes (total size of the stored JSON) is exceeded. Totals take a
+    full table scan, so limits are checked every evict_every puts rather
+    than on each one, and the cache may run up to evict_every - 1 entries
+    over them in between. A hit only writes its new access time when the
+    stored one is more than touch_seconds old, so most reads do not write;
+    LRU order is kept to that resolution. The database runs in WAL mode so
+    several worker processes can share one file. Every call blocks; async
+    code makes them in a worker thread.
+    """
+
+    def __init__(self, path: str, max_entries: int = AI_RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = AI_RESPONSE_CACHE_MAX_BYTES,
+                 evict_every: int = AI_RESPONSE_CACHE_EVICT_EVERY,
+                 touch_seconds: float = AI_RESPONSE_CACHE_TOUCH_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = max(1, evict_every)
+        self.touch_seconds = touch_seconds
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        self._connect()
+        _OPEN_CACHES.add(self)
+
+    def _connect(self) -> None:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " provider TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._count_entries()
+
+    def _count_entries(self) -> None:
+        # Full table scan: only on connect and in eviction passes
+        self._entries, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+    def _reopen_after_fork(self) -> None:
+        # SQLite connections must not be used across fork(); the child
+        # keeps the inherited handle unclosed and opens its own
+        _INHERITED_CONNECTIONS.append(self._conn)
+        self._lock = threading.Lock()
+        self._connect()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, last_access FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[1] >= self.touch_seconds:
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+                )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, provider: str, response: Dict[str, Any]) -> None:
+        payload = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, response, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, payload, len(payload), now, now),
+            )
+            # Estimates until the next pass: a replaced entry is counted twice,
+            # and other workers' puts are not counted at all
+            self._entries += 1
+            self._bytes += len(payload)
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= self.evict_every:
+                self._puts_since_evict = 0
+                self._evict()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def _evict(self) -> None:
+        self._count_entries()
+        count, total = self._entries, self._bytes
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk entries oldest-access first until both limits are satisfied
+        doomed = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._entries, self._bytes = count, total
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters and size; entries and bytes are as of the last eviction
+        pass plus this process's puts since, so reading them never scans
+        the table
+        """
+        return {
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "maxEntries": self.max_entries,
+            "maxBytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Caches to reconnect in forked worker processes (see serve.py)
+_OPEN_CACHES: "weakref.WeakSet[SQLiteResponseCache]" = weakref.WeakSet()
+# Parent connections held (never closed) by a forked child
+_INHERITED_CONNECTIONS: list = []
+
+
+def _reopen_caches_after_fork() -> None:
+    for cache in list(_OPEN_CACHES):
+        cache._reopen_after_fork()
+
+
+os.register_at_fork(after_in_child=_reopen_caches_after_fork)
+
+
+def default_response_cache() -> Optional[SQLiteResponseCache]:
+    """Cache at AI_RESPONSE_CACHE_PATH; set the variable to an empty string to disable"""
+    if not AI_RESPONSE_CACHE_PATH:
+        return None
+    return SQLiteResponseCache(AI_RESPONSE_CACHE_PATH)
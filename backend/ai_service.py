@@ -3,13 +3,39 @@ AI Service for Symptom Analysis
 This module handles AI integration with strict medical safety constraints
 """
 
-from typing import List, Dict, Any
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
+import asyncio
 import os
 
+from pydantic import ValidationError
+
+from ai_cache import SQLiteResponseCache, default_response_cache, response_cache_key
+from analysis import generate_ai_explanation, generate_possible_causes
+from metrics import AI_PROMPT_FIELDS_DROPPED_TOTAL, AI_PROMPT_TOKENS, AI_RESPONSES_TOTAL
+from models import SymptomDataRequest
+from prompts import COMPLETION_TOKEN_BUDGET, PROMPT_TOKEN_BUDGET, SYSTEM_PROMPT, build_prompt
+from providers import LOCAL_PROVIDER
+from router import AllProvidersUnavailable, ProviderRouter
+from safety import DEFAULT_VALIDATOR, IncrementalSafetyFilter, SafetyValidator, UnsafeContentError
+from singleflight import SingleFlight
+
 # In production, use environment variables for API keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
+AI_PROVIDER = os.getenv("AI_PROVIDER", "openai")
+# Providers the shared service may route to, in order of preference
+AI_PROVIDERS = [
+    name.strip() for name in os.getenv("AI_PROVIDERS", AI_PROVIDER).split(",") if name.strip()
+]
+
+# Sent after a streamed explanation, which cannot carry its own disclaimer field
+STREAM_DISCLAIMER = "This information is for educational purposes only. Please consult a healthcare professional."
+
+# Bump whenever the safety prompt changes so cached responses generated
+# under the old instructions are no longer served
+SAFETY_PROMPT_VERSION = "2"
+
 class AIService:
     """
     AI Service with medical safety constraints
@@ -22,48 +48,30 @@ class AIService:
     5. Always encourage professional care
     """
     
-    def __init__(self, provider: str = "openai"):
+    def __init__(self, provider: str = "openai", response_cache: Optional[SQLiteResponseCache] = None,
+                 validator: Optional[SafetyValidator] = None, router: Optional[ProviderRouter] = None,
+                 prompt_budget: int = PROMPT_TOKEN_BUDGET):
         self.provider = provider
+        # Estimated tokens allowed per prompt; see prompts.build_prompt
+        self.prompt_budget = prompt_budget
+        # Routes calls over `provider` and any fallbacks (see router.py).
+        # Only answers from `provider` itself are cached, so a fallback's
+        # answer is not served once `provider` is back
+        self.router = router or ProviderRouter([provider])
         self.safety_prompt = self._get_safety_prompt()
+        self.response_cache = response_cache
+        self.validator = validator or DEFAULT_VALIDATOR
+        # Identical prompts requested concurrently share one provider call
+        self.in_flight = SingleFlight()
     
     def _get_safety_prompt(self) -> str:
         """
         Safety prompt that MUST be included in all AI requests
+
+        Sent once per call, as the system message; the user message carries
+        only the symptoms.
         """
-        return """
-        CRITICAL SAFETY INSTRUCTIONS:
-        
-        You are an educational health information assistant. You MUST follow these rules:
-        
-        1. NEVER provide a diagnosis
-        2. NEVER recommend specific medications
-        3. NEVER provide treatment plans
-        4. ALWAYS use probabilistic language (may, might, could, possibly)
-        5. ALWAYS include uncertainty in your responses
-        6. ALWAYS encourage consulting healthcare professionals
-        7. NEVER claim certainty about medical conditions
-        8. Focus on education and awareness, not diagnosis
-        
-        Your role is to:
-        - Explain possible causes in educational terms
-        - Help users understand when to seek professional care
-        - Provide general health information
-        - Encourage appropriate medical consultation
-        
-        Format your response as:
-        {
-            "explanation": "Educational explanation with probabilistic language",
-            "possible_causes": [
-                {
-                    "name": "Condition name",
-                    "description": "Educational description",
-                    "probability": 0.0-1.0,
-                    "matching_symptoms": ["symptom1", "symptom2"]
-                }
-            ],
-            "disclaimer": "This is not medical advice..."
-        }
-        """
+        return SYSTEM_PROMPT
     
     def analyze_symptoms(self, symptom_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -79,42 +87,202 @@ class AIService:
         # Build the prompt
         prompt = self._build_prompt(symptom_data)
         
+        cache_key = self._cache_key(prompt)
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
+        
         # Call AI service based on provider
         if self.provider == "openai":
-            return self._call_openai(prompt)
+            response = self._call_openai(prompt)
         elif self.provider == "gemini":
-            return self._call_gemini(prompt)
+            response = self._call_gemini(prompt)
+        elif self.provider == LOCAL_PROVIDER:
+            response = self._call_local(prompt)
         else:
             raise ValueError(f"Unsupported AI provider: {self.provider}")
-    
-    def _build_prompt(self, symptom_data: Dict[str, Any]) -> str:
-        """Build a structured prompt from symptom data"""
         
-        prompt = f"{self.safety_prompt}\n\n"
-        prompt += "SYMPTOM INFORMATION:\n"
-        prompt += f"Body Region: {symptom_data.get('bodyRegion', 'Unknown')}\n"
+        self._store_response(cache_key, response)
+        return response
+    
+    async def analyze_symptoms_async(self, symptom_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async variant of analyze_symptoms for use inside FastAPI handlers
         
-        if symptom_data.get('painType'):
-            prompt += f"Pain Type: {symptom_data['painType']}\n"
+        Calls go through the shared pooled client for each provider (see
+        providers.py), so concurrent requests reuse keep-alive connections
+        and respect the provider's concurrency limit, timeout and retries.
+        The router picks the provider, hedges slow calls and skips failing
+        providers; when none is available the deterministic explanation is
+        returned instead. Concurrent calls with the same prompt are
+        coalesced into a single provider call whose response they all receive.
+        A provider response is validated before it is cached or shared.
         
-        if symptom_data.get('intensity'):
-            prompt += f"Pain Intensity: {symptom_data['intensity']}/10\n"
+        Args:
+            symptom_data: Structured symptom information
+            
+        Returns:
+            AI analysis with safety constraints applied
+            
+        Raises:
+            ProviderError: if the provider call fails after retries
+            UnsafeContentError: if the provider response fails safety
+                validation; raised to every coalesced caller
+        """
         
-        if symptom_data.get('duration'):
-            prompt += f"Duration: {symptom_data.get('durationValue', '')} {symptom_data['duration']}\n"
+        prompt = self._build_prompt(symptom_data)
         
-        if symptom_data.get('onset'):
-            prompt += f"Onset: {symptom_data['onset']}\n"
+        # Without credentials, behave like the synchronous placeholders
+        if not self.router.configured:
+            AI_RESPONSES_TOTAL.inc(self.provider, "placeholder")
+            return self._placeholder_response()
+        
+        cache_key = self._cache_key(prompt)
+        cached = await self._cached_response_async(cache_key)
+        if cached is not None:
+            AI_RESPONSES_TOTAL.inc(self.provider, "cache")
+            return cached
+        
+        try:
+            (response, provider), shared = await self.in_flight.do(
+                cache_key, lambda: self._complete_and_store(prompt, cache_key)
+            )
+        except AllProvidersUnavailable:
+            fallback = self._fallback_response(symptom_data)
+            if fallback is None:
+                raise
+            AI_RESPONSES_TOTAL.inc(self.provider, "fallback")
+            return fallback
+        if shared:
+            AI_RESPONSES_TOTAL.inc(provider, "coalesced")
+            # Each caller gets its own copy of the shared response
+            return {**response, "possible_causes": list(response["possible_causes"])}
+        AI_RESPONSES_TOTAL.inc(provider, "provider")
+        return response
+    
+    async def _complete_and_store(self, prompt: str, cache_key: str) -> Tuple[Dict[str, Any], str]:
+        """
+        One routed provider call for a prompt; the response is validated
+        before any caller sees it, and cached first if it came from `provider`
+
+        Raises:
+            UnsafeContentError: if the response fails safety validation
+        """
+        response_text, provider = await self.router.complete(self.safety_prompt, prompt)
+        response = self._parse_ai_response(response_text)
+        if not self.validate_response(response):
+            AI_RESPONSES_TOTAL.inc(provider, "rejected")
+            raise UnsafeContentError(f"{provider} response failed safety validation")
+        if provider == self.provider:
+            await self._store_response_async(cache_key, response)
+        return response, provider
+    
+    async def stream_explanation(self, symptom_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Stream an AI explanation as text chunks
         
-        if symptom_data.get('triggers'):
-            prompt += f"Triggers: {', '.join(symptom_data['triggers'])}\n"
+        Every chunk passes through an incremental safety filter before it is
+        yielded; text that fails validation is never released.
         
-        if symptom_data.get('associatedSymptoms'):
-            prompt += f"Associated Symptoms: {', '.join(symptom_data['associatedSymptoms'])}\n"
+        Args:
+            symptom_data: Structured symptom information
+            
+        Yields:
+            Explanation text that has passed the safety filter
+            
+        Raises:
+            UnsafeContentError: if the provider output fails validation; the
+                caller must abort the stream
+            ProviderError: if the provider stream fails
+        """
         
-        prompt += "\nProvide an educational explanation of possible causes with appropriate uncertainty."
+        prompt = self._build_prompt(symptom_data)
         
-        return prompt
+        if not self.router.configured:
+            AI_RESPONSES_TOTAL.inc(self.provider, "placeholder")
+            chunks = _stream_words(self._placeholder_response()["explanation"])
+            cache_key = None
+        elif not self.router.candidates() and self._fallback_response(symptom_data) is not None:
+            AI_RESPONSES_TOTAL.inc(self.provider, "fallback")
+            chunks = _stream_words(self._fallback_response(symptom_data)["explanation"])
+            cache_key = None
+        else:
+            cache_key = self._cache_key(prompt)
+            cached = await self._cached_response_async(cache_key)
+            if cached is not None:
+                AI_RESPONSES_TOTAL.inc(self.provider, "cache")
+                yield cached["explanation"]
+                return
+            provider = self.router.pick()
+            if provider != self.provider:
+                cache_key = None
+            AI_RESPONSES_TOTAL.inc(provider, "provider")
+            chunks = self.router.stream(self.safety_prompt, prompt, provider)
+        
+        safety_filter = IncrementalSafetyFilter(self.validator)
+        released = []
+        try:
+            async for chunk in chunks:
+                safe_text = safety_filter.feed(chunk)
+                if safe_text:
+                    released.append(safe_text)
+                    yield safe_text
+        finally:
+            # Close the provider stream (and release its connection) even
+            # when the filter aborts part-way through
+            await chunks.aclose()
+        
+        tail = safety_filter.finish()
+        if tail:
+            released.append(tail)
+            yield tail
+        
+        if cache_key is not None:
+            await self._store_response_async(cache_key, {
+                "explanation": "".join(released),
+                "possible_causes": [],
+                "disclaimer": STREAM_DISCLAIMER
+            })
+    
+    def _cache_key(self, prompt: str) -> str:
+        return response_cache_key(prompt, self.provider, SAFETY_PROMPT_VERSION)
+    
+    def _cached_response(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response, re-checked against the current safety rules"""
+        if self.response_cache is None:
+            return None
+        
+        cached = self.response_cache.get(cache_key)
+        if cached is not None and not self.validate_response(cached):
+            # Safety rules were tightened after this entry was stored
+            self.response_cache.invalidate(cache_key)
+            return None
+        return cached
+    
+    def _store_response(self, cache_key: str, response: Dict[str, Any]) -> None:
+        """Cache a provider response; only responses that pass validation are kept"""
+        if self.response_cache is not None and self.validate_response(response):
+            self.response_cache.put(cache_key, self.provider, response)
+    
+    # The response cache is SQLite: its calls block, and may wait for other
+    # workers' writes to the shared file, so async paths make them in a thread
+
+    async def _cached_response_async(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        if self.response_cache is None:
+            return None
+        return await asyncio.to_thread(self._cached_response, cache_key)
+    
+    async def _store_response_async(self, cache_key: str, response: Dict[str, Any]) -> None:
+        if self.response_cache is not None:
+            await asyncio.to_thread(self._store_response, cache_key, response)
+    
+    def _build_prompt(self, symptom_data: Dict[str, Any]) -> str:
+        """Compact user message for the symptom data, within the prompt budget"""
+        built = build_prompt(symptom_data, self.prompt_budget)
+        AI_PROMPT_TOKENS.observe(built.tokens)
+        for field in built.dropped:
+            AI_PROMPT_FIELDS_DROPPED_TOTAL.inc(field)
+        return built.user
     
     def _call_openai(self, prompt: str) -> Dict[str, Any]:
         """
@@ -131,18 +299,14 @@ class AIService:
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,  # Lower temperature for more consistent, safer responses
-            max_tokens=500
+            max_tokens=COMPLETION_TOKEN_BUDGET
         )
         
         return self._parse_ai_response(response.choices[0].message.content)
         """
         
         # Placeholder response for development
-        return {
-            "explanation": "Based on the symptoms described, there are several possible explanations to consider. However, this is educational information only and not a diagnosis.",
-            "possible_causes": [],
-            "disclaimer": "This information is for educational purposes only. Please consult a healthcare professional."
-        }
+        return self._placeholder_response()
     
     def _call_gemini(self, prompt: str) -> Dict[str, Any]:
         """
@@ -166,12 +330,43 @@ class AIService:
         """
         
         # Placeholder response for development
+        return self._placeholder_response()
+    
+    def _call_local(self, prompt: str) -> Dict[str, Any]:
+        """
+        Generate with the local provider's template, in this process
+
+        The model, when one is configured, only runs in the provider's
+        worker processes (see analyze_symptoms_async).
+        """
+        from local_provider import generate_explanation
+        
+        text, _ = generate_explanation(self.safety_prompt, prompt, COMPLETION_TOKEN_BUDGET)
+        return self._parse_ai_response(text)
+    
+    def _placeholder_response(self) -> Dict[str, Any]:
+        """Development response used when no provider credentials are configured"""
         return {
             "explanation": "Based on the symptoms described, there are several possible explanations to consider. However, this is educational information only and not a diagnosis.",
             "possible_causes": [],
             "disclaimer": "This information is for educational purposes only. Please consult a healthcare professional."
         }
     
+    def _fallback_response(self, symptom_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        The deterministic explanation, used when no provider is healthy;
+        None if symptom_data is not a complete request to explain
+        """
+        try:
+            data = SymptomDataRequest.model_validate(symptom_data)
+        except ValidationError:
+            return None
+        return {
+            "explanation": generate_ai_explanation(data, generate_possible_causes(data)),
+            "possible_causes": [],
+            "disclaimer": STREAM_DISCLAIMER
+        }
+    
     def _parse_ai_response(self, response_text: str) -> Dict[str, Any]:
         """Parse and validate AI response"""
         
@@ -197,27 +392,39 @@ class AIService:
         - No medication recommendations
         """
         
-        explanation = response.get("explanation", "").lower()
-        
-        # Forbidden phrases that indicate diagnosis
-        forbidden_phrases = [
-            "you have",
-            "you are diagnosed",
-            "this is definitely",
-            "you need to take",
-            "take this medication",
-            "the diagnosis is"
-        ]
-        
-        for phrase in forbidden_phrases:
-            if phrase in explanation:
-                return False
-        
-        # Required elements
-        if "disclaimer" not in response:
-            return False
-        
-        return True
+        # Forbidden diagnosis phrases, medication patterns and required
+        # fields are all checked by one precompiled validator (see safety.py)
+        return self.validator.validate(response)
+
+
+async def _stream_words(text: str) -> AsyncIterator[str]:
+    """Stream placeholder text word by word, like a provider would"""
+    words = text.split(" ")
+    for i, word in enumerate(words):
+        yield word if i == len(words) - 1 else word + " "
+
+
+_default_service: Optional[AIService] = None
+
+def get_ai_service() -> AIService:
+    """
+    Shared AIService for the API, using AI_PROVIDERS and the default response cache
+
+    The first provider listed is the one whose answers are cached.
+    """
+    global _default_service
+    if _default_service is None:
+        _default_service = AIService(
+            provider=AI_PROVIDERS[0] if AI_PROVIDERS else AI_PROVIDER,
+            response_cache=default_response_cache(),
+            router=ProviderRouter(AI_PROVIDERS),
+        )
+    return _default_service
+
+
+def loaded_ai_service() -> Optional[AIService]:
+    """The shared AIService if something has already created it; never creates one"""
+    return _default_service
 
 
 # Example usage
@@ -0,0 +1,190 @@
+"""
+Deterministic symptom analysis pipeline
+Priority: Red flags > Urgency calculation > AI analysis
+"""
+
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from models import (
+    AnalysisResult,
+    PossibleCause,
+    SymptomDataRequest,
+    UrgencyLevel,
+)
+from knowledge_base import KNOWLEDGE_BASE
+from metrics import ANALYSES_TOTAL, METRICS_ENABLED, RED_FLAGS_TOTAL, stage_clock
+from records import SymptomRecord, record_from_request
+from rules import (
+    REGION_BITS,
+    RULE_SETS,
+    CompiledRule,
+    RuleSet,
+    duration_bit,
+    intensity_bit,
+)
+from scoring import SCORER
+
+def analysis_version(rules: RuleSet) -> str:
+    """
+    Version of everything that determines a deterministic result under a
+    rule set; cached results are invalidated when either the rules or the
+    knowledge base change
+    """
+    return f"{rules.version}+kb.{KNOWLEDGE_BASE.version}"
+
+# Red Flag Detection (Rule-based, highest priority)
+def check_red_flags(data: SymptomDataRequest, rules: Optional[RuleSet] = None) -> Optional[AnalysisResult]:
+    """
+    Rule-based red flag detection
+    These override any AI analysis for medical safety
+
+    Rules are declared in the rule set file (data/rules.json) and compiled
+    to bitmasks when it is loaded; `rules` defaults to the active rule set
+    """
+    return (rules or RULE_SETS.current).red_flags.evaluate(data)
+
+def calculate_urgency(data: SymptomDataRequest, rules: Optional[RuleSet] = None) -> UrgencyLevel:
+    """
+    Calculate urgency level based on symptoms
+
+    Thresholds are declared in the rule set file and compiled to bitmasks
+    when it is loaded; `rules` defaults to the active rule set
+    """
+    return (rules or RULE_SETS.current).urgency.evaluate(data)
+
+def generate_possible_causes(data: SymptomDataRequest) -> List[PossibleCause]:
+    """
+    Generate possible causes based on symptoms
+    Candidates come from the indexed condition knowledge base (data/conditions.json)
+    and are ranked by the probabilistic scorer, most likely first
+    """
+    causes = SCORER.rank(record_from_request(data))
+    
+    if not causes:
+        causes.append(KNOWLEDGE_BASE.fallback)
+    
+    return causes
+
+def _explanation(region_name: str, intensity: int, causes: Iterable[Tuple[str, str, float]]) -> str:
+    explanation = f"Based on your reported symptoms in the {region_name} area "
+    
+    if intensity > 0:
+        explanation += f"with an intensity of {intensity}/10, "
+    
+    explanation += "there are several possible explanations to consider:\n\n"
+    
+    for name, description, probability in causes:
+        probability = int(probability * 100)
+        explanation += f"• {name} ({probability}% match): {description}\n\n"
+    
+    explanation += "\n⚠️ Important: This information is for educational purposes only. "
+    explanation += "It is not a medical diagnosis. Please consult with a healthcare "
+    explanation += "professional for proper evaluation and treatment."
+    
+    return explanation
+
+def generate_ai_explanation(data: SymptomDataRequest, causes: List[PossibleCause]) -> str:
+    """
+    Generate AI explanation with safety constraints
+    In production, this would call an LLM with strict prompts
+    """
+    return _explanation(
+        data.bodyRegion.value,
+        data.intensity or 0,
+        ((cause.name, cause.description, cause.probability) for cause in causes),
+    )
+
+class Triage(NamedTuple):
+    """
+    A deterministic result in compact form
+
+    `rule` is the red flag rule that fired, if any; its result template is
+    the whole answer. Otherwise `causes` holds (knowledge base index,
+    probability) pairs, with FALLBACK_CAUSE standing for the knowledge base
+    fallback. `rules` is the rule set it was computed under.
+    """
+    urgency: UrgencyLevel
+    rule: Optional[CompiledRule]
+    causes: Tuple[Tuple[int, float], ...]
+    explanation: str
+    rules: RuleSet
+
+# Index of KNOWLEDGE_BASE.fallback in a Triage's causes; CAUSE_FIELDS ends with it
+FALLBACK_CAUSE = -1
+CAUSE_FIELDS: List[Tuple[str, str]] = [
+    (cause.name, cause.description) for cause in KNOWLEDGE_BASE.conditions
+] + [(KNOWLEDGE_BASE.fallback.name, KNOWLEDGE_BASE.fallback.description)]
+FALLBACK_CAUSES = ((FALLBACK_CAUSE, KNOWLEDGE_BASE.fallback.probability),)
+
+def record_explanation(record: SymptomRecord, causes: Iterable[Tuple[int, float]]) -> str:
+    """generate_ai_explanation for a record and Triage causes"""
+    return _explanation(
+        record.region.value,
+        record.intensity or 0,
+        [(*CAUSE_FIELDS[index], probability) for index, probability in causes],
+    )
+
+def red_flag_rule(record: SymptomRecord, rules: Optional[RuleSet] = None) -> Optional[CompiledRule]:
+    """The first red flag rule matching a record, if any"""
+    return (rules or RULE_SETS.current).red_flags.match(
+        REGION_BITS[record.region], record.symptoms, intensity_bit(record.intensity)
+    )
+
+def triage(record: SymptomRecord, rules: Optional[RuleSet] = None) -> Triage:
+    """
+    Run the full deterministic pipeline on a record, without building models
+    Same steps, stages and results as analyze
+    """
+    rules = rules or RULE_SETS.current
+    clock = stage_clock()
+    
+    rule = red_flag_rule(record, rules)
+    clock.lap("red_flags")
+    if rule:
+        return Triage(UrgencyLevel.emergency, rule, (), rule.result.aiExplanation, rules)
+    
+    urgency_level = rules.urgency.match(record.symptoms, intensity_bit(record.intensity),
+                                        duration_bit(record.duration))
+    clock.lap("urgency")
+    
+    causes = tuple(SCORER.scores(record)) or FALLBACK_CAUSES
+    clock.lap("causes")
+    
+    ai_explanation = record_explanation(record, causes)
+    clock.lap("explanation")
+    
+    return Triage(urgency_level, None, causes, ai_explanation, rules)
+
+def triage_result(result: Triage) -> AnalysisResult:
+    """The AnalysisResult a Triage stands for"""
+    if result.rule:
+        return result.rule.result
+    return AnalysisResult(
+        urgencyLevel=result.urgency,
+        possibleCauses=[
+            KNOWLEDGE_BASE.fallback if index == FALLBACK_CAUSE else SCORER.cause(index, probability)
+            for index, probability in result.causes
+        ],
+        guidance=result.rules.guidance[result.urgency],
+        redFlags=[],
+        aiExplanation=result.explanation,
+        isEmergency=result.urgency == UrgencyLevel.emergency,
+        ruleSetVersion=result.rules.version
+    )
+
+def analyze(data: SymptomDataRequest, rules: Optional[RuleSet] = None) -> AnalysisResult:
+    """
+    Run the full deterministic pipeline for a single request
+    Priority: Red flags > Urgency calculation > AI analysis
+    Each step's latency is recorded under metrics.STAGE_SECONDS
+    `rules` defaults to the active rule set
+    """
+    return triage_result(triage(record_from_request(data), rules))
+
+def record_triage(result: Triage) -> None:
+    """Count a returned result by urgency level and, for emergencies, by red flag rule"""
+    if not METRICS_ENABLED:
+        return
+    ANALYSES_TOTAL.inc(result.urgency.value)
+    if result.rule:
+        RED_FLAGS_TOTAL.inc(result.rule.rule_id)
@@ -0,0 +1,200 @@
+"""
+Batch Symptom Analysis
+Columnar, vectorized version of the deterministic pipeline in analysis.py
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from analysis import generate_ai_explanation, generate_possible_causes
+from metrics import ANALYSES_TOTAL, METRICS_ENABLED, RED_FLAGS_TOTAL, stage_clock
+from models import (
+    AnalysisResult,
+    BodyRegion,
+    Onset,
+    PainType,
+    SymptomDataRequest,
+    SymptomDuration,
+    UrgencyLevel,
+)
+from rules import (
+    DURATION_BITS,
+    MAX_INTENSITY,
+    REGION_BITS,
+    RULE_SETS,
+    SYMPTOM_BITS,
+    TRIGGER_BITS,
+    RuleSet,
+)
+
+# Largest batch accepted by /api/analyze/batch
+MAX_BATCH_SIZE = 10000
+
+# Column layout of the encoded matrix. Optional enums are stored as
+# index + 1 so that 0 means "not reported". Intensities are clamped to
+# 0..ABOVE_SCALE: the rules saturate at MAX_INTENSITY and causes bucket
+# high intensities together, so values past the scale only differ in the
+# explanation text, which quotes them as reported.
+REGION_COL = 0
+PAIN_COL = 1
+INTENSITY_COL = 2
+DURATION_COL = 3
+ONSET_COL = 4
+TRIGGERS_COL = 5
+SYMPTOMS_COL = 6
+NUM_COLS = 7
+
+ABOVE_SCALE = MAX_INTENSITY + 1
+
+REGION_INDEX: Dict[BodyRegion, int] = {region: i for i, region in enumerate(BodyRegion)}
+PAIN_INDEX: Dict[PainType, int] = {pain: i + 1 for i, pain in enumerate(PainType)}
+DURATION_INDEX: Dict[SymptomDuration, int] = {duration: i + 1 for i, duration in enumerate(SymptomDuration)}
+ONSET_INDEX: Dict[Onset, int] = {onset: i + 1 for i, onset in enumerate(Onset)}
+
+# Lookup tables from column values to the bits used by the rule engines
+REGION_BIT_TABLE = np.array([REGION_BITS[region] for region in BodyRegion], dtype=np.int64)
+DURATION_BIT_TABLE = np.array([0] + [DURATION_BITS[duration] for duration in SymptomDuration], dtype=np.int64)
+
+NO_RED_FLAG = -1
+URGENCY_LEVELS = list(UrgencyLevel)
+URGENCY_CODES: Dict[UrgencyLevel, int] = {level: i for i, level in enumerate(URGENCY_LEVELS)}
+
+
+class EncodedBatch(NamedTuple):
+    matrix: np.ndarray
+    cases: List[SymptomDataRequest]
+
+
+def encode_batch(cases: List[SymptomDataRequest]) -> EncodedBatch:
+    """Encode validated requests into an int64 matrix, one row per case"""
+    matrix = np.zeros((len(cases), NUM_COLS), dtype=np.int64)
+    for row, data in zip(matrix, cases):
+        row[REGION_COL] = REGION_INDEX[data.bodyRegion]
+        row[PAIN_COL] = PAIN_INDEX[data.painType] if data.painType else 0
+        row[INTENSITY_COL] = min(max(data.intensity or 0, 0), ABOVE_SCALE)
+        row[DURATION_COL] = DURATION_INDEX[data.duration] if data.duration else 0
+        row[ONSET_COL] = ONSET_INDEX[data.onset] if data.onset else 0
+        triggers = 0
+        for trigger in data.triggers:
+            triggers |= TRIGGER_BITS[trigger]
+        row[TRIGGERS_COL] = triggers
+        symptoms = 0
+        for symptom in data.associatedSymptoms:
+            symptoms |= SYMPTOM_BITS[symptom]
+        row[SYMPTOMS_COL] = symptoms
+    return EncodedBatch(matrix=matrix, cases=cases)
+
+
+def match_red_flags(matrix: np.ndarray, rules: RuleSet) -> np.ndarray:
+    """Index of the first matching red flag rule per row, or NO_RED_FLAG"""
+    region_bits = REGION_BIT_TABLE[matrix[:, REGION_COL]]
+    intensity_bits = np.left_shift(1, np.clip(matrix[:, INTENSITY_COL], 0, MAX_INTENSITY))
+    symptoms = matrix[:, SYMPTOMS_COL]
+
+    matched = np.full(len(matrix), NO_RED_FLAG, dtype=np.int64)
+    # Walk the rules in reverse so earlier rules overwrite later ones,
+    # matching the first-rule-wins order of the scalar engine
+    for index in range(len(rules.red_flags.rules) - 1, -1, -1):
+        rule = rules.red_flags.rules[index]
+        hit = (
+            ((region_bits & rule.region_mask) != 0) &
+            ((symptoms & rule.all_mask) == rule.all_mask) &
+            ((intensity_bits & rule.intensity_mask) != 0)
+        )
+        if rule.any_mask:
+            hit &= (symptoms & rule.any_mask) != 0
+        matched[hit] = index
+    return matched
+
+
+def calculate_urgency_codes(matrix: np.ndarray, rules: RuleSet) -> np.ndarray:
+    """Urgency level code (index into URGENCY_LEVELS) per row"""
+    intensity_bits = np.left_shift(1, np.clip(matrix[:, INTENSITY_COL], 0, MAX_INTENSITY))
+    duration_bits = DURATION_BIT_TABLE[matrix[:, DURATION_COL]]
+    symptoms = matrix[:, SYMPTOMS_COL]
+
+    codes = np.full(len(matrix), URGENCY_CODES[UrgencyLevel.low], dtype=np.int64)
+    for rule in reversed(rules.urgency.rules):
+        hit = (
+            ((intensity_bits & rule.intensity_mask) != 0) |
+            ((symptoms & rule.symptom_mask) != 0) |
+            ((duration_bits & rule.duration_mask) != 0)
+        )
+        codes[hit] = URGENCY_CODES[rule.level]
+    return codes
+
+
+def analyze_batch(cases: List[SymptomDataRequest], rules: Optional[RuleSet] = None) -> List[AnalysisResult]:
+    """
+    Analyze many requests at once
+
+    Red flags and urgency are evaluated as vectorized bit operations over
+    the encoded matrix. Causes and explanations are computed once per
+    distinct symptom profile and shared by every row with that profile.
+    Results are identical to running analysis.analyze on each case under
+    `rules` (the active rule set by default).
+    """
+    if not cases:
+        return []
+    rules = rules or RULE_SETS.current
+
+    clock = stage_clock()
+    encoded = encode_batch(cases)
+    matrix = encoded.matrix
+    clock.lap("batch_encode")
+    red_flags = match_red_flags(matrix, rules)
+    urgency_codes = calculate_urgency_codes(matrix, rules)
+    clock.lap("batch_rules")
+    record_batch_results(red_flags, urgency_codes, rules)
+
+    results: List[AnalysisResult] = [None] * len(cases)
+
+    for index in np.flatnonzero(red_flags != NO_RED_FLAG):
+        results[index] = rules.red_flags.rules[red_flags[index]].result
+
+    pending = np.flatnonzero(red_flags == NO_RED_FLAG)
+    if len(pending):
+        _, first_rows, inverse = np.unique(
+            matrix[pending], axis=0, return_index=True, return_inverse=True
+        )
+        profile_results = []
+        for first_row in first_rows:
+            data = cases[pending[first_row]]
+            urgency_level = URGENCY_LEVELS[urgency_codes[pending[first_row]]]
+            possible_causes = generate_possible_causes(data)
+            profile_results.append(AnalysisResult(
+                urgencyLevel=urgency_level,
+                possibleCauses=possible_causes,
+                guidance=rules.guidance[urgency_level],
+                redFlags=[],
+                aiExplanation=generate_ai_explanation(data, possible_causes),
+                isEmergency=urgency_level == UrgencyLevel.emergency,
+                ruleSetVersion=rules.version
+            ))
+        for index, profile_index in zip(pending, inverse.reshape(-1)):
+            results[index] = profile_results[profile_index]
+        for index in pending[matrix[pending, INTENSITY_COL] == ABOVE_SCALE]:
+            result = results[index]
+            results[index] = result.model_copy(
+                update={"aiExplanation": generate_ai_explanation(cases[index], result.possibleCauses)}
+            )
+        clock.lap("batch_profiles")
+
+    return results
+
+
+def record_batch_results(red_flags: np.ndarray, urgency_codes: np.ndarray, rules: RuleSet) -> None:
+    """Batch counterpart of analysis.record_triage, counted with bincount"""
+    if not METRICS_ENABLED:
+        return
+    fired = red_flags != NO_RED_FLAG
+    compiled = rules.red_flags.rules
+    urgency_counts = np.bincount(urgency_codes[~fired], minlength=len(URGENCY_LEVELS))
+    for rule, count in zip(compiled, np.bincount(red_flags[fired], minlength=len(compiled)).tolist()):
+        if count:
+            RED_FLAGS_TOTAL.inc(rule.rule_id, amount=count)
+            urgency_counts[URGENCY_CODES[rule.result.urgencyLevel]] += count
+    for level, count in zip(URGENCY_LEVELS, urgency_counts.tolist()):
+        if count:
+            ANALYSES_TOTAL.inc(level.value, amount=count)
@@ -0,0 +1,134 @@
+"""
+Allocation Benchmark
+Memory allocated per /api/analyze request on the Pydantic model path and
+on the compact record path (see records.py), measured with tracemalloc,
+over a synthetic workload
+
+For each path and request body:
+
+- peak: bytes allocated at the high-water mark while the request is decoded,
+  analyzed and rendered, above what was allocated before it started
+- retained: bytes and memory blocks still held by the value the analysis
+  cache would store (an AnalysisResult or an analysis.Triage)
+- CPU time per request, measured separately with tracing off
+
+Both paths must render the same bytes for every body; `identical` counts
+the bodies where they do.
+
+Usage:
+    python -m benchmarks.bench_allocations [--cases 5000] [--json]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from analysis import analyze, triage
+from benchmarks.workload import DEFAULT_SEED, generate_cases, percentiles
+from models import SymptomDataRequest
+from records import decode_record
+from rendering import renderer_for
+from rules import RULE_SETS
+
+
+def _models_analyze(body: bytes) -> Any:
+    # What FastAPI does for a SymptomDataRequest parameter, then analyze
+    return analyze(SymptomDataRequest.model_validate(json.loads(body)))
+
+
+def _records_analyze(body: bytes) -> Any:
+    return triage(decode_record(body))
+
+
+_RENDERER = renderer_for(RULE_SETS.current)
+
+# path -> (body -> cached value, cached value -> response bytes)
+PATHS: Dict[str, Tuple[Callable[[bytes], Any], Callable[[Any], bytes]]] = {
+    "models": (_models_analyze, _RENDERER.render),
+    "records": (_records_analyze, _RENDERER.render_triage),
+}
+
+
+def peak_bytes(analyze_body: Callable[[bytes], Any], render: Callable[[Any], bytes],
+               bodies: List[bytes]) -> List[float]:
+    """Peak bytes allocated by each request, above the bytes allocated before it"""
+    samples = []
+    get_traced_memory, reset_peak = tracemalloc.get_traced_memory, tracemalloc.reset_peak
+    for body in bodies:
+        reset_peak()
+        before = get_traced_memory()[0]
+        render(analyze_body(body))
+        samples.append(float(get_traced_memory()[1] - before))
+    return samples
+
+
+def retained(analyze_body: Callable[[bytes], Any], bodies: List[bytes]) -> Tuple[float, float]:
+    """Mean bytes and blocks held per request by the values that would be cached"""
+    kept: List[Any] = [None] * len(bodies)
+    before = tracemalloc.take_snapshot()
+    for index, body in enumerate(bodies):
+        kept[index] = analyze_body(body)
+    after = tracemalloc.take_snapshot()
+    diff = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in diff)
+    count = sum(stat.count_diff for stat in diff)
+    return size / len(bodies), count / len(bodies)
+
+
+def cpu_micros(analyze_body: Callable[[bytes], Any], render: Callable[[Any], bytes],
+               bodies: List[bytes], rounds: int) -> float:
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for _ in range(rounds):
+        for body in bodies:
+            render(analyze_body(body))
+    return (perf_counter() - start) / (rounds * len(bodies)) * 1e6
+
+
+def run(cases: int = 5000, rounds: int = 3, seed: int = DEFAULT_SEED) -> Dict[str, Any]:
+    bodies = [json.dumps(body).encode("utf-8") for body in generate_cases(cases, seed)]
+    rendered = {name: [render(analyze_body(body)) for body in bodies]
+                for name, (analyze_body, render) in PATHS.items()}
+    result: Dict[str, Any] = {
+        "cases": cases,
+        "identical": sum(1 for a, b in zip(rendered["models"], rendered["records"]) if a == b),
+    }
+
+    for name, (analyze_body, render) in PATHS.items():
+        row: Dict[str, Any] = {"cpuMicros": cpu_micros(analyze_body, render, bodies, rounds)}
+        tracemalloc.start()
+        try:
+            peak = percentiles(peak_bytes(analyze_body, render, bodies), unit="Bytes")
+            row["peakBytes"] = {"mean": peak["meanBytes"], "p95": peak["p95Bytes"]}
+            row["retainedBytes"], row["retainedBlocks"] = retained(analyze_body, bodies)
+        finally:
+            tracemalloc.stop()
+        result[name] = row
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = run(args.cases, args.rounds, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['cases']} requests, {result['identical']} rendered identically")
+    print(f"{'path':<8} {'cpu (us)':>9} {'peak mean (B)':>14} {'peak p95 (B)':>13}"
+          f" {'retained (B)':>13} {'blocks':>7}")
+    for name in PATHS:
+        row = result[name]
+        print(f"{name:<8} {row['cpuMicros']:>9.2f} {row['peakBytes']['mean']:>14.0f}"
+              f" {row['peakBytes']['p95']:>13.0f} {row['retainedBytes']:>13.0f} {row['retainedBlocks']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+In-process ASGI Load Generator
+Drives POST /api/analyze through httpx's ASGI transport (no sockets) with a
+fixed number of concurrent clients and reports throughput and latency
+percentiles
+
+Usage:
+    python -m benchmarks.bench_load [--requests 5000] [--concurrency 32] [--json]
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000  # a running server
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.workload import DEFAULT_SEED, generate_cases, percentiles
+from cache import ANALYSIS_CACHE
+from main import app
+
+ANALYZE_PATH = "/api/analyze"
+
+
+async def _client_loop(client: httpx.AsyncClient, cases: List[Dict[str, Any]], cursor: List[int],
+                       latencies: List[float], errors: List[int]) -> None:
+    while cursor[0] < len(cases):
+        case = cases[cursor[0]]
+        cursor[0] += 1
+        start = time.perf_counter()
+        response = await client.post(ANALYZE_PATH, json=case)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+async def run_load(requests: int = 5000, concurrency: int = 32, seed: int = DEFAULT_SEED,
+                   warm_cache: bool = False, url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Send `requests` synthetic cases with `concurrency` clients
+
+    The analysis cache is cleared first unless warm_cache is set, so
+    repeated runs measure the same mix of hits and misses. With a url the
+    requests go over HTTP to that server instead (e.g. one started with
+    serve.py); its cache is not cleared and the hit rate is not reported.
+    """
+    cases = generate_cases(requests, seed)
+    if not warm_cache and url is None:
+        ANALYSIS_CACHE.clear()
+    before = ANALYSIS_CACHE.stats()
+
+    latencies: List[float] = []
+    errors: List[int] = []
+    cursor = [0]
+    if url is None:
+        client_args = {"transport": httpx.ASGITransport(app=app), "base_url": "http://bench"}
+    else:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        client_args = {"base_url": url, "limits": limits}
+    async with httpx.AsyncClient(**client_args) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            _client_loop(client, cases, cursor, latencies, errors) for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+
+    after = ANALYSIS_CACHE.stats()
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "elapsedSeconds": elapsed,
+        "throughputRps": len(latencies) / elapsed if elapsed else 0.0,
+        "cacheHitRate": hits / (hits + misses) if hits + misses and url is None else None,
+        **percentiles(latencies, unit="Ms"),
+    }
+
+
+def run(requests: int = 5000, concurrency: int = 32, seed: int = DEFAULT_SEED,
+        warm_cache: bool = False, url: Optional[str] = None) -> Dict[str, Any]:
+    return asyncio.run(run_load(requests, concurrency, seed, warm_cache, url))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--warm-cache", action="store_true", help="keep the analysis cache from earlier runs")
+    parser.add_argument("--url", help="load a running server over HTTP instead of the in-process app")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = run(args.requests, args.concurrency, args.seed, args.warm_cache, args.url)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['requests']} requests, {result['concurrency']} clients, {result['errors']} errors")
+    hit_rate = "n/a" if result["cacheHitRate"] is None else f"{result['cacheHitRate']:.1%}"
+    print(f"throughput: {result['throughputRps']:.0f} req/s   cache hit rate: {hit_rate}")
+    print(f"latency ms: mean {result['meanMs']:.2f}  p50 {result['p50Ms']:.2f}"
+          f"  p95 {result['p95Ms']:.2f}  p99 {result['p99Ms']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
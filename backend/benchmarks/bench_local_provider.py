@@ -0,0 +1,144 @@
+"""
+Local Provider Benchmark
+Latency and throughput of the local explanation provider on this machine's
+CPUs, over prompts built from a synthetic workload
+
+- generate: one template explanation in this process (symptom parsing,
+  knowledge base retrieval and the template), without the process pool
+- workers=N: LocalProvider.complete with N worker processes and
+  --concurrency calls in flight; throughput, call latency, and the event
+  loop's lag measured by a 1 ms ticker running alongside the calls
+
+Every explanation is checked with AIService.validate_response, as
+enrichment does with provider responses; `safe` counts the ones that pass.
+Pass --model to benchmark a quantized GGUF model (needs llama-cpp-python)
+instead of the template generator.
+
+Usage:
+    python -m benchmarks.bench_local_provider [--calls 2000] [--workers 1,2,4] [--concurrency 16] [--model PATH] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Sequence
+
+from ai_service import AIService
+from benchmarks.workload import DEFAULT_SEED, generate_cases, percentiles
+from local_provider import LocalProvider, generate_explanation
+from prompts import COMPLETION_TOKEN_BUDGET, SYSTEM_PROMPT, build_prompt
+from providers import LOCAL_PROVIDER, ProviderConfig
+
+TICK_SECONDS = 0.001
+
+
+def _generate(prompts: List[str], service: AIService) -> Dict[str, Any]:
+    latencies = []
+    safe = 0
+    perf_counter = time.perf_counter
+    for prompt in prompts:
+        start = perf_counter()
+        text, _ = generate_explanation(SYSTEM_PROMPT, prompt, COMPLETION_TOKEN_BUDGET)
+        latencies.append((perf_counter() - start) * 1e6)
+        safe += service.validate_response(service._parse_ai_response(text))
+    return {"calls": len(prompts), "safe": safe, **percentiles(latencies)}
+
+
+async def _drive(provider: LocalProvider, prompts: List[str], concurrency: int,
+                 service: AIService) -> Dict[str, Any]:
+    latencies: List[float] = []
+    lags: List[float] = []
+    safe = [0]
+    cursor = [0]
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - start - TICK_SECONDS) * 1000)
+
+    async def client_loop() -> None:
+        while cursor[0] < len(prompts):
+            prompt = prompts[cursor[0]]
+            cursor[0] += 1
+            start = time.perf_counter()
+            text = await provider.complete(SYSTEM_PROMPT, prompt)
+            latencies.append((time.perf_counter() - start) * 1000)
+            safe[0] += service.validate_response(service._parse_ai_response(text))
+
+    tick = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    lag = percentiles(lags, unit="Ms")
+    return {
+        "calls": len(latencies),
+        "safe": safe[0],
+        "throughput": len(latencies) / elapsed,
+        **percentiles(latencies, unit="Ms"),
+        "loopLagP99Ms": lag["p99Ms"],
+        "loopLagMaxMs": max(lags, default=0.0),
+    }
+
+
+async def _run_pools(prompts: List[str], workers: List[int], concurrency: int, model: str,
+                     service: AIService) -> Dict[str, Any]:
+    result = {}
+    for count in workers:
+        provider = LocalProvider(
+            ProviderConfig(LOCAL_PROVIDER, "", model=model, max_concurrency=concurrency), workers=count
+        )
+        # Worker start-up (and model loading) is not part of the measurement
+        provider.prepare()
+        try:
+            result[f"workers={count}"] = await _drive(provider, prompts, concurrency, service)
+        finally:
+            await provider.aclose()
+    return result
+
+
+def run(calls: int = 2000, workers: Sequence[int] = (1, 2, 4), concurrency: int = 16, model: str = "",
+        seed: int = DEFAULT_SEED) -> Dict[str, Any]:
+    prompts = [build_prompt(case).user for case in generate_cases(calls, seed)]
+    service = AIService(provider=LOCAL_PROVIDER)
+    result: Dict[str, Any] = {"cpus": os.cpu_count(), "generator": "model" if model else "template"}
+    if not model:
+        result["generate"] = _generate(prompts, service)
+    result.update(asyncio.run(_run_pools(prompts, list(workers), concurrency, model, service)))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker process counts")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--model", default="", help="GGUF model file; the template generator if omitted")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    workers = [int(count) for count in args.workers.split(",") if count.strip()]
+    result = run(args.calls, workers, args.concurrency, args.model, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['generator']} generator on {result['cpus']} CPUs")
+    if "generate" in result:
+        row = result["generate"]
+        print(f"in process: p50 {row['p50Micros']:.1f} us  p99 {row['p99Micros']:.1f} us"
+              f"  safe {row['safe']}/{row['calls']}")
+    print(f"{'pool':<11} {'calls/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'lag p99':>8} {'lag max':>8} {'safe':>11}")
+    for count in workers:
+        row = result[f"workers={count}"]
+        print(f"{'workers=' + str(count):<11} {row['throughput']:>9.0f} {row['p50Ms']:>9.2f} {row['p99Ms']:>9.2f}"
+              f" {row['loopLagP99Ms']:>8.2f} {row['loopLagMaxMs']:>8.2f} {row['safe']:>5}/{row['calls']:<5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Analysis Pipeline Micro-benchmarks
+Per-call latency of each stage of the deterministic pipeline, of the
+same pipeline answered from a compiled decision table, and of rendering
+its response, over a synthetic workload; the record_* rows are the
+compact-record path /api/analyze takes (see records.py)
+
+Usage:
+    python -m benchmarks.bench_pipeline [--cases 5000] [--rounds 3] [--json]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from analysis import (
+    analyze,
+    calculate_urgency,
+    check_red_flags,
+    generate_ai_explanation,
+    generate_possible_causes,
+    triage,
+)
+from benchmarks.workload import DEFAULT_SEED, generate_cases, percentiles
+from decision_table import compile_decision_table, load_decision_table
+from models import SymptomDataRequest
+from records import decode_record
+from rendering import renderer_for
+from rules import RULE_SETS
+
+
+def time_calls(func: Callable[[Any], Any], args: List[Any], rounds: int) -> Dict[str, float]:
+    """Time func(arg) once per arg per round; one sample per call"""
+    samples = []
+    perf_counter_ns = time.perf_counter_ns
+    for _ in range(rounds):
+        for arg in args:
+            start = perf_counter_ns()
+            func(arg)
+            samples.append((perf_counter_ns() - start) / 1000)
+    return percentiles(samples)
+
+
+def run(cases: int = 5000, rounds: int = 3, seed: int = DEFAULT_SEED) -> Dict[str, Dict[str, float]]:
+    bodies = generate_cases(cases, seed)
+    requests = [SymptomDataRequest.model_validate(body) for body in bodies]
+    with_causes = [(data, generate_possible_causes(data)) for data in requests]
+    results = [analyze(data) for data in requests]
+    encoded = [json.dumps(body).encode("utf-8") for body in bodies]
+    records = [decode_record(body) for body in encoded]
+    triages = [triage(record) for record in records]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "decision_table.bin")
+        compile_decision_table(path)
+        table = load_decision_table(path)
+    renderer = renderer_for(RULE_SETS.current)
+
+    return {
+        "validate_request": time_calls(SymptomDataRequest.model_validate, bodies, rounds),
+        "check_red_flags": time_calls(check_red_flags, requests, rounds),
+        "calculate_urgency": time_calls(calculate_urgency, requests, rounds),
+        "generate_possible_causes": time_calls(generate_possible_causes, requests, rounds),
+        "generate_ai_explanation": time_calls(
+            lambda pair: generate_ai_explanation(*pair), with_causes, rounds
+        ),
+        "analyze": time_calls(analyze, requests, rounds),
+        "decision_table_analyze": time_calls(table.analyze, requests, rounds),
+        "render_response": time_calls(renderer.render, results, rounds),
+        "record_decode": time_calls(decode_record, encoded, rounds),
+        "record_triage": time_calls(triage, records, rounds),
+        "record_decision_table": time_calls(table.triage, records, rounds),
+        "record_render": time_calls(renderer.render_triage, triages, rounds),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.cases, args.rounds, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'stage':<26} {'mean (us)':>10} {'p50 (us)':>10} {'p95 (us)':>10} {'p99 (us)':>10}")
+    for name, row in results.items():
+        print(f"{name:<26} {row['meanMicros']:>10.2f} {row['p50Micros']:>10.2f}"
+              f" {row['p95Micros']:>10.2f} {row['p99Micros']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Prompt Size Report
+Characters and estimated tokens sent per AI call before and after prompt
+compaction, over a synthetic workload
+
+Usage:
+    python -m benchmarks.bench_prompts [--cases 5000] [--budget 512] [--json]
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict
+
+from benchmarks.workload import DEFAULT_SEED, generate_cases, percentiles
+from models import SymptomDataRequest
+from prompts import PROMPT_TOKEN_BUDGET, build_prompt, prompt_sizes
+
+
+def run(cases: int = 5000, budget: int = PROMPT_TOKEN_BUDGET, seed: int = DEFAULT_SEED) -> Dict[str, Any]:
+    # The service builds prompts from validated requests dumped to JSON
+    bodies = [
+        SymptomDataRequest.model_validate(body).model_dump(mode="json")
+        for body in generate_cases(cases, seed)
+    ]
+    sizes = [prompt_sizes(body, budget) for body in bodies]
+
+    result: Dict[str, Any] = {"cases": cases, "budget": budget}
+    for key in ("beforeChars", "beforeTokens", "afterChars", "afterTokens"):
+        values = [size[key] for size in sizes]
+        row = percentiles(values, unit="")
+        result[key] = {"mean": row["mean"], "p95": row["p95"], "max": max(values)}
+    result["tokenReduction"] = 1 - result["afterTokens"]["mean"] / result["beforeTokens"]["mean"]
+    result["trimmedShare"] = sum(1 for body in bodies if build_prompt(body, budget).dropped) / cases
+
+    start = time.perf_counter()
+    for body in bodies:
+        build_prompt(body, budget)
+    result["buildMicros"] = (time.perf_counter() - start) / cases * 1e6
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--budget", type=int, default=PROMPT_TOKEN_BUDGET)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = run(args.cases, args.budget, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"{result['cases']} prompts, budget {result['budget']} tokens")
+    print(f"{'':<8} {'mean chars':>11} {'mean tokens':>12} {'p95 tokens':>11} {'max tokens':>11}")
+    for label, prefix in (("before", "before"), ("after", "after")):
+        chars, tokens = result[f"{prefix}Chars"], result[f"{prefix}Tokens"]
+        print(f"{label:<8} {chars['mean']:>11.0f} {tokens['mean']:>12.1f} {tokens['p95']:>11.0f}"
+              f" {tokens['max']:>11}")
+    print(f"token reduction {result['tokenReduction']:.1%}, trimmed to budget {result['trimmedShare']:.1%},"
+          f" build {result['buildMicros']:.1f} us/prompt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Provider Router Benchmark
+Runs ProviderRouter against in-process fake providers with injected latency
+and failures, and reports the latency seen by callers and the calls each
+provider received
+
+Scenarios:
+    tail     primary with a long latency tail, secondary steady; single
+             provider vs hedged routing
+    outage   primary failing every call; the breaker should stop sending it traffic
+    down     every provider failing; calls end in AllProvidersUnavailable
+
+Usage:
+    python -m benchmarks.bench_router [--calls 400] [--concurrency 16] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.workload import DEFAULT_SEED, percentiles
+from router import AllProvidersUnavailable, ProviderRouter
+from stub_provider import FakeProvider
+
+SYSTEM_PROMPT = "system"
+PROMPT = "prompt"
+
+
+def _tail_latency(rng: random.Random, fast: float, slow: float, slow_share: float):
+    return lambda: slow if rng.random() < slow_share else fast * rng.uniform(0.8, 1.2)
+
+
+async def _drive(router: ProviderRouter, calls: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    unavailable = [0]
+    cursor = [0]
+
+    async def client_loop() -> None:
+        while cursor[0] < calls:
+            cursor[0] += 1
+            start = time.perf_counter()
+            try:
+                await router.complete(SYSTEM_PROMPT, PROMPT)
+            except AllProvidersUnavailable:
+                unavailable[0] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return {"unavailable": unavailable[0], **percentiles(latencies, unit="Ms")}
+
+
+def _router(providers: Dict[str, FakeProvider], **options) -> ProviderRouter:
+    return ProviderRouter(list(providers), resolve=providers.__getitem__,
+                          default_hedge_seconds=0.5, **options)
+
+
+async def run_scenarios(calls: int, concurrency: int, seed: int) -> Dict[str, Dict[str, Any]]:
+    rng = random.Random(seed)
+    results = {}
+
+    for label, names in (("tail_single", ["primary"]), ("tail_hedged", ["primary", "secondary"])):
+        providers = {
+            "primary": FakeProvider("primary", _tail_latency(rng, 0.02, 0.5, 0.04), rng=rng),
+            "secondary": FakeProvider("secondary", _tail_latency(rng, 0.03, 0.5, 0.01), rng=rng),
+        }
+        router = _router({name: providers[name] for name in names})
+        result = await _drive(router, calls, concurrency)
+        result["providerCalls"] = {name: providers[name].calls for name in names}
+        results[label] = result
+
+    providers = {
+        "primary": FakeProvider("primary", 0.005, failure_rate=1.0, rng=rng),
+        "secondary": FakeProvider("secondary", 0.02, rng=rng),
+    }
+    router = _router(providers, breaker_cooldown=3600)
+    result = await _drive(router, calls, concurrency)
+    result["providerCalls"] = {name: provider.calls for name, provider in providers.items()}
+    result["breakers"] = {name: router.breakers[name].state for name in providers}
+    results["outage"] = result
+
+    providers = {
+        "primary": FakeProvider("primary", 0.005, failure_rate=1.0, rng=rng),
+        "secondary": FakeProvider("secondary", 0.005, failure_rate=1.0, rng=rng),
+    }
+    router = _router(providers, breaker_cooldown=3600)
+    result = await _drive(router, calls, concurrency)
+    result["providerCalls"] = {name: provider.calls for name, provider in providers.items()}
+    results["down"] = result
+    return results
+
+
+def run(calls: int = 400, concurrency: int = 16, seed: int = DEFAULT_SEED) -> Dict[str, Dict[str, Any]]:
+    return asyncio.run(run_scenarios(calls, concurrency, seed))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.calls, args.concurrency, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'scenario':<12} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'unavail':>8}  provider calls")
+    for name, row in results.items():
+        calls = ", ".join(f"{provider}={count}" for provider, count in row["providerCalls"].items())
+        print(f"{name:<12} {row['p50Ms']:>9.1f} {row['p95Ms']:>9.1f} {row['p99Ms']:>9.1f}"
+              f" {row['unavailable']:>8}  {calls}")
+
+
+if __name__ == "__main__":
+    main()
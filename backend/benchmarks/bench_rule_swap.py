@@ -0,0 +1,144 @@
+"""
+Rule Set Swap Benchmark
+Cost of validating, compiling and activating a rule set, and request
+latency while rule sets are being swapped underneath the requests
+
+- compile: parse_rule_set on the rule set file's document (validation and
+  bitmask compilation, what runs off the request path)
+- activate: RULE_SETS.activate of a compiled rule set, including the
+  activation hooks (response fragments, session dependencies)
+- steady / swapping: triage and render of a record on the rule set captured
+  at the start of the request, as /api/analyze does, without swaps and with
+  a thread activating a new version every --interval milliseconds
+
+Every response must carry the version and guidance of the rule set it
+started on; `consistent` counts the ones that do.
+
+Usage:
+    python -m benchmarks.bench_rule_swap [--cases 2000] [--swaps 200] [--interval 2] [--json]
+"""
+
+import argparse
+import json
+import threading
+import time
+from typing import Any, Dict, List
+
+from analysis import triage
+from benchmarks.workload import DEFAULT_SEED, generate_cases, percentiles
+from models import UrgencyLevel
+from records import decode_record
+from rendering import renderer_for
+from rules import RULE_SETS, RULES_PATH, RuleSet, parse_rule_set
+# Imported for its activation hook, so activations do what they do in the server
+import sessions
+
+
+def _variants(payload: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """Copies of the rule set document under new versions, each with its own guidance text"""
+    variants = []
+    for index in range(count):
+        guidance = dict(payload["guidance"])
+        guidance[UrgencyLevel.low.value] = f"{guidance[UrgencyLevel.low.value]} [bench {index}]"
+        variants.append({**payload, "version": f"bench.{index}", "guidance": guidance})
+    return variants
+
+
+def _requests(bodies: List[bytes], rounds: int) -> Dict[str, Any]:
+    latencies = []
+    consistent = 0
+    perf_counter = time.perf_counter
+    for _ in range(rounds):
+        for body in bodies:
+            start = perf_counter()
+            rules = RULE_SETS.current
+            result = triage(decode_record(body), rules)
+            rendered = renderer_for(rules).render_triage(result)
+            latencies.append((perf_counter() - start) * 1e6)
+            response = json.loads(rendered)
+            if (response["ruleSetVersion"] == rules.version
+                    and (response["isEmergency"] or response["guidance"] == rules.guidance[result.urgency])):
+                consistent += 1
+    return {"requests": len(latencies), "consistent": consistent, **percentiles(latencies)}
+
+
+def run(cases: int = 2000, swaps: int = 200, interval: float = 2.0, rounds: int = 3,
+        seed: int = DEFAULT_SEED) -> Dict[str, Any]:
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    bodies = [json.dumps(body).encode("utf-8") for body in generate_cases(cases, seed)]
+    original = RULE_SETS.current
+
+    compile_ms = []
+    compiled: List[RuleSet] = []
+    for variant in _variants(payload, swaps):
+        start = time.perf_counter()
+        compiled.append(parse_rule_set(variant))
+        compile_ms.append((time.perf_counter() - start) * 1000)
+
+    activate_ms = []
+    try:
+        for rules in compiled[:len(compiled) // 2]:
+            start = time.perf_counter()
+            RULE_SETS.activate(rules)
+            activate_ms.append((time.perf_counter() - start) * 1000)
+        RULE_SETS.activate(original)
+
+        steady = _requests(bodies, rounds)
+
+        stop = threading.Event()
+        swapped = [0]
+
+        def swap_loop() -> None:
+            for rules in compiled[len(compiled) // 2:]:
+                if stop.wait(interval / 1000):
+                    return
+                RULE_SETS.activate(rules)
+                swapped[0] += 1
+
+        swapper = threading.Thread(target=swap_loop)
+        swapper.start()
+        try:
+            swapping = _requests(bodies, rounds)
+        finally:
+            stop.set()
+            swapper.join()
+        swapping["swaps"] = swapped[0]
+    finally:
+        RULE_SETS.activate(original)
+
+    return {
+        "compile": percentiles(compile_ms, unit="Ms"),
+        "activate": percentiles(activate_ms, unit="Ms"),
+        "steady": steady,
+        "swapping": swapping,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--swaps", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=2.0, help="milliseconds between swaps")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = run(args.cases, args.swaps, args.interval, args.rounds, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for name in ("compile", "activate"):
+        row = result[name]
+        print(f"{name:<9} p50 {row['p50Ms']:.2f} ms  p95 {row['p95Ms']:.2f} ms  p99 {row['p99Ms']:.2f} ms")
+    print(f"{'requests':<9} {'p50 (us)':>9} {'p95 (us)':>9} {'p99 (us)':>9} {'consistent':>14}")
+    for name in ("steady", "swapping"):
+        row = result[name]
+        print(f"{name:<9} {row['p50Micros']:>9.1f} {row['p95Micros']:>9.1f} {row['p99Micros']:>9.1f}"
+              f" {row['consistent']:>7}/{row['requests']:<6}")
+    print(f"{result['swapping']['swaps']} swaps while requests were running")
+
+
+if __name__ == "__main__":
+    main()
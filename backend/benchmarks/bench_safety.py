@@ -0,0 +1,86 @@
+"""
+Safety Validator Micro-benchmark
+Compares the precompiled SafetyValidator with the original per-phrase
+substring scan as the forbidden phrase list grows
+
+Usage:
+    python -m benchmarks.bench_safety [--repeat 2000]
+"""
+
+import argparse
+import json
+import random
+import string
+import timeit
+from typing import Dict, List
+
+from safety import FORBIDDEN_DIAGNOSIS_PHRASES, FORBIDDEN_MEDICATION_PHRASES, MEDICATION_PATTERNS, SafetyValidator
+
+PHRASE_COUNTS = [13, 50, 100, 250, 500, 1000]
+
+EXPLANATION = (
+    "Based on your reported symptoms in the chest area with an intensity of 6/10, "
+    "there are several possible explanations to consider. Chest wall muscle strain "
+    "from physical activity or poor posture could possibly explain this discomfort, "
+    "and anxiety can also cause chest tightness and pressure sensations. "
+) * 8 + "This information is for educational purposes only and is not a diagnosis."
+
+
+def synthetic_phrases(count: int, seed: int = 0) -> List[str]:
+    """Forbidden-looking phrases that never occur in EXPLANATION"""
+    rng = random.Random(seed)
+    base = FORBIDDEN_DIAGNOSIS_PHRASES + FORBIDDEN_MEDICATION_PHRASES
+    phrases = list(base)
+    while len(phrases) < count:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+        phrases.append(f"{rng.choice(base)} {word}")
+    return phrases[:count]
+
+
+def naive_validate(response: Dict[str, str], phrases: List[str]) -> bool:
+    """The original validate_response algorithm: lowercase, then one scan per phrase"""
+    explanation = response.get("explanation", "").lower()
+    for phrase in phrases:
+        if phrase in explanation:
+            return False
+    return "disclaimer" in response
+
+
+def run(repeat: int) -> List[Dict[str, float]]:
+    response = {"explanation": EXPLANATION, "disclaimer": "Educational only."}
+    rows = []
+    for count in PHRASE_COUNTS:
+        phrases = synthetic_phrases(count)
+        validator = SafetyValidator(phrases, MEDICATION_PATTERNS)
+        assert validator.validate(response) and naive_validate(response, phrases)
+        naive = timeit.timeit(lambda: naive_validate(response, phrases), number=repeat)
+        phrases_only = SafetyValidator(phrases)
+        single = timeit.timeit(lambda: phrases_only.validate(response), number=repeat)
+        full = timeit.timeit(lambda: validator.validate(response), number=repeat)
+        rows.append({
+            "phrases": count,
+            "naiveMicros": naive / repeat * 1e6,
+            "singlePassMicros": single / repeat * 1e6,
+            "withMedicationPatternsMicros": full / repeat * 1e6,
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    rows = run(args.repeat)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'phrases':>8} {'naive (us)':>12} {'single-pass (us)':>18} {'+ patterns (us)':>16}")
+    for row in rows:
+        print(f"{row['phrases']:>8} {row['naiveMicros']:>12.2f} {row['singlePassMicros']:>18.2f}"
+              f" {row['withMedicationPatternsMicros']:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Cold-start Benchmark
+Measures, in fresh interpreter processes, how long `import main` takes and
+how long a newly launched server takes to answer its first /api/analyze
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 5] [--preload] [--json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.workload import percentiles
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST = {
+    "bodyRegion": "headFront",
+    "painType": "throbbing",
+    "intensity": 5,
+    "timestamp": "2024-01-01T00:00:00Z",
+}
+
+# How long to wait for a server before giving up on a run
+STARTUP_TIMEOUT_SECONDS = 30.0
+
+_IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import() -> float:
+    """Seconds spent in `import main` in a new interpreter"""
+    output = subprocess.check_output([sys.executable, "-c", _IMPORT_SNIPPET], cwd=BACKEND_DIR)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def measure_first_response(preload: bool = False) -> float:
+    """Seconds from launching `python main.py` to its first successful /api/analyze"""
+    port = _free_port()
+    command = [sys.executable, "main.py", "--host", "127.0.0.1", "--port", str(port)]
+    if preload:
+        command.append("--preload")
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=BACKEND_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while time.perf_counter() - start < STARTUP_TIMEOUT_SECONDS:
+                try:
+                    response = client.post("/api/analyze", json=FIRST_REQUEST)
+                    if response.status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError(f"server exited with status {process.returncode}")
+                time.sleep(0.005)
+        raise RuntimeError(f"no response within {STARTUP_TIMEOUT_SECONDS}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(runs: int = 5, preload: bool = False) -> Dict[str, Any]:
+    imports: List[float] = [measure_import() for _ in range(runs)]
+    first: List[float] = [measure_first_response(preload) for _ in range(runs)]
+    return {
+        "runs": runs,
+        "preload": preload,
+        "importMain": percentiles([t * 1000 for t in imports], unit="Ms"),
+        "firstResponse": percentiles([t * 1000 for t in first], unit="Ms"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--preload", action="store_true", help="start the server with --preload")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = run(args.runs, args.preload)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for name in ("importMain", "firstResponse"):
+        row = result[name]
+        print(f"{name:<14} mean {row['meanMs']:8.1f} ms   p50 {row['p50Ms']:8.1f} ms"
+              f"   p95 {row['p95Ms']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark Suite and Regression Gate
+Runs the pipeline micro-benchmarks and the ASGI load test, writes the
+results as JSON and fails when any gated metric is worse than the stored
+baseline by more than the tolerance
+
+Usage:
+    python -m benchmarks.regression [-o results.json] [--tolerance 0.3]
+    python -m benchmarks.regression --update-baseline
+
+Timings depend on the machine: regenerate the baseline with
+--update-baseline on the machine that runs the gate.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+from typing import Any, Dict, List
+
+from analysis import analysis_version
+from benchmarks import bench_load, bench_pipeline
+from rules import RULE_SETS
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.3
+
+# Gated metrics: name suffix -> True when higher is better
+GATED_SUFFIXES = {
+    "p50Micros": False,
+    "p95Micros": False,
+    "p50Ms": False,
+    "p95Ms": False,
+    "p99Ms": False,
+    "throughputRps": True,
+}
+
+
+def run_suite(cases: int, rounds: int, requests: int, concurrency: int) -> Dict[str, Any]:
+    return {
+        "analysisVersion": analysis_version(RULE_SETS.current),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "micro": bench_pipeline.run(cases, rounds),
+        "load": bench_load.run(requests, concurrency),
+    }
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves keyed by dotted path, e.g. micro.analyze.p50Micros"""
+    flat: Dict[str, float] = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Describe every gated metric that regressed by more than tolerance"""
+    current = flatten(results)
+    previous = flatten(baseline)
+    regressions = []
+    for path, before in sorted(previous.items()):
+        suffix = path.rsplit(".", 1)[-1]
+        if suffix not in GATED_SUFFIXES or path not in current or before <= 0:
+            continue
+        after = current[path]
+        higher_is_better = GATED_SUFFIXES[suffix]
+        change = (before - after) / before if higher_is_better else (after - before) / before
+        if change > tolerance:
+            regressions.append(f"{path}: {before:.2f} -> {after:.2f} ({change:+.0%} worse)")
+    if current.get("load.errors", 0) > 0:
+        regressions.append(f"load.errors: {int(current['load.errors'])} failed requests")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="write results JSON to this file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed fractional slowdown per metric (default 0.3)")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    results = run_suite(args.cases, args.rounds, args.requests, args.concurrency)
+    payload = json.dumps(results, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload, end="")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(payload)
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --update-baseline", file=sys.stderr)
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("performance regressions:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+    print(f"no regressions beyond {args.tolerance:.0%} of baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Synthetic Workload Generator
+Samples symptom requests from the enum space for benchmarks and load tests
+
+Usage:
+    python -m benchmarks.workload --count 10000 -o cases.jsonl
+"""
+
+import argparse
+import json
+import random
+import sys
+from typing import Any, Dict, List, Sequence
+
+from models import (
+    AssociatedSymptom,
+    BodyRegion,
+    Onset,
+    PainType,
+    SymptomDataRequest,
+    SymptomDuration,
+    Trigger,
+)
+
+DEFAULT_SEED = 7
+
+
+def sample_case(rng: random.Random) -> Dict[str, Any]:
+    """
+    One request body as the app sends it
+
+    Optional fields are left out at roughly the rate the app omits them;
+    up to 3 triggers and 6 associated symptoms are drawn without replacement.
+    """
+    case: Dict[str, Any] = {
+        "bodyRegion": rng.choice(list(BodyRegion)).value,
+        "timestamp": "2024-01-01T00:00:00Z",
+    }
+    if rng.random() < 0.9:
+        case["painType"] = rng.choice(list(PainType)).value
+    if rng.random() < 0.9:
+        case["intensity"] = rng.randint(0, 10)
+    if rng.random() < 0.7:
+        case["duration"] = rng.choice(list(SymptomDuration)).value
+    if rng.random() < 0.5:
+        case["onset"] = rng.choice(list(Onset)).value
+    case["triggers"] = [t.value for t in rng.sample(list(Trigger), rng.randint(0, 3))]
+    case["associatedSymptoms"] = [
+        s.value for s in rng.sample(list(AssociatedSymptom), rng.randint(0, 6))
+    ]
+    return case
+
+
+def generate_cases(count: int, seed: int = DEFAULT_SEED) -> List[Dict[str, Any]]:
+    """A reproducible list of request bodies"""
+    rng = random.Random(seed)
+    return [sample_case(rng) for _ in range(count)]
+
+
+def generate_requests(count: int, seed: int = DEFAULT_SEED) -> List[SymptomDataRequest]:
+    return [SymptomDataRequest.model_validate(case) for case in generate_cases(count, seed)]
+
+
+def percentiles(samples: Sequence[float], unit: str = "Micros") -> Dict[str, float]:
+    """Mean, p50, p95 and p99 of a list of samples, keyed with the given unit suffix"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        f"mean{unit}": sum(ordered) / len(ordered),
+        f"p50{unit}": pick(0.50),
+        f"p95{unit}": pick(0.95),
+        f"p99{unit}": pick(0.99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for case in generate_cases(args.count, args.seed):
+            out.write(json.dumps(case) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Analysis Result Cache
+Bounded LRU/TTL memoization of the deterministic pipeline
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from analysis import Triage, analysis_version
+from records import SymptomRecord
+from rules import RULE_SETS, RuleSet
+
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "10000"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "3600"))
+
+
+class AnalysisCache:
+    """
+    Thread-safe LRU cache with per-entry TTL
+
+    Entries are tagged with the rule set version they were computed under;
+    when the version changes the whole cache is dropped. Lookups under a
+    rule set that is no longer active (requests that started before a
+    swap) bypass the cache instead.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, version: str,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, version: Optional[str] = None) -> None:
+        """Store a value; with `version`, only while the cache is still at that version"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = (self._clock() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_version(self, version: str) -> None:
+        """Invalidate every entry if the rule set version changed"""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(self, record: SymptomRecord, rules: RuleSet,
+                       compute: Callable[[SymptomRecord, RuleSet], Triage]) -> Triage:
+        """
+        Return the cached result for a record under a rule set, computing it on a miss
+
+        Keyed on SymptomRecord.key: the timestamp is ignored, and the
+        trigger and symptom bitsets ignore ordering and duplicates.
+        """
+        version = analysis_version(rules)
+        if version != self.version:
+            if rules is not RULE_SETS.current:
+                return compute(record, rules)
+            self.set_version(version)
+        key = record.key()
+        result = self.get(key)
+        if result is None:
+            result = compute(record, rules)
+            self.put(key, result, version)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+ANALYSIS_CACHE = AnalysisCache(ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_TTL, analysis_version(RULE_SETS.current))
@@ -0,0 +1,649 @@
+"""
+Precomputed Decision Table
+Offline compiler for the deterministic pipeline: red flags, urgency and
+ranked causes looked up from a memory-mapped file instead of evaluated
+
+The input space is far too large to enumerate (about 10^12 requests), but
+the pipeline only looks at a few features of it. The compiler partitions
+every request field into classes of values the rules and the knowledge
+base cannot tell apart, derived from the compiled rule masks and the
+condition postings and evidence:
+
+- body regions with the same red flag rules and candidate conditions
+- intensities (clamped to 0-MAX_INTENSITY) on the same side of every
+  threshold and in the same evidence bucket
+- pain types, durations and onsets with the same postings, urgency masks
+  and likelihood ratios
+- symptoms and triggers projected onto the bits something refers to
+
+The decision then factors into three dense tables: red flag rule by
+[region, intensity, red flag symptoms], urgency by [intensity, duration,
+urgency symptoms], and the ranked causes by [pain, intensity, duration,
+onset, triggers, symptoms] within each region class, over that region's
+candidate conditions only. Each cell is filled by running the live
+functions on a representative request. A lookup is a few dictionary
+reads, an index computation and one read per table; the explanation text
+is still formatted per request, since it quotes the raw intensity.
+
+Every cell is filled by running the live pipeline, so compile time and
+file size grow with the cells; a rule set or knowledge base that would
+need more than DECISION_TABLE_MAX_CELLS is refused (TableTooLarge) and
+has to be served by the live pipeline.
+
+The file records a fingerprint of the rule set, knowledge base and enums
+it was compiled from and is refused when they have changed. A loaded table
+belongs to one rule set; after a swap to another, the server evaluates the
+live pipeline until a table compiled for the new rules is in place.
+`verify` diffs the table against the live pipeline.
+
+Usage:
+    python decision_table.py compile -o data/decision_table.bin [--rules data/rules.json]
+    python decision_table.py verify data/decision_table.bin [--rules data/rules.json] [--samples 200000]
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analysis import (
+    FALLBACK_CAUSES,
+    Triage,
+    analyze,
+    calculate_urgency,
+    check_red_flags,
+    generate_possible_causes,
+    record_explanation,
+    triage_result,
+)
+from knowledge_base import KNOWLEDGE_BASE, intensity_bucket
+from models import (
+    AnalysisResult,
+    AssociatedSymptom,
+    BodyRegion,
+    Onset,
+    PainType,
+    SymptomDataRequest,
+    SymptomDuration,
+    Trigger,
+    UrgencyLevel,
+)
+from records import SymptomRecord, record_from_request
+from rules import (
+    DURATION_BITS,
+    MAX_INTENSITY,
+    REGION_BITS,
+    RULE_SETS,
+    RULES_PATH,
+    SYMPTOM_BITS,
+    RuleSet,
+    RuleSetError,
+    intensity_bit,
+    load_rule_set,
+)
+from scoring import MAX_CAUSES, PROBABILITY_DECIMALS
+from shared_tables import map_tables, write_tables
+
+# Compiled table used by the server; empty means evaluate the live functions
+DECISION_TABLE_PATH = os.getenv("DECISION_TABLE_PATH", "")
+
+# Most cells a compiled table may have, over all three tables
+DECISION_TABLE_MAX_CELLS = int(os.getenv("DECISION_TABLE_MAX_CELLS", str(1 << 24)))
+
+# Bump when the file layout or the partitioning changes
+TABLE_FORMAT_VERSION = 1
+
+URGENCY_LEVELS = list(UrgencyLevel)
+NO_RULE = -1
+NO_CONDITION = -1
+
+
+class StaleDecisionTable(ValueError):
+    """The table was compiled from different rules, knowledge base or enums"""
+
+
+class TableTooLarge(ValueError):
+    """The rule set and knowledge base need more cells than DECISION_TABLE_MAX_CELLS"""
+
+
+def pipeline_fingerprint(rules: RuleSet) -> bytes:
+    """SHA-256 of everything a table compiled under a rule set depends on"""
+    kb = KNOWLEDGE_BASE
+    spec = rules.spec.model_dump(mode="json")
+    source = {
+        "format": TABLE_FORMAT_VERSION,
+        "ruleSetVersion": rules.version,
+        "redFlagRules": spec["redFlagRules"],
+        "urgencyRules": spec["urgencyRules"],
+        "maxIntensity": MAX_INTENSITY,
+        "knowledgeBase": {
+            "version": kb.version,
+            "conditions": [condition.model_dump(mode="json") for condition in kb.conditions],
+            "fallback": kb.fallback.model_dump(mode="json"),
+        },
+        "maxCauses": MAX_CAUSES,
+        "probabilityDecimals": PROBABILITY_DECIMALS,
+        "enums": {
+            enum.__name__: [member.value for member in enum]
+            for enum in (BodyRegion, PainType, SymptomDuration, Onset, Trigger, AssociatedSymptom, UrgencyLevel)
+        },
+    }
+    return hashlib.sha256(json.dumps(source, sort_keys=True).encode("utf-8")).digest()
+
+
+# Partitioning
+
+def _partition(values: Sequence[Any], signature: Callable[[Any], Any]) -> Tuple[List[int], List[Any]]:
+    """Class of each value, and the first value of each class as its representative"""
+    classes: Dict[Any, int] = {}
+    assignment = []
+    representatives = []
+    for value in values:
+        key = signature(value)
+        if key not in classes:
+            classes[key] = len(representatives)
+            representatives.append(value)
+        assignment.append(classes[key])
+    return assignment, representatives
+
+
+def _evidence(field: str, value: Any) -> Tuple[Optional[float], ...]:
+    return tuple(getattr(c.evidence, field).get(value) for c in KNOWLEDGE_BASE.conditions)
+
+
+def _region_signature(rules: RuleSet, region: BodyRegion) -> Tuple[Any, ...]:
+    bit = REGION_BITS[region]
+    return tuple(bool(rule.region_mask & bit) for rule in rules.red_flags.rules), KNOWLEDGE_BASE.by_region[region]
+
+
+def _intensity_signature(rules: RuleSet, value: int) -> Tuple[Any, ...]:
+    bit = intensity_bit(value)
+    return (
+        tuple(bool(rule.intensity_mask & bit) for rule in rules.red_flags.rules),
+        tuple(bool(rule.intensity_mask & bit) for rule in rules.urgency.rules),
+        tuple(c.minIntensity is None or value >= c.minIntensity for c in KNOWLEDGE_BASE.conditions),
+        _evidence("intensity", intensity_bucket(value)),
+    )
+
+
+def _pain_signature(pain: Optional[PainType]) -> Tuple[Any, ...]:
+    kb = KNOWLEDGE_BASE
+    postings = kb.any_pain_type | (kb.by_pain_type[pain] if pain else 0)
+    return postings, _evidence("painType", pain)
+
+
+def _duration_signature(rules: RuleSet, duration: Optional[SymptomDuration]) -> Tuple[Any, ...]:
+    bit = DURATION_BITS[duration] if duration else 0
+    return tuple(bool(rule.duration_mask & bit) for rule in rules.urgency.rules), _evidence("duration", duration)
+
+
+def _onset_signature(onset: Optional[Onset]) -> Tuple[Any, ...]:
+    return _evidence("onset", onset)
+
+
+def _symptom_bits(mask: int) -> List[AssociatedSymptom]:
+    return [symptom for symptom in AssociatedSymptom if SYMPTOM_BITS[symptom] & mask]
+
+
+def _check_clamping() -> None:
+    """Intensities are classified after clamping; that is only exact for in-range thresholds"""
+    for condition in KNOWLEDGE_BASE.conditions:
+        if condition.minIntensity is not None and not 0 < condition.minIntensity <= MAX_INTENSITY:
+            raise ValueError(f"{condition.id}: minIntensity must be within 1-{MAX_INTENSITY} to be tabulated")
+
+
+def _projection(members: Sequence[Any], relevant: Sequence[Any]) -> np.ndarray:
+    """Bit position of each enum member in a projected mask, or -1 if it is not relevant"""
+    positions = {member: position for position, member in enumerate(relevant)}
+    return np.array([positions.get(member, -1) for member in members], dtype=np.int8)
+
+
+def _index_dtype(count: int) -> np.dtype:
+    """Smallest signed integer type holding indices 0..count-1 and the -1 sentinels"""
+    # -count fits exactly when count - 1 does
+    return np.min_scalar_type(-max(count, 1))
+
+
+def _store_index(table: np.ndarray, position: Tuple[int, ...], index: int) -> None:
+    table[position] = index
+    if table[position] != index:
+        raise ValueError(f"index {index} does not fit the table's {table.dtype} cells")
+
+
+def _subsets(members: Sequence[Any]) -> List[List[Any]]:
+    """Every subset of members, in projected mask order"""
+    return [[member for position, member in enumerate(members) if mask >> position & 1]
+            for mask in range(1 << len(members))]
+
+
+def compile_tables(rules: RuleSet, max_cells: int = DECISION_TABLE_MAX_CELLS) -> Dict[str, np.ndarray]:
+    """
+    Partition the input space and fill every cell from the live functions under a rule set
+
+    Raises:
+        TableTooLarge: if the tables would have more than max_cells cells
+    """
+    _check_clamping()
+    kb = KNOWLEDGE_BASE
+    names = [condition.name for condition in kb.conditions]
+    if len(set(names)) != len(names):
+        raise ValueError("condition names must be unique to be tabulated")
+    condition_index = {name: index for index, name in enumerate(names)}
+
+    regions = list(BodyRegion)
+    pains: List[Optional[PainType]] = [None, *PainType]
+    intensities = list(range(MAX_INTENSITY + 1))
+    durations: List[Optional[SymptomDuration]] = [None, *SymptomDuration]
+    onsets: List[Optional[Onset]] = [None, *Onset]
+
+    region_class, region_reps = _partition(regions, lambda region: _region_signature(rules, region))
+    pain_class, pain_reps = _partition(pains, _pain_signature)
+    intensity_class, intensity_reps = _partition(intensities, lambda value: _intensity_signature(rules, value))
+    duration_class, duration_reps = _partition(durations, lambda duration: _duration_signature(rules, duration))
+    onset_class, onset_reps = _partition(onsets, _onset_signature)
+
+    def request(region: BodyRegion, **fields: Any) -> SymptomDataRequest:
+        return SymptomDataRequest.model_construct(bodyRegion=region, timestamp="", **{
+            "painType": None, "intensity": 0, "duration": None, "onset": None,
+            "triggers": [], "associatedSymptoms": [], **fields,
+        })
+
+    red_flag_mask = 0
+    for rule in rules.red_flags.rules:
+        red_flag_mask |= rule.all_mask | rule.any_mask
+    red_flag_symptoms = _symptom_bits(red_flag_mask)
+    urgency_mask = 0
+    for rule in rules.urgency.rules:
+        urgency_mask |= rule.symptom_mask
+    urgency_symptoms = _symptom_bits(urgency_mask)
+    # Per region class: its candidate conditions and the symptoms and
+    # triggers they refer to
+    cause_findings = []
+    for region in region_reps:
+        conditions = [c for c in kb.conditions if not c.regions or region in c.regions]
+        symptoms = [s for s in AssociatedSymptom
+                    if any(s in c.requiredSymptoms or s in c.evidence.associatedSymptoms for c in conditions)]
+        triggers = [t for t in Trigger if any(t in c.evidence.triggers for c in conditions)]
+        cause_findings.append((conditions, symptoms, triggers))
+
+    # Sizes are checked before anything is allocated or evaluated
+    cells_needed = (len(region_reps) * len(intensity_reps) * (1 << len(red_flag_symptoms))
+                    + len(intensity_reps) * len(duration_reps) * (1 << len(urgency_symptoms))
+                    + sum(len(pain_reps) * len(intensity_reps) * len(duration_reps) * len(onset_reps)
+                          * (1 << len(triggers)) * (1 << len(symptoms)) if conditions else 1
+                          for conditions, symptoms, triggers in cause_findings))
+    if cells_needed > max_cells:
+        raise TableTooLarge(
+            f"rule set {rules.version} and the knowledge base need {cells_needed} table cells, more than"
+            f" DECISION_TABLE_MAX_CELLS ({max_cells}); serve them from the live pipeline instead"
+        )
+
+    # Red flags: [region, intensity, red flag symptoms]
+    rule_index = {id(rule.result): index for index, rule in enumerate(rules.red_flags.rules)}
+    red_flags = np.full((len(region_reps), len(intensity_reps), 1 << len(red_flag_symptoms)), NO_RULE,
+                        dtype=_index_dtype(len(rules.red_flags.rules)))
+    for r, region in enumerate(region_reps):
+        for i, intensity in enumerate(intensity_reps):
+            for mask, symptoms in enumerate(_subsets(red_flag_symptoms)):
+                result = check_red_flags(request(region, intensity=intensity, associatedSymptoms=symptoms), rules)
+                if result is not None:
+                    _store_index(red_flags, (r, i, mask), rule_index[id(result)])
+
+    # Urgency: [intensity, duration, urgency symptoms]
+    urgency = np.zeros((len(intensity_reps), len(duration_reps), 1 << len(urgency_symptoms)),
+                       dtype=_index_dtype(len(URGENCY_LEVELS)))
+    for i, intensity in enumerate(intensity_reps):
+        for d, duration in enumerate(duration_reps):
+            for mask, symptoms in enumerate(_subsets(urgency_symptoms)):
+                level = calculate_urgency(request(regions[0], intensity=intensity, duration=duration,
+                                                  associatedSymptoms=symptoms), rules)
+                _store_index(urgency, (i, d, mask), URGENCY_LEVELS.index(level))
+
+    # Causes: per region class, [pain, intensity, duration, onset, triggers,
+    # symptoms] over the findings that region's candidate conditions refer to.
+    # Strides are zero for regions without candidates: one cell, the fallback
+    cause_symptom_bits = np.full((len(region_reps), len(AssociatedSymptom)), -1, dtype=np.int8)
+    cause_trigger_bits = np.full((len(region_reps), len(Trigger)), -1, dtype=np.int8)
+    cause_base = np.zeros(len(region_reps), dtype=np.int64)
+    cause_strides = np.zeros((len(region_reps), 4), dtype=np.int64)
+    cells: List[np.ndarray] = []
+    # Ranked (condition, probability) pairs; record 0 is the fallback
+    records: Dict[Tuple[Tuple[int, float], ...], int] = {(): 0}
+    base = 0
+    for r, (region, (conditions, symptoms, triggers)) in enumerate(zip(region_reps, cause_findings)):
+        cause_symptom_bits[r] = _projection(list(AssociatedSymptom), symptoms)
+        cause_trigger_bits[r] = _projection(list(Trigger), triggers)
+        cause_base[r] = base
+        if not conditions:
+            cells.append(np.zeros(1, dtype=np.int32))
+            base += 1
+            continue
+
+        symptom_sets = _subsets(symptoms)
+        trigger_sets = _subsets(triggers)
+        block = np.zeros((len(pain_reps), len(intensity_reps), len(duration_reps), len(onset_reps),
+                          len(trigger_sets), len(symptom_sets)), dtype=np.int32)
+        for (p, pain), (i, intensity), (d, duration), (o, onset) in itertools.product(
+                enumerate(pain_reps), enumerate(intensity_reps), enumerate(duration_reps), enumerate(onset_reps)):
+            for t, trigger_set in enumerate(trigger_sets):
+                for s, symptom_set in enumerate(symptom_sets):
+                    causes = generate_possible_causes(request(
+                        region, painType=pain, intensity=intensity, duration=duration, onset=onset,
+                        triggers=trigger_set, associatedSymptoms=symptom_set,
+                    ))
+                    key = () if causes[0] is kb.fallback else tuple(
+                        (condition_index[cause.name], cause.probability) for cause in causes
+                    )
+                    _store_index(block, (p, i, d, o, t, s), records.setdefault(key, len(records)))
+        cause_strides[r] = [stride // block.itemsize for stride in block.strides[:4]]
+        cells.append(block.ravel())
+        base += block.size
+
+    cause_conditions = np.full((len(records), MAX_CAUSES), NO_CONDITION, dtype=_index_dtype(len(kb.conditions)))
+    cause_probabilities = np.zeros((len(records), MAX_CAUSES), dtype=np.float64)
+    for key, record in records.items():
+        for position, (index, probability) in enumerate(key):
+            _store_index(cause_conditions, (record, position), index)
+            cause_probabilities[record, position] = probability
+
+    return {
+        "fingerprint": np.frombuffer(pipeline_fingerprint(rules), dtype=np.uint8),
+        "region_class": np.array(region_class, dtype=np.int8),
+        "pain_class": np.array(pain_class, dtype=np.int8),
+        "intensity_class": np.array(intensity_class, dtype=np.int8),
+        "duration_class": np.array(duration_class, dtype=np.int8),
+        "onset_class": np.array(onset_class, dtype=np.int8),
+        "red_flag_symptom_bits": _projection(list(AssociatedSymptom), red_flag_symptoms),
+        "urgency_symptom_bits": _projection(list(AssociatedSymptom), urgency_symptoms),
+        "cause_symptom_bits": cause_symptom_bits,
+        "cause_trigger_bits": cause_trigger_bits,
+        "cause_base": cause_base,
+        "cause_strides": cause_strides,
+        "red_flags": red_flags,
+        "urgency": urgency,
+        "cause_cells": np.concatenate(cells),
+        "cause_conditions": cause_conditions,
+        "cause_probabilities": cause_probabilities,
+    }
+
+
+def compile_decision_table(path: str, rules: Optional[RuleSet] = None,
+                           max_cells: int = DECISION_TABLE_MAX_CELLS) -> Dict[str, np.ndarray]:
+    """
+    Compile the pipeline under a rule set (the active one by default) and write it to path atomically
+
+    Raises:
+        TableTooLarge: if the tables would have more than max_cells cells
+    """
+    tables = compile_tables(rules or RULE_SETS.current, max_cells)
+    write_tables(path, tables)
+    return tables
+
+
+# Lookup
+
+# A record's symptoms are projected onto all three tables in one pass: each
+# symptom maps to its red flag, urgency and cause bits packed at these offsets
+_SEGMENT = len(AssociatedSymptom)
+_SEGMENT_MASK = (1 << _SEGMENT) - 1
+_URGENCY_SHIFT = _SEGMENT
+_CAUSE_SHIFT = 2 * _SEGMENT
+# Record bitsets are translated a slice of this many bits at a time
+_CHUNK = 7
+_CHUNK_MASK = (1 << _CHUNK) - 1
+
+
+def _class_map(members: Sequence[Any], classes: np.ndarray) -> Dict[Any, int]:
+    return dict(zip(members, classes.tolist()))
+
+
+def _bit_map(members: Sequence[Any], positions: np.ndarray, shift: int = 0) -> Dict[Any, int]:
+    return {member: 1 << (position + shift)
+            for member, position in zip(members, positions.tolist()) if position >= 0}
+
+
+def _chunk_tables(values: Sequence[int]) -> List[List[int]]:
+    """
+    Lookup tables for a bitset whose bit i stands for values[i]: one per
+    _CHUNK-bit slice, mapping the slice to the OR of its set bits' values
+    """
+    tables = []
+    for start in range(0, len(values), _CHUNK):
+        chunk = values[start:start + _CHUNK]
+        table = [0] * (1 << len(chunk))
+        for bits in range(1, len(table)):
+            low_bit = bits & -bits
+            table[bits] = table[bits ^ low_bit] | chunk[low_bit.bit_length() - 1]
+        tables.append(table)
+    return tables
+
+
+def _translate(tables: List[List[int]], bits: int) -> int:
+    packed = 0
+    for table in tables:
+        packed |= table[bits & _CHUNK_MASK]
+        bits >>= _CHUNK
+    return packed
+
+
+class DecisionTable:
+    """
+    The deterministic pipeline under one rule set, answered from compiled tables
+
+    The tables stay read-only views over the mapped file, so worker
+    processes share their pages; only the small class maps and the ranked
+    cause records are copied out when the table is loaded.
+    """
+
+    def __init__(self, tables: Dict[str, np.ndarray], rules: RuleSet):
+        if tables["fingerprint"].tobytes() != pipeline_fingerprint(rules):
+            raise StaleDecisionTable(
+                f"decision table was not compiled from rule set {rules.version} and this knowledge base;"
+                " recompile it"
+            )
+        self.tables = tables
+        self.rules = rules
+        symptoms, triggers = list(AssociatedSymptom), list(Trigger)
+        self._region_class = _class_map(list(BodyRegion), tables["region_class"])
+        self._pain_class = _class_map([None, *PainType], tables["pain_class"])
+        self._intensity_class = tables["intensity_class"].tolist()
+        self._duration_class = _class_map([None, *SymptomDuration], tables["duration_class"])
+        self._onset_class = _class_map([None, *Onset], tables["onset_class"])
+
+        shared_bits = _bit_map(symptoms, tables["red_flag_symptom_bits"])
+        for symptom, bit in _bit_map(symptoms, tables["urgency_symptom_bits"], _URGENCY_SHIFT).items():
+            shared_bits[symptom] = shared_bits.get(symptom, 0) | bit
+        # Per region class: (symptom tables, trigger tables, base, strides),
+        # the tables translating record bitsets with _translate
+        self._regions = []
+        for r, base in enumerate(tables["cause_base"].tolist()):
+            symptom_bits = dict(shared_bits)
+            for symptom, bit in _bit_map(symptoms, tables["cause_symptom_bits"][r], _CAUSE_SHIFT).items():
+                symptom_bits[symptom] = symptom_bits.get(symptom, 0) | bit
+            trigger_shift = int((tables["cause_symptom_bits"][r] >= 0).sum())
+            trigger_bits = _bit_map(triggers, tables["cause_trigger_bits"][r], trigger_shift)
+            self._regions.append((
+                _chunk_tables([symptom_bits.get(symptom, 0) for symptom in symptoms]),
+                _chunk_tables([trigger_bits.get(trigger, 0) for trigger in triggers]),
+                base,
+                tuple(tables["cause_strides"][r].tolist()),
+            ))
+
+        self._red_flags = tables["red_flags"]
+        self._urgency = tables["urgency"]
+        self._cells = tables["cause_cells"]
+        # Ranked causes as analysis.Triage causes
+        self._records = [
+            tuple((index, probability)
+                  for index, probability in zip(indexes, probabilities) if index != NO_CONDITION)
+            or FALLBACK_CAUSES
+            for indexes, probabilities in zip(tables["cause_conditions"].tolist(),
+                                              tables["cause_probabilities"].tolist())
+        ]
+
+    @property
+    def size(self) -> int:
+        """Bytes of table data"""
+        return sum(table.nbytes for table in self.tables.values())
+
+    def triage(self, record: SymptomRecord) -> Triage:
+        """Same result as analysis.triage under the table's rule set, from the tables"""
+        region = self._region_class[record.region]
+        symptom_tables, trigger_tables, base, (pain_stride, intensity_stride, duration_stride, onset_stride) = (
+            self._regions[region]
+        )
+        packed = _translate(symptom_tables, record.symptoms)
+        intensity = self._intensity_class[min(max(record.intensity or 0, 0), MAX_INTENSITY)]
+
+        rule = self._red_flags.item((region, intensity, packed & _SEGMENT_MASK))
+        if rule != NO_RULE:
+            rule = self.rules.red_flags.rules[rule]
+            return Triage(UrgencyLevel.emergency, rule, (), rule.result.aiExplanation, self.rules)
+
+        duration = self._duration_class[record.duration]
+        level = URGENCY_LEVELS[self._urgency.item((intensity, duration, packed >> _URGENCY_SHIFT & _SEGMENT_MASK))]
+
+        cell = (base
+                + self._pain_class[record.pain_type] * pain_stride
+                + intensity * intensity_stride
+                + duration * duration_stride
+                + self._onset_class[record.onset] * onset_stride
+                + (_translate(trigger_tables, record.triggers) | packed >> _CAUSE_SHIFT))
+        causes = self._records[self._cells.item(cell)]
+        return Triage(level, None, causes, record_explanation(record, causes), self.rules)
+
+    def analyze(self, data: SymptomDataRequest) -> AnalysisResult:
+        """Same result as analysis.analyze, from the tables"""
+        return triage_result(self.triage(record_from_request(data)))
+
+
+def load_decision_table(path: str = DECISION_TABLE_PATH, rules: Optional[RuleSet] = None) -> DecisionTable:
+    """
+    Map a compiled table file for a rule set (the active one by default)
+
+    Raises:
+        StaleDecisionTable: if it does not match the rule set or knowledge base
+    """
+    return DecisionTable(map_tables(path), rules or RULE_SETS.current)
+
+
+# Verification
+
+def _random_request(rng: random.Random) -> SymptomDataRequest:
+    """Any request the API accepts, including out-of-range intensities and repeats"""
+    def maybe(members: Sequence[Any]) -> Any:
+        return rng.choice([None, *members])
+
+    density = rng.choice((0.1, 0.3))
+    symptoms = [s for s in AssociatedSymptom if rng.random() < density]
+    symptoms += rng.sample(symptoms, rng.randint(0, len(symptoms)))
+    return SymptomDataRequest.model_construct(
+        bodyRegion=rng.choice(list(BodyRegion)),
+        painType=maybe(list(PainType)),
+        intensity=rng.choice([None, rng.randint(-3, MAX_INTENSITY + 5), rng.randint(0, MAX_INTENSITY)]),
+        duration=maybe(list(SymptomDuration)),
+        durationValue=None,
+        onset=maybe(list(Onset)),
+        triggers=[t for t in Trigger if rng.random() < 0.3],
+        associatedSymptoms=symptoms,
+        ageRange=None,
+        biologicalSex=None,
+        timestamp="",
+    )
+
+
+def _edge_requests() -> List[SymptomDataRequest]:
+    """Every value of every scalar field, each symptom and trigger alone, on every region"""
+    requests = []
+    intensities = [None, *range(-1, MAX_INTENSITY + 3)]
+    for region in BodyRegion:
+        for field, values in (("painType", list(PainType)), ("intensity", intensities),
+                              ("duration", list(SymptomDuration)), ("onset", list(Onset)),
+                              ("triggers", [[t] for t in Trigger]),
+                              ("associatedSymptoms", [[s] for s in AssociatedSymptom])):
+            for value in values:
+                requests.append(SymptomDataRequest.model_construct(**{
+                    "bodyRegion": region, "painType": None, "intensity": None, "duration": None,
+                    "onset": None, "triggers": [], "associatedSymptoms": [], "timestamp": "",
+                    field: value,
+                }))
+    return requests
+
+
+def verify(table: DecisionTable, samples: int = 200000, seed: int = 7) -> Dict[str, Any]:
+    """
+    Compare the table with analysis.analyze under the table's rule set
+
+    Checks one request per value of each field on every region, then
+    `samples` random requests. Returns counts and the first mismatches.
+    """
+    rng = random.Random(seed)
+    requests = _edge_requests() + [_random_request(rng) for _ in range(samples)]
+    mismatches = []
+    for data in requests:
+        expected = analyze(data, table.rules).model_dump(mode="json")
+        actual = table.analyze(data).model_dump(mode="json")
+        if actual != expected:
+            mismatches.append({"request": data.model_dump(mode="json"), "expected": expected, "actual": actual})
+    return {"checked": len(requests), "mismatches": len(mismatches), "examples": mismatches[:5]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="compile a rule set and the knowledge base")
+    compile_parser.add_argument("-o", "--output", default=DECISION_TABLE_PATH or "decision_table.bin")
+    verify_parser = commands.add_parser("verify", help="diff a compiled table against the live pipeline")
+    verify_parser.add_argument("path", nargs="?", default=DECISION_TABLE_PATH,
+                               help="table file (default: compile one to a temp file)")
+    verify_parser.add_argument("--samples", type=int, default=200000)
+    verify_parser.add_argument("--seed", type=int, default=7)
+    for command_parser in (compile_parser, verify_parser):
+        command_parser.add_argument("--rules", default=RULES_PATH, help=f"rule set file (default: {RULES_PATH})")
+    args = parser.parse_args()
+
+    try:
+        rules = load_rule_set(args.rules)
+    except RuleSetError as e:
+        sys.exit(str(e))
+
+    if args.command == "compile":
+        start = time.perf_counter()
+        try:
+            tables = compile_decision_table(args.output, rules)
+        except TableTooLarge as e:
+            sys.exit(str(e))
+        print(f"wrote {args.output}: {sum(t.nbytes for t in tables.values())} bytes,"
+              f" {tables['cause_cells'].size} cause cells, {tables['cause_conditions'].shape[0]} distinct rankings,"
+              f" {time.perf_counter() - start:.1f}s")
+        return
+
+    path = args.path
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(prefix="decision-table-"), "decision_table.bin")
+        try:
+            compile_decision_table(path, rules)
+        except TableTooLarge as e:
+            sys.exit(str(e))
+    try:
+        table = load_decision_table(path, rules)
+    except StaleDecisionTable as e:
+        sys.exit(f"{path}: {e}")
+    report = verify(table, args.samples, args.seed)
+    print(f"{path}: {report['checked']} requests checked, {report['mismatches']} mismatches")
+    for example in report["examples"]:
+        print(json.dumps(example))
+    if report["mismatches"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Background AI Enrichment
+Deterministic results are returned immediately; AI explanations are
+computed by a bounded in-process job queue and fetched by job id
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from ai_service import AIService, get_ai_service
+from models import EnrichmentJob, EnrichmentStatus, SymptomDataRequest
+from safety import UnsafeContentError
+
+ENRICHMENT_WORKERS = int(os.getenv("ENRICHMENT_WORKERS", "8"))
+ENRICHMENT_QUEUE_SIZE = int(os.getenv("ENRICHMENT_QUEUE_SIZE", "1000"))
+ENRICHMENT_MAX_JOBS = int(os.getenv("ENRICHMENT_MAX_JOBS", "10000"))
+ENRICHMENT_JOB_DIR = os.getenv("ENRICHMENT_JOB_DIR", "")
+
+# Longest a client may long-poll for a job in one request
+MAX_WAIT_SECONDS = 30.0
+# How often a long-poll re-reads a shared store for a job run by another worker
+ENRICHMENT_POLL_SECONDS = float(os.getenv("ENRICHMENT_POLL_SECONDS", "0.25"))
+
+
+class InMemoryJobStore:
+    """Bounded job store; the oldest jobs are dropped once max_jobs is exceeded"""
+
+    # Calls return without I/O, so they run on the event loop
+    blocking = False
+    # Only this process sees the jobs
+    shared = False
+
+    def __init__(self, max_jobs: int = ENRICHMENT_MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, EnrichmentJob]" = OrderedDict()
+
+    def put(self, job: EnrichmentJob) -> None:
+        self._jobs[job.jobId] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def get(self, job_id: str) -> Optional[EnrichmentJob]:
+        return self._jobs.get(job_id)
+
+
+class FileJobStore:
+    """
+    Job store backed by one JSON file per job
+
+    Lets jobs survive a restart and be read by any worker process sharing
+    the directory. Files are written atomically; the store removes the
+    oldest files it created once max_jobs is exceeded.
+    """
+
+    # Calls do file I/O, so EnrichmentQueue runs them in worker threads
+    blocking = True
+    # Other processes using the directory see the jobs too
+    shared = True
+
+    def __init__(self, directory: str, max_jobs: int = ENRICHMENT_MAX_JOBS):
+        self.directory = directory
+        self.max_jobs = max_jobs
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def put(self, job: EnrichmentJob) -> None:
+        path = self._path(job.jobId)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(job.model_dump_json())
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            # Status updates keep a job's place: the oldest jobs created go first
+            self._order.setdefault(job.jobId, None)
+            expired = []
+            while len(self._order) > self.max_jobs:
+                expired.append(self._order.popitem(last=False)[0])
+        for old_id in expired:
+            try:
+                os.remove(self._path(old_id))
+            except FileNotFoundError:
+                pass
+
+    def get(self, job_id: str) -> Optional[EnrichmentJob]:
+        # Job ids are generated as uuid4 hex; reject anything else so the
+        # id can never escape the store directory
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return EnrichmentJob.model_validate(json.load(f))
+        except FileNotFoundError:
+            return None
+
+
+class EnrichmentQueue:
+    """
+    Bounded queue of AI explanation jobs served by a pool of worker tasks
+
+    submit() never waits for a slot: when the queue is full (or the job
+    cannot be stored) the job is rejected and the caller simply returns the
+    deterministic result without a job id. Calls to a blocking store run in
+    worker threads, off the event loop. Without an ai_service the shared
+    one is created by the first job.
+    """
+
+    def __init__(self, ai_service: Optional[AIService], store, workers: int = ENRICHMENT_WORKERS,
+                 max_queue_size: int = ENRICHMENT_QUEUE_SIZE):
+        self._ai_service = ai_service
+        self.store = store
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._done_events: Dict[str, asyncio.Event] = {}
+
+    @property
+    def ai_service(self) -> AIService:
+        if self._ai_service is None:
+            self._ai_service = get_ai_service()
+        return self._ai_service
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _put(self, job: EnrichmentJob) -> None:
+        if self.store.blocking:
+            await asyncio.to_thread(self.store.put, job)
+        else:
+            self.store.put(job)
+
+    async def _get(self, job_id: str) -> Optional[EnrichmentJob]:
+        if self.store.blocking:
+            return await asyncio.to_thread(self.store.get, job_id)
+        return self.store.get(job_id)
+
+    async def submit(self, data: SymptomDataRequest) -> Optional[str]:
+        """Queue an enrichment job; returns its id, or None if the queue is full"""
+        if self._queue is None or self._queue.full():
+            return None
+        job = EnrichmentJob(
+            jobId=uuid.uuid4().hex,
+            status=EnrichmentStatus.pending,
+            createdAt=time.time(),
+        )
+        try:
+            await self._put(job)
+        except OSError as e:
+            _log(f"job {job.jobId} could not be stored: {e}")
+            return None
+        if self._queue.full():
+            # Filled up while the job was stored; its record is never
+            # handed out and ages out of the store
+            return None
+        self._done_events[job.jobId] = asyncio.Event()
+        self._queue.put_nowait((job, data))
+        return job.jobId
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[EnrichmentJob]:
+        """
+        Return the job, waiting up to timeout seconds for it to finish
+
+        A job queued in this process is awaited directly. One in a shared
+        store may be running in another worker; the store is then re-read
+        every ENRICHMENT_POLL_SECONDS until the job finishes or time is up.
+        """
+        timeout = min(timeout, MAX_WAIT_SECONDS)
+        event = self._done_events.get(job_id)
+        if event is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await self._get(job_id)
+
+        job = await self._get(job_id)
+        if event is None and self.store.shared and timeout > 0:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while job is not None and job.status in _UNFINISHED:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(ENRICHMENT_POLL_SECONDS, remaining))
+                job = await self._get(job_id)
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job, data = await self._queue.get()
+            try:
+                await self._run(job, data)
+            finally:
+                event = self._done_events.pop(job.jobId, None)
+                if event is not None:
+                    event.set()
+                self._queue.task_done()
+
+    async def _run(self, job: EnrichmentJob, data: SymptomDataRequest) -> None:
+        job = job.model_copy(update={"status": EnrichmentStatus.running})
+        try:
+            await self._put(job)
+            response = await self.ai_service.analyze_symptoms_async(data.model_dump(mode="json"))
+            # Provider responses are validated by the service; placeholder
+            # and cached ones are checked here as well
+            if not self.ai_service.validate_response(response):
+                update = {"status": EnrichmentStatus.failed, "error": "AI response failed safety validation"}
+            else:
+                update = {"status": EnrichmentStatus.completed, "aiExplanation": response["explanation"]}
+        except UnsafeContentError:
+            update = {"status": EnrichmentStatus.failed, "error": "AI response failed safety validation"}
+        except Exception as e:
+            update = {"status": EnrichmentStatus.failed, "error": f"AI enrichment failed: {str(e)}"}
+        update["completedAt"] = time.time()
+        try:
+            await self._put(job.model_copy(update=update))
+        except OSError as e:
+            # The worker carries on; the job stays at its last stored status
+            _log(f"job {job.jobId} could not be stored: {e}")
+
+
+_UNFINISHED = (EnrichmentStatus.pending, EnrichmentStatus.running)
+
+
+def _log(message: str) -> None:
+    print(f"[enrichment] {message}", file=sys.stderr)
+
+
+def create_job_store():
+    """File-backed store when ENRICHMENT_JOB_DIR is set, in-memory otherwise"""
+    if ENRICHMENT_JOB_DIR:
+        return FileJobStore(ENRICHMENT_JOB_DIR)
+    return InMemoryJobStore()
+
+
+ENRICHMENT_QUEUE = EnrichmentQueue(None, create_job_store())
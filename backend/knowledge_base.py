@@ -0,0 +1,190 @@
+"""
+Condition Knowledge Base
+Conditions are loaded from a versioned data file and indexed by region,
+pain type and associated symptom so cause generation only scores the
+candidates the indexes return
+"""
+
+import json
+import os
+from enum import Enum
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, field_validator
+
+from models import (
+    AssociatedSymptom,
+    BodyRegion,
+    Onset,
+    PainType,
+    PossibleCause,
+    SymptomDuration,
+    Trigger,
+)
+from records import SymptomRecord
+from rules import symptom_mask
+
+KNOWLEDGE_BASE_PATH = os.getenv(
+    "KNOWLEDGE_BASE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "conditions.json"),
+)
+
+
+class IntensityBucket(str, Enum):
+    mild = "mild"          # 1-3
+    moderate = "moderate"  # 4-6
+    severe = "severe"      # 7-10
+
+
+def intensity_bucket(intensity: Optional[int]) -> Optional[IntensityBucket]:
+    """Bucket a reported intensity; missing or zero intensity has no bucket"""
+    if not intensity or intensity <= 0:
+        return None
+    if intensity <= 3:
+        return IntensityBucket.mild
+    if intensity <= 6:
+        return IntensityBucket.moderate
+    return IntensityBucket.severe
+
+
+class Evidence(BaseModel):
+    """
+    Likelihood ratios P(finding | condition) / P(finding | not condition)
+
+    Values above 1 make the condition more likely when the finding is
+    reported, values below 1 less likely. Unlisted findings are neutral.
+    """
+    painType: Dict[PainType, float] = {}
+    onset: Dict[Onset, float] = {}
+    duration: Dict[SymptomDuration, float] = {}
+    intensity: Dict[IntensityBucket, float] = {}
+    triggers: Dict[Trigger, float] = {}
+    associatedSymptoms: Dict[AssociatedSymptom, float] = {}
+
+    @field_validator("*")
+    @classmethod
+    def positive_ratios(cls, ratios: Dict[str, float]) -> Dict[str, float]:
+        for finding, ratio in ratios.items():
+            if ratio <= 0:
+                raise ValueError(f"likelihood ratio for {finding} must be positive")
+        return ratios
+
+
+class Condition(BaseModel):
+    """
+    One condition in the knowledge base
+
+    A condition is a candidate when the request's region is in `regions`
+    (if any are listed), its pain type is in `painTypes` (if any are listed), every symptom in
+    `requiredSymptoms` is present and the intensity is at least `minIntensity`.
+    `probability` is the prior for a candidate, adjusted by `evidence`.
+    """
+    id: str
+    name: str
+    description: str
+    probability: float
+    matchingSymptoms: List[str]
+    regions: List[BodyRegion] = []
+    painTypes: List[PainType] = []
+    requiredSymptoms: List[AssociatedSymptom] = []
+    minIntensity: Optional[int] = None
+    evidence: Evidence = Evidence()
+
+
+class KnowledgeBaseFile(BaseModel):
+    version: str
+    conditions: List[Condition]
+    fallback: Condition
+
+
+class KnowledgeBase:
+    """
+    Indexed condition knowledge base
+
+    Posting lists are stored as integer bitsets over condition positions.
+    A lookup intersects the region list with the pain type and symptom
+    lists, then checks the remaining constraints on those candidates only.
+    """
+
+    def __init__(self, data: KnowledgeBaseFile):
+        self.version = data.version
+        self.conditions = data.conditions
+        self.fallback = PossibleCause(
+            name=data.fallback.name,
+            description=data.fallback.description,
+            probability=data.fallback.probability,
+            matchingSymptoms=data.fallback.matchingSymptoms,
+        )
+
+        self.by_region: Dict[BodyRegion, int] = {region: 0 for region in BodyRegion}
+        self.by_pain_type: Dict[PainType, int] = {pain: 0 for pain in PainType}
+        self.by_symptom: Dict[AssociatedSymptom, int] = {symptom: 0 for symptom in AssociatedSymptom}
+        # Conditions that place no constraint on pain type / symptoms
+        self.any_pain_type = 0
+        self.no_required_symptoms = 0
+
+        for index, condition in enumerate(self.conditions):
+            bit = 1 << index
+            # No regions listed means any region, as for pain types
+            for region in condition.regions or BodyRegion:
+                self.by_region[region] |= bit
+            if condition.painTypes:
+                for pain in condition.painTypes:
+                    self.by_pain_type[pain] |= bit
+            else:
+                self.any_pain_type |= bit
+            if condition.requiredSymptoms:
+                for symptom in condition.requiredSymptoms:
+                    self.by_symptom[symptom] |= bit
+            else:
+                self.no_required_symptoms |= bit
+
+        # Symptom postings by rules.SYMPTOM_BITS position, and each
+        # condition's required symptoms as a mask over the same bits
+        self._by_symptom_bit = [self.by_symptom[symptom] for symptom in AssociatedSymptom]
+        self._required_masks = [symptom_mask(c.requiredSymptoms) for c in self.conditions]
+
+    def candidates(self, record: SymptomRecord) -> int:
+        """Bitset of conditions whose region, pain type and symptom postings match"""
+        pain_types = self.any_pain_type
+        if record.pain_type:
+            pain_types |= self.by_pain_type[record.pain_type]
+
+        symptoms = self.no_required_symptoms
+        present = record.symptoms
+        while present:
+            low_bit = present & -present
+            symptoms |= self._by_symptom_bit[low_bit.bit_length() - 1]
+            present ^= low_bit
+
+        return self.by_region[record.region] & pain_types & symptoms
+
+    def candidate_indices(self, record: SymptomRecord) -> List[int]:
+        """Positions of matching conditions, in knowledge base order"""
+        candidates = self.candidates(record)
+        intensity = record.intensity or 0
+        present = record.symptoms
+        indices = []
+        while candidates:
+            low_bit = candidates & -candidates
+            index = low_bit.bit_length() - 1
+            candidates ^= low_bit
+
+            condition = self.conditions[index]
+            if condition.minIntensity is not None and intensity < condition.minIntensity:
+                continue
+            # The posting lists only guarantee one required symptom is present
+            required = self._required_masks[index]
+            if present & required != required:
+                continue
+            indices.append(index)
+        return indices
+
+
+def load_knowledge_base(path: str = KNOWLEDGE_BASE_PATH) -> KnowledgeBase:
+    """Load, validate and index a knowledge base file"""
+    with open(path, "r", encoding="utf-8") as f:
+        return KnowledgeBase(KnowledgeBaseFile.model_validate(json.load(f)))
+
+
+KNOWLEDGE_BASE = load_knowledge_base()
@@ -0,0 +1,291 @@
+"""
+Local Explanation Provider
+CPU-only provider for AIService that needs no credentials or network:
+explanations are written from the knowledge base's condition descriptions,
+optionally by a quantized model
+
+The symptoms in the prompt (see prompts.parse_compact_prompt) are matched
+against the knowledge base with the index and scorer of the deterministic
+pipeline, and the descriptions of the best matches are filled into a
+template of hedged, non-diagnostic sentences. With LOCAL_MODEL set to a
+quantized GGUF model file (needs llama-cpp-python), the model writes the
+explanation from the prompt and those descriptions instead; output that
+is empty or fails the safety validator is replaced by the template text.
+
+Generation runs in a pool of worker processes, so scoring and model
+inference never hold the event loop (or the GIL) of the serving process.
+The router treats the provider as a fallback: listed after a remote
+provider it is only used when that provider is failing, or it can serve
+every explanation on its own for offline deployments.
+
+Usage:
+    AI_PROVIDER=local python main.py
+    AI_PROVIDERS=openai,local LOCAL_MODEL=models/explainer.Q4_K_M.gguf python main.py
+"""
+
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from knowledge_base import KNOWLEDGE_BASE
+from metrics import LOCAL_EXPLANATIONS_TOTAL, PROVIDER_REQUESTS_TOTAL
+from models import SymptomDataRequest, Trigger
+from prompts import parse_compact_prompt
+from providers import AsyncProviderClient, ProviderConfig, ProviderError
+from records import record_from_request
+from safety import DEFAULT_VALIDATOR
+from scoring import SCORER
+
+# Worker processes per serving process (per worker under serve.py)
+LOCAL_WORKERS = int(os.getenv("LOCAL_WORKERS", "2"))
+# Conditions described per explanation
+LOCAL_TOP_CAUSES = int(os.getenv("LOCAL_TOP_CAUSES", "3"))
+# llama.cpp threads per worker process; 0 shares the cores between the workers
+LOCAL_MODEL_THREADS = int(os.getenv("LOCAL_MODEL_THREADS", "0"))
+LOCAL_MODEL_CONTEXT = int(os.getenv("LOCAL_MODEL_CONTEXT", "2048"))
+
+# Workers are started from a clean server process rather than forked from
+# the serving one, whose other threads may be holding locks
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+CLOSING = (
+    "This is educational information only and not a diagnosis. Please consult a healthcare "
+    "professional for a proper evaluation, and seek urgent care if the symptoms get worse "
+    "or new ones appear."
+)
+
+# (name, description, probability) of a retrieved condition
+Cause = Tuple[str, str, float]
+
+
+def _words(value: str) -> str:
+    """Enum value as lowercase words: abdomenUpperRight -> abdomen upper right"""
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", " ", value).lower()
+
+
+def _join(items: List[str]) -> str:
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def symptoms_from_prompt(prompt: str) -> SymptomDataRequest:
+    """
+    The symptoms a build_prompt user message describes
+
+    Raises:
+        ValueError: if the prompt does not describe a body region and valid symptoms
+    """
+    try:
+        return SymptomDataRequest.model_validate({**parse_compact_prompt(prompt), "timestamp": ""})
+    except ValidationError as e:
+        # A plain ValueError, since it has to cross the process boundary
+        raise ValueError(f"prompt does not describe valid symptoms ({e.error_count()} errors)") from None
+
+
+def retrieve(data: SymptomDataRequest, limit: int = LOCAL_TOP_CAUSES) -> List[Cause]:
+    """Best matching conditions, most likely first; the knowledge base fallback if none match"""
+    scored = SCORER.scores(record_from_request(data))[:limit]
+    if not scored:
+        fallback = KNOWLEDGE_BASE.fallback
+        return [(fallback.name, fallback.description, fallback.probability)]
+    conditions = KNOWLEDGE_BASE.conditions
+    return [(conditions[index].name, conditions[index].description, probability)
+            for index, probability in scored]
+
+
+def template_explanation(data: SymptomDataRequest, causes: List[Cause]) -> str:
+    """The symptoms and retrieved conditions in fixed, hedged sentences"""
+    opening = f"{_words(data.painType.value).capitalize()} pain" if data.painType else "Pain"
+    opening += f" in the {_words(data.bodyRegion.value)} area"
+    details = []
+    if data.intensity:
+        details.append(f"rated {data.intensity}/10")
+    if data.duration:
+        amount = f"{data.durationValue} " if data.durationValue else ""
+        details.append(f"for {amount}{data.duration.value}")
+    if data.onset:
+        details.append(f"that started {data.onset.value}ly")
+    if details:
+        opening += ", " + ", ".join(details) + ","
+    paragraphs = [f"{opening} can have several possible explanations."]
+
+    (name, description, _), others = causes[0], causes[1:]
+    sentences = [f"One possibility is {name}. {description}"]
+    sentences.extend(f"{name} could also fit. {description}" for name, description, _ in others)
+    paragraphs.append(" ".join(sentences))
+
+    context = []
+    symptoms = sorted({_words(symptom.value) for symptom in data.associatedSymptoms})
+    if symptoms:
+        context.append(f"the {_join(symptoms)} reported alongside it")
+    triggers = sorted({_words(trigger.value) for trigger in data.triggers if trigger is not Trigger.none})
+    if triggers:
+        context.append(f"the way it changes with {_join(triggers)}")
+    if context:
+        subject = " and ".join(context)
+        paragraphs.append(
+            f"{subject[0].upper()}{subject[1:]} may help a healthcare professional narrow these possibilities down."
+        )
+
+    paragraphs.append(CLOSING)
+    return "\n\n".join(paragraphs)
+
+
+def model_explanation(model: Any, system_prompt: str, prompt: str, causes: List[Cause],
+                      max_tokens: int) -> str:
+    """The model's explanation, given the retrieved descriptions as reference material"""
+    reference = "\n".join(f"- {name}: {description}" for name, description, _ in causes)
+    completion = model.create_chat_completion(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"{prompt}\nCondition descriptions to draw on:\n{reference}"},
+        ],
+        temperature=0.3,  # Same as the remote providers
+        max_tokens=max_tokens,
+    )
+    return (completion["choices"][0]["message"]["content"] or "").strip()
+
+
+def generate_explanation(system_prompt: str, prompt: str, max_tokens: int,
+                         model: Any = None) -> Tuple[str, str]:
+    """
+    Explanation for a prompt and the generator that wrote it
+    ("template", "model", or "model_rejected" when the model's output was
+    replaced by the template text)
+
+    Raises:
+        ValueError: if the prompt does not describe valid symptoms
+    """
+    data = symptoms_from_prompt(prompt)
+    causes = retrieve(data)
+    if model is None:
+        return template_explanation(data, causes), "template"
+    try:
+        text = model_explanation(model, system_prompt, prompt, causes, max_tokens)
+    except (ValueError, RuntimeError):
+        # e.g. a prompt longer than the context window
+        text = ""
+    if text and DEFAULT_VALIDATOR.is_safe_text(text):
+        return text, "model"
+    return template_explanation(data, causes), "model_rejected"
+
+
+# Loaded once per worker process by _init_worker
+_worker_model: Any = None
+
+
+def _init_worker(model_path: str, threads: int, context: int) -> None:
+    global _worker_model
+    if model_path:
+        from llama_cpp import Llama
+        _worker_model = Llama(model_path=model_path, n_ctx=context, n_threads=threads, verbose=False)
+
+
+def _generate_in_worker(system_prompt: str, prompt: str, max_tokens: int) -> Tuple[str, str]:
+    return generate_explanation(system_prompt, prompt, max_tokens, _worker_model)
+
+
+def _ready() -> bool:
+    return True
+
+
+class LocalProvider(AsyncProviderClient):
+    """
+    Provider client that generates explanations in local worker processes
+
+    config.model is the path of a GGUF model file, or empty for the template
+    generator alone. Calls are bounded by the config's concurrency limit
+    and timeout. If a worker process dies, the pool is replaced and the
+    call retried up to config.max_retries times.
+    """
+
+    fallback = True
+
+    def __init__(self, config: ProviderConfig, workers: int = LOCAL_WORKERS,
+                 model_threads: int = LOCAL_MODEL_THREADS, model_context: int = LOCAL_MODEL_CONTEXT):
+        super().__init__(config)
+        if config.model and importlib.util.find_spec("llama_cpp") is None:
+            raise ValueError("a local model needs llama-cpp-python (pip install llama-cpp-python)")
+        self.workers = max(1, workers)
+        self.model_threads = model_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.model_context = model_context
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def configured(self) -> bool:
+        """Always: the local provider needs no credentials"""
+        return True
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # Worker processes start on the first calls (or in prepare)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(START_METHOD),
+                initializer=_init_worker,
+                initargs=(self.config.model, self.model_threads, self.model_context),
+            )
+        return self._pool
+
+    def prepare(self) -> None:
+        """Start every worker process, and load the model, now rather than on the first calls"""
+        for future in [self.pool.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _complete(self, system_prompt: str, prompt: str) -> str:
+        name = self.config.name
+        loop = asyncio.get_running_loop()
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.config.max_retries + 1):
+            if attempt:
+                PROVIDER_REQUESTS_TOTAL.inc(name, "retry")
+            pool = self.pool
+            try:
+                async with self.semaphore:
+                    text, generator = await asyncio.wait_for(
+                        loop.run_in_executor(pool, _generate_in_worker, system_prompt, prompt,
+                                             self.config.max_output_tokens),
+                        self.config.timeout,
+                    )
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory loading the model)
+                self._discard(pool)
+                last_error = e
+                continue
+            except asyncio.TimeoutError:
+                PROVIDER_REQUESTS_TOTAL.inc(name, "error")
+                raise ProviderError(f"{name} generation timed out after {self.config.timeout}s") from None
+            except ValueError as e:
+                PROVIDER_REQUESTS_TOTAL.inc(name, "error")
+                raise ProviderError(f"{name} generation failed: {e}") from e
+            LOCAL_EXPLANATIONS_TOTAL.inc(generator)
+            PROVIDER_REQUESTS_TOTAL.inc(name, "success")
+            return text
+
+        PROVIDER_REQUESTS_TOTAL.inc(name, "error")
+        raise ProviderError(
+            f"{name} worker pool failed after {self.config.max_retries + 1} attempts: {last_error}"
+        ) from last_error
+
+    async def stream(self, system_prompt: str, prompt: str) -> AsyncIterator[str]:
+        """The explanation is generated whole, then released word by word"""
+        words = (await self.complete(system_prompt, prompt)).split(" ")
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + " "
+
+    async def aclose(self) -> None:
+        if self._pool is not None:
+            self._discard(self._pool)
@@ -1,9 +1,66 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-from enum import Enum
-import uvicorn
+from fastapi.responses import Response, StreamingResponse
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+import asyncio
+import email.message
+import hmac
+import json
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from models import (
+    AnalysisResult,
+    BodyRegion,
+    EnrichedAnalysisResult,
+    EnrichmentJob,
+    PainType,
+    SessionState,
+    SessionUpdate,
+    SymptomDataRequest,
+)
+from analysis import (
+    Triage,
+    record_triage,
+    triage,
+    triage_result,
+)
+from admission import ADMISSION, RATE_LIMITER, AdmissionMiddleware
+from batch import MAX_BATCH_SIZE, analyze_batch
+from ai_service import get_ai_service, loaded_ai_service
+from cache import ANALYSIS_CACHE
+from decision_table import DECISION_TABLE_PATH, DecisionTable, StaleDecisionTable, load_decision_table
+from enrichment import ENRICHMENT_QUEUE, MAX_WAIT_SECONDS
+from metrics import (
+    ADMISSION_TOTAL,
+    CONTENT_TYPE,
+    METRICS_ENABLED,
+    METRICS_MULTIPROC_DIR,
+    REGISTRY,
+    STAGE_SECONDS,
+    cache_stats_collector,
+    flush_snapshots,
+)
+from providers import close_provider_clients, get_provider_client
+from records import SymptomRecord, decode_record, record_from_request
+from rendering import json_response, renderer_for
+from rules import (
+    RULE_SETS,
+    RULES_ADMIN_TOKEN,
+    RULES_PATH,
+    RULES_WATCH_INTERVAL,
+    RuleSet,
+    RuleSetError,
+    RuleSetFile,
+    watch_rule_file,
+    write_rule_set,
+)
+from replay import DEFAULT_CHUNK_SIZE, BodyStreamingResponse, replay_stream
+from sessions import SESSIONS
+from streaming import SSE_HEADERS, analysis_events
 
 app = FastAPI(
     title="Symptom Checker API",
@@ -11,6 +68,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Per-client rate limits and admission control for /api/ (see admission.py);
+# added first so that CORS headers are still applied to its 429/503 answers
+app.add_middleware(AdmissionMiddleware, limiter=RATE_LIMITER, controller=ADMISSION)
+
 # CORS middleware for Flutter app
 app.add_middleware(
     CORSMiddleware,
@@ -20,330 +81,174 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Enums
-class BodyRegion(str, Enum):
-    headFront = "headFront"
-    headBack = "headBack"
-    headLeft = "headLeft"
-    headRight = "headRight"
-    chest = "chest"
-    abdomenUpperLeft = "abdomenUpperLeft"
-    abdomenUpperRight = "abdomenUpperRight"
-    abdomenLowerLeft = "abdomenLowerLeft"
-    abdomenLowerRight = "abdomenLowerRight"
-
-class PainType(str, Enum):
-    sharp = "sharp"
-    dull = "dull"
-    burning = "burning"
-    pressure = "pressure"
-    stabbing = "stabbing"
-    throbbing = "throbbing"
-    cramping = "cramping"
-
-class SymptomDuration(str, Enum):
-    minutes = "minutes"
-    hours = "hours"
-    days = "days"
-    weeks = "weeks"
-    months = "months"
-
-class Onset(str, Enum):
-    sudden = "sudden"
-    gradual = "gradual"
-
-class Trigger(str, Enum):
-    movement = "movement"
-    breathing = "breathing"
-    eating = "eating"
-    stress = "stress"
-    touch = "touch"
-    rest = "rest"
-    none = "none"
-
-class AssociatedSymptom(str, Enum):
-    fever = "fever"
-    nausea = "nausea"
-    vomiting = "vomiting"
-    dizziness = "dizziness"
-    shortnessOfBreath = "shortnessOfBreath"
-    radiatingPain = "radiatingPain"
-    numbness = "numbness"
-    weakness = "weakness"
-    confusion = "confusion"
-    visionChanges = "visionChanges"
-    hearingChanges = "hearingChanges"
-    chestPain = "chestPain"
-    palpitations = "palpitations"
-    sweating = "sweating"
-    chills = "chills"
-    fatigue = "fatigue"
-    lossOfAppetite = "lossOfAppetite"
-    bloodInStool = "bloodInStool"
-    bloodInVomit = "bloodInVomit"
-    severeHeadache = "severeHeadache"
-    neckStiffness = "neckStiffness"
-
-class UrgencyLevel(str, Enum):
-    low = "low"
-    medium = "medium"
-    high = "high"
-    emergency = "emergency"
-
-# Request Models
-class SymptomDataRequest(BaseModel):
-    bodyRegion: BodyRegion
-    painType: Optional[PainType] = None
-    intensity: Optional[int] = None
-    duration: Optional[SymptomDuration] = None
-    durationValue: Optional[int] = None
-    onset: Optional[Onset] = None
-    triggers: List[Trigger] = []
-    associatedSymptoms: List[AssociatedSymptom] = []
-    ageRange: Optional[str] = None
-    biologicalSex: Optional[str] = None
-    timestamp: str
-
-# Response Models
-class PossibleCause(BaseModel):
-    name: str
-    description: str
-    probability: float
-    matchingSymptoms: List[str]
-
-class AnalysisResult(BaseModel):
-    urgencyLevel: UrgencyLevel
-    possibleCauses: List[PossibleCause]
-    guidance: str
-    redFlags: List[str]
-    aiExplanation: str
-    isEmergency: bool
-
-# Red Flag Detection (Rule-based, highest priority)
-def check_red_flags(data: SymptomDataRequest) -> Optional[AnalysisResult]:
-    """
-    Rule-based red flag detection
-    These override any AI analysis for medical safety
-    """
-    symptoms = data.associatedSymptoms
-    region = data.bodyRegion
-    intensity = data.intensity or 0
-    
-    # RED FLAG 1: Chest pain + shortness of breath
-    if region == BodyRegion.chest and AssociatedSymptom.shortnessOfBreath in symptoms:
-        return AnalysisResult(
-            urgencyLevel=UrgencyLevel.emergency,
-            possibleCauses=[
-                PossibleCause(
-                    name="Cardiac Event",
-                    description="Chest pain with breathing difficulty may indicate a serious cardiac condition.",
-                    probability=0.8,
-                    matchingSymptoms=["Chest pain", "Shortness of breath"]
-                )
-            ],
-            guidance="🚨 SEEK IMMEDIATE MEDICAL ATTENTION. Call emergency services or go to the nearest emergency room immediately.",
-            redFlags=["Chest pain with shortness of breath"],
-            aiExplanation="This combination of symptoms requires immediate medical evaluation to rule out serious cardiac conditions.",
-            isEmergency=True
-        )
-    
-    # RED FLAG 2: Severe headache + fever + neck stiffness
-    if (region in [BodyRegion.headFront, BodyRegion.headBack, BodyRegion.headLeft, BodyRegion.headRight] and
-        AssociatedSymptom.severeHeadache in symptoms and
-        AssociatedSymptom.fever in symptoms and
-        AssociatedSymptom.neckStiffness in symptoms):
-        return AnalysisResult(
-            urgencyLevel=UrgencyLevel.emergency,
-            possibleCauses=[
-                PossibleCause(
-                    name="Meningitis",
-                    description="Severe headache with fever and neck stiffness may indicate meningitis.",
-                    probability=0.7,
-                    matchingSymptoms=["Severe headache", "Fever", "Neck stiffness"]
-                )
-            ],
-            guidance="🚨 SEEK IMMEDIATE MEDICAL ATTENTION. This combination requires urgent evaluation.",
-            redFlags=["Severe headache", "Fever", "Neck stiffness"],
-            aiExplanation="These symptoms together may indicate a serious infection requiring immediate treatment.",
-            isEmergency=True
-        )
-    
-    # RED FLAG 3: Abdominal pain + blood in vomit
-    if (region in [BodyRegion.abdomenUpperLeft, BodyRegion.abdomenUpperRight, 
-                   BodyRegion.abdomenLowerLeft, BodyRegion.abdomenLowerRight] and
-        AssociatedSymptom.bloodInVomit in symptoms):
-        return AnalysisResult(
-            urgencyLevel=UrgencyLevel.emergency,
-            possibleCauses=[
-                PossibleCause(
-                    name="Gastrointestinal Bleeding",
-                    description="Abdominal pain with blood in vomit indicates serious GI bleeding.",
-                    probability=0.85,
-                    matchingSymptoms=["Abdominal pain", "Blood in vomit"]
-                )
-            ],
-            guidance="🚨 SEEK IMMEDIATE MEDICAL ATTENTION. Go to the emergency room immediately.",
-            redFlags=["Abdominal pain with blood in vomit"],
-            aiExplanation="Gastrointestinal bleeding requires immediate medical intervention.",
-            isEmergency=True
-        )
-    
-    # RED FLAG 4: Severe pain (8-10) with confusion or weakness
-    if intensity >= 8 and (AssociatedSymptom.confusion in symptoms or AssociatedSymptom.weakness in symptoms):
-        return AnalysisResult(
-            urgencyLevel=UrgencyLevel.emergency,
-            possibleCauses=[
-                PossibleCause(
-                    name="Serious Medical Condition",
-                    description="Severe pain with neurological symptoms requires immediate evaluation.",
-                    probability=0.75,
-                    matchingSymptoms=["Severe pain", "Confusion or weakness"]
-                )
-            ],
-            guidance="🚨 SEEK IMMEDIATE MEDICAL ATTENTION. These symptoms require urgent evaluation.",
-            redFlags=["Severe pain with neurological symptoms"],
-            aiExplanation="The combination of severe pain and neurological symptoms needs immediate medical assessment.",
-            isEmergency=True
-        )
-    
-    # RED FLAG 5: Chest pain + sweating + palpitations
-    if (region == BodyRegion.chest and
-        AssociatedSymptom.sweating in symptoms and
-        AssociatedSymptom.palpitations in symptoms):
-        return AnalysisResult(
-            urgencyLevel=UrgencyLevel.emergency,
-            possibleCauses=[
-                PossibleCause(
-                    name="Cardiac Event",
-                    description="Chest pain with sweating and palpitations may indicate a heart attack.",
-                    probability=0.8,
-                    matchingSymptoms=["Chest pain", "Sweating", "Palpitations"]
-                )
-            ],
-            guidance="🚨 SEEK IMMEDIATE MEDICAL ATTENTION. Call emergency services immediately.",
-            redFlags=["Chest pain with sweating and palpitations"],
-            aiExplanation="These are classic symptoms of a potential cardiac event requiring immediate care.",
-            isEmergency=True
-        )
-    
-    return None
+REGISTRY.register_collector(cache_stats_collector(
+    "symptom_checker_analysis_cache_events_total",
+    "Analysis cache lookups and removals by outcome",
+    ANALYSIS_CACHE.stats,
+    ("hits", "misses", "evictions", "invalidations"),
+))
+REGISTRY.register_collector(cache_stats_collector(
+    "symptom_checker_ai_response_cache_events_total",
+    "AI response cache lookups by outcome",
+    # Read from the shared AIService only once a request has created it
+    lambda: (loaded_ai_service().response_cache.stats()
+             if loaded_ai_service() and loaded_ai_service().response_cache else None),
+    ("hits", "misses"),
+))
+REGISTRY.register_collector(cache_stats_collector(
+    "symptom_checker_ai_single_flight_calls_total",
+    "AI explanation calls that started a provider call (leaders) or joined one in flight (followers)",
+    lambda: loaded_ai_service().in_flight.stats() if loaded_ai_service() else None,
+    ("leaders", "followers"),
+))
 
-def calculate_urgency(data: SymptomDataRequest) -> UrgencyLevel:
-    """Calculate urgency level based on symptoms"""
-    intensity = data.intensity or 0
-    symptoms = data.associatedSymptoms
-    
-    # High urgency indicators
-    if (intensity >= 8 or
-        AssociatedSymptom.shortnessOfBreath in symptoms or
-        AssociatedSymptom.chestPain in symptoms or
-        AssociatedSymptom.confusion in symptoms or
-        AssociatedSymptom.visionChanges in symptoms):
-        return UrgencyLevel.high
-    
-    # Medium urgency indicators
-    if (intensity >= 5 or
-        AssociatedSymptom.fever in symptoms or
-        AssociatedSymptom.vomiting in symptoms or
-        AssociatedSymptom.dizziness in symptoms or
-        data.duration == SymptomDuration.weeks):
-        return UrgencyLevel.medium
-    
-    return UrgencyLevel.low
+REGISTRY.register_collector(cache_stats_collector(
+    "symptom_checker_session_events_total",
+    "Symptom sessions created, updated, expired and evicted",
+    SESSIONS.stats,
+    ("created", "updated", "expired", "evicted"),
+))
 
-def generate_possible_causes(data: SymptomDataRequest) -> List[PossibleCause]:
-    """
-    Generate possible causes based on symptoms
-    In production, this would integrate with an AI service
-    """
-    causes = []
-    
-    # Example logic - in production, use AI with safety constraints
-    if data.bodyRegion in [BodyRegion.headFront, BodyRegion.headBack, 
-                           BodyRegion.headLeft, BodyRegion.headRight]:
-        if data.painType == PainType.throbbing:
-            causes.append(PossibleCause(
-                name="Tension Headache",
-                description="Common type of headache often caused by stress or muscle tension.",
-                probability=0.6,
-                matchingSymptoms=["Head pain", "Throbbing sensation"]
-            ))
-            causes.append(PossibleCause(
-                name="Migraine",
-                description="Severe headache that may be accompanied by sensitivity to light and sound.",
-                probability=0.4,
-                matchingSymptoms=["Head pain", "Throbbing sensation"]
-            ))
-    
-    elif data.bodyRegion == BodyRegion.chest:
-        if data.painType == PainType.pressure:
-            causes.append(PossibleCause(
-                name="Muscle Strain",
-                description="Chest wall muscle strain from physical activity or poor posture.",
-                probability=0.5,
-                matchingSymptoms=["Chest pressure"]
-            ))
-            causes.append(PossibleCause(
-                name="Anxiety",
-                description="Anxiety can cause chest tightness and pressure sensations.",
-                probability=0.3,
-                matchingSymptoms=["Chest pressure"]
-            ))
-    
-    elif data.bodyRegion == BodyRegion.abdomenUpperRight:
-        if AssociatedSymptom.nausea in data.associatedSymptoms:
-            causes.append(PossibleCause(
-                name="Gallbladder Issues",
-                description="Upper right abdominal pain with nausea may indicate gallbladder problems.",
-                probability=0.5,
-                matchingSymptoms=["Upper right abdominal pain", "Nausea"]
-            ))
-    
-    elif data.bodyRegion == BodyRegion.abdomenLowerRight:
-        if data.intensity and data.intensity >= 6:
-            causes.append(PossibleCause(
-                name="Appendicitis",
-                description="Lower right abdominal pain may indicate appendicitis, especially if severe.",
-                probability=0.4,
-                matchingSymptoms=["Lower right abdominal pain"]
-            ))
-    
-    if not causes:
-        causes.append(PossibleCause(
-            name="General Discomfort",
-            description="Various benign causes may lead to discomfort in this area.",
-            probability=0.5,
-            matchingSymptoms=["Pain in selected region"]
-        ))
-    
-    # Sort by probability
-    causes.sort(key=lambda x: x.probability, reverse=True)
-    return causes
+REGISTRY.register_collector(lambda: [(
+    "symptom_checker_admission_requests",
+    "gauge",
+    "API requests inside the application (in_flight) and waiting for admission (queued)",
+    [({"state": "in_flight"}, float(ADMISSION.in_flight)), ({"state": "queued"}, float(ADMISSION.queued))],
+)])
+
+REGISTRY.register_collector(lambda: [(
+    "symptom_checker_rule_set_info",
+    "gauge",
+    "The active rule set version",
+    [({"version": RULE_SETS.current.version}, 1.0)],
+)])
 
-def generate_ai_explanation(data: SymptomDataRequest, causes: List[PossibleCause]) -> str:
+# The compiled decision table when DECISION_TABLE_PATH is set (see
+# decision_table.py), else the live pipeline; a stale table fails startup.
+# Requests use it only under the rule set it was compiled for
+DECISION_TABLE: Optional[DecisionTable] = load_decision_table(DECISION_TABLE_PATH) if DECISION_TABLE_PATH else None
+
+def prepare_decision_table(rules: RuleSet) -> None:
+    """Activation hook: map the table file again if it has been recompiled for the incoming rule set"""
+    global DECISION_TABLE
+    if DECISION_TABLE is not None and DECISION_TABLE.rules is rules:
+        return
+    try:
+        DECISION_TABLE = load_decision_table(DECISION_TABLE_PATH, rules)
+    except (StaleDecisionTable, OSError):
+        # Requests under the incoming rule set fall back to the live pipeline
+        pass
+
+if DECISION_TABLE_PATH:
+    RULE_SETS.on_activate(prepare_decision_table)
+
+def triage_deterministic(record: SymptomRecord, rules: RuleSet) -> Triage:
+    table = DECISION_TABLE
+    if table is not None and table.rules is rules:
+        return table.triage(record)
+    return triage(record, rules)
+
+def triage_cached(record: SymptomRecord, rules: RuleSet) -> Triage:
+    """Deterministic result for a record under a rule set, through the analysis cache, with metrics"""
+    with STAGE_SECONDS.time("analyze"):
+        result = ANALYSIS_CACHE.get_or_compute(record, rules, triage_deterministic)
+    record_triage(result)
+    return result
+
+def analyze_cached(data: SymptomDataRequest, rules: RuleSet) -> AnalysisResult:
+    """triage_cached for a validated request, as an AnalysisResult"""
+    return triage_result(triage_cached(record_from_request(data), rules))
+
+# OpenAPI request body and error response of routes that read a
+# SymptomDataRequest body with read_symptom_record
+SYMPTOM_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/SymptomDataRequest"}}},
+    },
+}
+VALIDATION_ERROR_RESPONSE = {
+    422: {
+        "description": "Validation Error",
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/HTTPValidationError"}}},
+    },
+}
+
+def _is_json(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return True
+    message = email.message.Message()
+    message["content-type"] = content_type
+    subtype = message.get_content_subtype()
+    return message.get_content_maintype() == "application" and (subtype == "json" or subtype.endswith("+json"))
+
+async def read_symptom_record(request: Request) -> SymptomRecord:
     """
-    Generate AI explanation with safety constraints
-    In production, this would call an LLM with strict prompts
+    The request body as a SymptomRecord, without a SymptomDataRequest when possible
+
+    JSON bodies are decoded with records.decode_record. Bodies it does not
+    accept are parsed and validated the way FastAPI handles a
+    SymptomDataRequest parameter, with the same 400 and 422 errors.
     """
-    region_name = data.bodyRegion.value
-    intensity = data.intensity or 0
-    
-    explanation = f"Based on your reported symptoms in the {region_name} area "
-    
-    if intensity > 0:
-        explanation += f"with an intensity of {intensity}/10, "
-    
-    explanation += "there are several possible explanations to consider:\n\n"
-    
-    for cause in causes:
-        probability = int(cause.probability * 100)
-        explanation += f"• {cause.name} ({probability}% match): {cause.description}\n\n"
-    
-    explanation += "\n⚠️ Important: This information is for educational purposes only. "
-    explanation += "It is not a medical diagnosis. Please consult with a healthcare "
-    explanation += "professional for proper evaluation and treatment."
-    
-    return explanation
+    body = await request.body()
+    is_json = _is_json(request.headers.get("content-type"))
+    if body and is_json:
+        record = decode_record(body)
+        if record is not None:
+            return record
+
+    value = body or None
+    if body and is_json:
+        try:
+            value = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise RequestValidationError([{
+                "type": "json_invalid",
+                "loc": ("body", e.pos),
+                "msg": "JSON decode error",
+                "input": {},
+                "ctx": {"error": e.msg},
+            }], body=e.doc) from e
+        except Exception as e:
+            raise HTTPException(status_code=400, detail="There was an error parsing the body") from e
+    try:
+        if value is None:
+            raise ValidationError.from_exception_data("Field required", [{"type": "missing", "loc": (), "input": None}])
+        data = SymptomDataRequest.model_validate(value, from_attributes=True)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()], body=value
+        ) from None
+    return record_from_request(data)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Admin endpoints answer 404 unless RULES_ADMIN_TOKEN is set, and 403 without it"""
+    if not RULES_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), RULES_ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.on_event("startup")
+async def startup():
+    await ENRICHMENT_QUEUE.start()
+    # Under serve.py each worker publishes its metrics for the others to merge
+    if METRICS_ENABLED and METRICS_MULTIPROC_DIR:
+        app.state.metrics_flush = asyncio.create_task(flush_snapshots(METRICS_MULTIPROC_DIR))
+    if RULES_WATCH_INTERVAL > 0:
+        app.state.rules_watch = asyncio.create_task(watch_rule_file(RULE_SETS, RULES_PATH, RULES_WATCH_INTERVAL))
+
+@app.on_event("shutdown")
+async def shutdown():
+    await ENRICHMENT_QUEUE.stop()
+    flush_task = getattr(app.state, "metrics_flush", None)
+    if flush_task is not None:
+        flush_task.cancel()
+        REGISTRY.write_snapshot(METRICS_MULTIPROC_DIR)
+    watch_task = getattr(app.state, "rules_watch", None)
+    if watch_task is not None:
+        watch_task.cancel()
+    # Release pooled keep-alive connections held by AI provider clients
+    await close_provider_clients()
 
 @app.get("/")
 async def root():
@@ -357,47 +262,280 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
-@app.post("/api/analyze", response_model=AnalysisResult)
-async def analyze_symptoms(data: SymptomDataRequest):
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text-format metrics; 404 when METRICS_ENABLED=0"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # Collectors and, under serve.py, the snapshot files are read off the event loop
+    return Response(await run_in_threadpool(REGISTRY.render), media_type=CONTENT_TYPE)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return ANALYSIS_CACHE.stats()
+
+@app.get("/api/admission/stats")
+async def admission_stats():
+    return ADMISSION.stats()
+
+@app.get("/api/providers/stats")
+async def provider_stats():
+    """Circuit breaker state and recent latency/error rate of each AI provider"""
+    return get_ai_service().router.stats()
+
+def _persist(rules: RuleSet) -> None:
+    # With the watcher on, the file is what every worker follows
+    if RULES_WATCH_INTERVAL > 0:
+        write_rule_set(rules, RULES_PATH)
+
+def _activate_rule_set(spec: RuleSetFile) -> Dict[str, Any]:
+    _persist(RULE_SETS.activate(RuleSet(spec, "admin")))
+    return RULE_SETS.stats()
+
+def _rollback_rule_set() -> Dict[str, Any]:
+    _persist(RULE_SETS.rollback())
+    return RULE_SETS.stats()
+
+def _reload_rule_set() -> Dict[str, Any]:
+    RULE_SETS.reload(RULES_PATH)
+    return RULE_SETS.stats()
+
+@app.get("/api/admin/rules", dependencies=[Depends(require_admin)])
+async def rule_set_status():
+    """The active rule set, the ones kept for rollback and the last activation error"""
+    return RULE_SETS.stats()
+
+@app.post("/api/admin/rules", dependencies=[Depends(require_admin)])
+async def activate_rule_set(spec: RuleSetFile):
+    """
+    Validate, compile and activate a rule set without a restart
+    Requests already running finish on the previous rule set. With the rule
+    file watcher on (RULES_WATCH_INTERVAL), the rule set is also written to
+    RULES_PATH so every serve.py worker switches to it
+    """
+    try:
+        return await run_in_threadpool(_activate_rule_set, spec)
+    except RuleSetError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/admin/rules/rollback", dependencies=[Depends(require_admin)])
+async def rollback_rule_set():
+    """Reactivate the rule set the active one replaced"""
+    try:
+        return await run_in_threadpool(_rollback_rule_set)
+    except RuleSetError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/admin/rules/reload", dependencies=[Depends(require_admin)])
+async def reload_rule_set():
+    """Activate the rule set file at RULES_PATH"""
+    try:
+        return await run_in_threadpool(_reload_rule_set)
+    except RuleSetError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/analyze", response_model=AnalysisResult,
+          openapi_extra=SYMPTOM_REQUEST_BODY, responses=VALIDATION_ERROR_RESPONSE)
+async def analyze_symptoms(request: Request):
     """
     Analyze symptoms and return structured result
     Priority: Red flags > Urgency calculation > AI analysis
+    The body is decoded into a compact record (see records.py) and no
+    Pydantic model is built for a valid request. Repeated symptom profiles
+    are served from the analysis cache; the response is written from
+    pre-rendered fragments (see rendering.py)
     """
+    rules = RULE_SETS.current
+    record = await read_symptom_record(request)
     try:
-        # Step 1: Check for red flags (highest priority)
-        red_flag_result = check_red_flags(data)
-        if red_flag_result:
-            return red_flag_result
-        
-        # Step 2: Calculate urgency
-        urgency_level = calculate_urgency(data)
-        
-        # Step 3: Generate possible causes
-        possible_causes = generate_possible_causes(data)
-        
-        # Step 4: Generate guidance
-        guidance_map = {
-            UrgencyLevel.low: "Monitor your symptoms. Consider rest and over-the-counter remedies if appropriate.",
-            UrgencyLevel.medium: "Consider scheduling an appointment with your healthcare provider within the next few days.",
-            UrgencyLevel.high: "Seek medical attention soon. Contact your doctor or visit an urgent care facility.",
-            UrgencyLevel.emergency: "Seek immediate medical attention. Call emergency services or go to the nearest emergency room."
-        }
-        guidance = guidance_map[urgency_level]
-        
-        # Step 5: Generate AI explanation
-        ai_explanation = generate_ai_explanation(data, possible_causes)
-        
-        return AnalysisResult(
-            urgencyLevel=urgency_level,
-            possibleCauses=possible_causes,
-            guidance=guidance,
-            redFlags=[],
-            aiExplanation=ai_explanation,
-            isEmergency=urgency_level == UrgencyLevel.emergency
-        )
+        result = triage_cached(record, rules)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    
+    return json_response(renderer_for(rules).render_triage(result))
+
+@app.post("/api/analyze/enriched", response_model=EnrichedAnalysisResult)
+async def analyze_symptoms_enriched(data: SymptomDataRequest):
+    """
+    Return the rule-based result immediately and enrich it in the background
+    Fetch the AI explanation from /api/enrichment/{enrichmentJobId}
+    """
+    rules = RULE_SETS.current
+    try:
+        result = analyze_cached(data, rules)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    
+    # Emergency guidance is fixed text and is never sent to the AI provider,
+    # and enrichment is the first thing dropped under load
+    if result.isEmergency:
+        job_id = None
+    elif ADMISSION.shedding:
+        ADMISSION_TOTAL.inc("ai_shed")
+        job_id = None
+    else:
+        job_id = await ENRICHMENT_QUEUE.submit(data)
+    return json_response(renderer_for(rules).render_enriched(result, job_id))
+
+@app.post("/api/analyze/stream")
+async def analyze_symptoms_stream(data: SymptomDataRequest):
+    """
+    Stream the analysis as Server-Sent Events
+    Urgency and red flags arrive first; the AI explanation follows in
+    safety-checked chunks (see streaming.analysis_events for the event types)
+    """
+    try:
+        result = analyze_cached(data, RULE_SETS.current)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    
+    # Under load the stream carries the triage result only
+    ai_service = None
+    if not result.isEmergency and ADMISSION.shedding:
+        ADMISSION_TOTAL.inc("ai_shed")
+    else:
+        ai_service = get_ai_service()
+    return StreamingResponse(
+        analysis_events(data, result, ai_service),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.get("/api/enrichment/{job_id}", response_model=EnrichmentJob)
+async def get_enrichment(job_id: str, wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS)):
+    """
+    Fetch an AI enrichment job
+    Pass wait=N to long-poll for up to N seconds until the job finishes
+    """
+    job = await ENRICHMENT_QUEUE.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Enrichment job not found")
+    return job
+
+@app.post("/api/sessions", response_model=SessionState, status_code=201)
+async def create_session(update: Optional[SessionUpdate] = None):
+    """
+    Start a multi-step symptom session, optionally with the first fields
+    The returned state carries the triage so far (see sessions.py)
+    """
+    return SESSIONS.create(update).state()
+
+@app.get("/api/sessions/{session_id}", response_model=SessionState)
+async def get_session(session_id: str):
+    session = SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session.state()
+
+@app.patch("/api/sessions/{session_id}", response_model=SessionState)
+async def update_session(session_id: str, update: SessionUpdate):
+    """
+    Apply a partial update: set fields, add or remove symptoms and triggers
+    Red flags are reported in the response as soon as they fire
+    """
+    session = SESSIONS.update(session_id, update)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session.state()
+
+@app.post("/api/sessions/{session_id}/submit", response_model=AnalysisResult)
+async def submit_session(session_id: str):
+    """
+    Analyze the completed session exactly as /api/analyze would, and close it
+    The session is kept if it cannot be submitted yet
+    """
+    rules = RULE_SETS.current
+    session = SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    try:
+        data = session.to_request(datetime.now(timezone.utc).isoformat())
+    except ValidationError as e:
+        missing = ", ".join(str(error["loc"][0]) for error in e.errors())
+        raise HTTPException(status_code=422, detail=f"Session is incomplete: {missing}")
+    
+    try:
+        result = triage_cached(record_from_request(data), rules)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    
+    SESSIONS.delete(session_id)
+    return json_response(renderer_for(rules).render_triage(result))
+
+@app.delete("/api/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    if SESSIONS.delete(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return Response(status_code=204)
+
+@app.post("/api/analyze/batch", response_model=List[AnalysisResult])
+async def analyze_symptoms_batch(cases: List[SymptomDataRequest]):
+    """
+    Analyze many symptom records in one request
+    Results are identical to calling /api/analyze once per record
+    """
+    if len(cases) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(cases)} records (maximum {MAX_BATCH_SIZE})"
+        )
+    
+    rules = RULE_SETS.current
+    try:
+        return json_response(renderer_for(rules).render_list(analyze_batch(cases, rules)))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
+
+@app.post("/api/analyze/ndjson")
+async def analyze_symptoms_ndjson(
+    request: Request,
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=MAX_BATCH_SIZE)
+):
+    """
+    Stream-score an NDJSON body of SymptomDataRequest records
+    Results are written back as NDJSON while the body is still being read
+    """
+    return BodyStreamingResponse(
+        replay_stream(request.stream(), chunk_size),
+        media_type="application/x-ndjson"
+    )
+
+def preload() -> None:
+    """
+    Do the deferred startup work now instead of on the first requests
+
+    Creates the AIService, its response cache and the provider clients (and
+    with them imports httpx or starts the local provider's workers), and runs one analysis and render so every code
+    path on the request path has been exercised once.
+    """
+    ai_service = get_ai_service()
+    for name in ai_service.router.names:
+        get_provider_client(name).prepare()
+    sample = SymptomDataRequest(
+        bodyRegion=BodyRegion.headFront,
+        painType=PainType.throbbing,
+        intensity=5,
+        timestamp="preload",
+    )
+    rules = RULE_SETS.current
+    renderer_for(rules).render_triage(triage_deterministic(record_from_request(sample), rules))
+    analyze_batch([sample])
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import argparse
+    import uvicorn
+    
+    parser = argparse.ArgumentParser(description="Symptom Checker API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--preload", action="store_true",
+                        help="create the AI service and provider client before serving")
+    args = parser.parse_args()
+    if args.preload:
+        preload()
+    uvicorn.run(app, host=args.host, port=args.port)
\ No newline at end of file
@@ -0,0 +1,447 @@
+"""
+Request Metrics
+Counters and latency histograms exposed in the Prometheus text format
+
+Each thread writes to its own shard of every metric, so recording a value
+never takes a lock; a scrape sums the shards. Set METRICS_ENABLED=0 to
+turn recording and the /metrics endpoint off entirely.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+# Shared directory for per-worker snapshots when running several worker
+# processes (see serve.py); empty for a single process
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1.0"))
+
+# Latency buckets in seconds, from rule evaluation (microseconds) up to
+# slow provider calls (seconds)
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005,
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+Labels = Tuple[str, ...]
+# (label values, value) pairs produced by a metric or collector
+Samples = List[Tuple[Dict[str, str], float]]
+
+
+class _Shards:
+    """Per-thread storage: each thread only ever writes its own shard"""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._local = threading.local()
+        self._shards: List[Any] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._factory()
+            # Only taken the first time a thread records to this metric
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def all(self) -> List[Any]:
+        with self._lock:
+            return list(self._shards)
+
+
+def _items(shard: Dict) -> List[Tuple[Any, Any]]:
+    # The owning thread may add a key mid-copy; retry until it settles
+    while True:
+        try:
+            return list(shard.items())
+        except RuntimeError:
+            continue
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards(dict)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not METRICS_ENABLED:
+            return
+        shard = self._shards.get()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        totals: Dict[Labels, float] = {}
+        for shard in self._shards.all():
+            for labels, value in _items(shard):
+                totals[labels] = totals.get(labels, 0.0) + value
+        return totals
+
+    def samples(self) -> Samples:
+        return [(dict(zip(self.labelnames, labels)), value)
+                for labels, value in sorted(self.values().items())]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with optional labels
+
+    Shards keep per-bucket (non-cumulative) counts followed by the sum;
+    cumulative `le` buckets are only built at scrape time.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._shards = _Shards(dict)
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        shard = self._shards.get()
+        counts = shard.get(labels)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the running sum
+            counts = shard[labels] = [0.0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        """Context manager that observes the elapsed time of its block"""
+        return _Timer(self, labels) if METRICS_ENABLED else _NULL_TIMER
+
+    def values(self) -> Dict[Labels, List[float]]:
+        totals: Dict[Labels, List[float]] = {}
+        for shard in self._shards.all():
+            for labels, counts in _items(shard):
+                total = totals.setdefault(labels, [0.0] * len(counts))
+                for i, count in enumerate(counts):
+                    total[i] += count
+        return totals
+
+    def samples(self) -> Samples:
+        samples: Samples = []
+        for labels, counts in sorted(self.values().items()):
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append(({**base, "le": le, "__suffix__": "_bucket"}, cumulative))
+            samples.append(({**base, "__suffix__": "_sum"}, counts[-1]))
+            samples.append(({**base, "__suffix__": "_count"}, cumulative))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class _NullTimer:
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class StageClock:
+    """
+    Times consecutive stages of one computation
+
+    Each lap() observes the time since the previous lap (or since the clock
+    was created) under the given stage label, so timing N back-to-back
+    stages costs N+1 clock reads.
+    """
+
+    __slots__ = ("histogram", "last")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.histogram.observe(now - self.last, stage)
+        self.last = now
+
+
+class _NullClock:
+    def lap(self, stage: str) -> None:
+        pass
+
+
+_NULL_CLOCK = _NullClock()
+
+
+# A collector returns (name, kind, help, samples) tuples read at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, Samples]]]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+        self.collectors: List[Collector] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector) -> None:
+        """Add a callback for values that are already counted elsewhere (e.g. cache stats)"""
+        self.collectors.append(collector)
+
+    def collect(self) -> List[Tuple[str, str, str, Samples]]:
+        families = [(m.name, m.kind, m.help, m.samples()) for m in self.metrics]
+        for collector in self.collectors:
+            families.extend(collector())
+        return families
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format
+
+        With METRICS_MULTIPROC_DIR set, this worker's snapshot is refreshed
+        and merged with those of the other workers (see merge_snapshots).
+        """
+        if METRICS_MULTIPROC_DIR:
+            self.write_snapshot(METRICS_MULTIPROC_DIR)
+            return render_families(merge_snapshots(METRICS_MULTIPROC_DIR))
+        return render_families(self.collect())
+
+    def write_snapshot(self, directory: str) -> None:
+        """Atomically write this process's current values to <directory>/<pid>.json"""
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.collect(), f)
+        os.replace(tmp_path, path)
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, under another user
+        return True
+    return True
+
+
+def merge_snapshots(directory: str) -> List[Tuple[str, str, str, Samples]]:
+    """
+    Merge the snapshots of every worker, sample by sample
+
+    Counters and cumulative histogram buckets are both additive, so they
+    are summed: the merged families are exactly what one process serving
+    all requests would have reported. Snapshots of exited workers are kept
+    for these, so counters never go backwards when a worker is replaced.
+
+    Gauges are a worker's current state and are not summed. They are
+    reported per running worker, with a `pid` label; snapshots of exited
+    workers contribute none.
+    """
+    families: Dict[str, Tuple[str, str, Dict[Tuple, Tuple[Dict[str, str], float]]]] = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        pid = filename[:-len(".json")]
+        running: Optional[bool] = None
+        try:
+            with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, kind, help_text, samples in snapshot:
+            _, _, merged = families.setdefault(name, (kind, help_text, {}))
+            if kind == "gauge":
+                if running is None:
+                    running = pid.isdigit() and _is_running(int(pid))
+                if running:
+                    for labels, value in samples:
+                        labels = {**labels, "pid": pid}
+                        merged[tuple(sorted(labels.items()))] = (labels, value)
+                continue
+            for labels, value in samples:
+                key = tuple(sorted(labels.items()))
+                previous = merged.get(key)
+                merged[key] = (labels, value + (previous[1] if previous else 0.0))
+    return [(name, kind, help_text, list(merged.values()))
+            for name, (kind, help_text, merged) in families.items()]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render_families(families: Iterable[Tuple[str, str, str, Samples]]) -> str:
+    lines: List[str] = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            labels = dict(labels)
+            suffix = labels.pop("__suffix__", "")
+            if labels:
+                rendered = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+                lines.append(f"{name}{suffix}{{{rendered}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "symptom_checker_stage_seconds",
+    "Time spent in each analysis stage",
+    ("stage",),
+)
+ANALYSES_TOTAL = REGISTRY.counter(
+    "symptom_checker_analyses_total",
+    "Analysis results returned, by urgency level",
+    ("urgency",),
+)
+RED_FLAGS_TOTAL = REGISTRY.counter(
+    "symptom_checker_red_flags_total",
+    "Emergency results returned, by red flag rule",
+    ("rule",),
+)
+PROVIDER_SECONDS = REGISTRY.histogram(
+    "symptom_checker_provider_request_seconds",
+    "AI provider call latency, including retries",
+    ("provider",),
+)
+PROVIDER_REQUESTS_TOTAL = REGISTRY.counter(
+    "symptom_checker_provider_requests_total",
+    "AI provider calls by outcome (success, retry, error)",
+    ("provider", "outcome"),
+)
+AI_RESPONSES_TOTAL = REGISTRY.counter(
+    "symptom_checker_ai_responses_total",
+    "AI explanations by source (cache, provider, coalesced, fallback, placeholder) and provider responses rejected by safety validation (rejected)",
+    ("provider", "source"),
+)
+
+LOCAL_EXPLANATIONS_TOTAL = REGISTRY.counter(
+    "symptom_checker_local_explanations_total",
+    "Local provider explanations by generator (template, model, model_rejected)",
+    ("generator",),
+)
+
+PROVIDER_ROUTER_EVENTS_TOTAL = REGISTRY.counter(
+    "symptom_checker_provider_router_events_total",
+    "Provider router events (hedged, failover, circuit_open)",
+    ("provider", "event"),
+)
+
+AI_PROMPT_TOKENS = REGISTRY.histogram(
+    "symptom_checker_ai_prompt_tokens",
+    "Estimated tokens per AI prompt (system and user message)",
+    buckets=(64, 128, 256, 384, 512, 768, 1024, 2048),
+)
+AI_PROMPT_FIELDS_DROPPED_TOTAL = REGISTRY.counter(
+    "symptom_checker_ai_prompt_fields_dropped_total",
+    "Symptom fields left out of AI prompts to stay within the token budget",
+    ("field",),
+)
+
+ADMISSION_TOTAL = REGISTRY.counter(
+    "symptom_checker_admission_total",
+    "API requests by admission outcome (admitted, queued, priority, rate_limited, shed, ai_shed)",
+    ("outcome",),
+)
+
+SESSION_EVALUATIONS_TOTAL = REGISTRY.counter(
+    "symptom_checker_session_evaluations_total",
+    "Pipeline parts re-evaluated after session updates (red_flag_rule, urgency, causes)",
+    ("part",),
+)
+
+RULE_SET_CHANGES_TOTAL = REGISTRY.counter(
+    "symptom_checker_rule_set_changes_total",
+    "Rule set changes by outcome (activated, rolled_back, rejected)",
+    ("outcome",),
+)
+
+
+def stage_clock() -> Any:
+    """A StageClock on STAGE_SECONDS, or a no-op clock when metrics are off"""
+    return StageClock(STAGE_SECONDS) if METRICS_ENABLED else _NULL_CLOCK
+
+
+def cache_stats_collector(name: str, help_text: str, stats: Callable[[], Optional[Dict[str, Any]]],
+                          outcomes: Sequence[str]) -> Collector:
+    """Expose counters from a cache's stats() dict as one labelled counter family"""
+    def collect():
+        values = stats()
+        if values is None:
+            return []
+        samples = [({"outcome": outcome}, float(values.get(outcome, 0))) for outcome in outcomes]
+        return [(name, "counter", help_text, samples)]
+    return collect
+
+
+async def flush_snapshots(directory: str, interval: float = METRICS_FLUSH_SECONDS) -> None:
+    """
+    Background task: keep this worker's snapshot fresh for scrapes served by other workers
+
+    Snapshots are written in a worker thread. A failed write is logged and
+    retried on the next interval rather than ending the task.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(REGISTRY.write_snapshot, directory)
+        except Exception as e:
+            print(f"[metrics] snapshot write failed: {e!r}", file=sys.stderr)
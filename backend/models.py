@@ -0,0 +1,188 @@
+"""
+Shared request/response models and enums for the Symptom Checker API
+"""
+
+from pydantic import BaseModel, model_validator
+from typing import Any, List, Optional
+from enum import Enum
+import time
+
+from metrics import METRICS_ENABLED, STAGE_SECONDS
+
+# Enums
+class BodyRegion(str, Enum):
+    headFront = "headFront"
+    headBack = "headBack"
+    headLeft = "headLeft"
+    headRight = "headRight"
+    chest = "chest"
+    abdomenUpperLeft = "abdomenUpperLeft"
+    abdomenUpperRight = "abdomenUpperRight"
+    abdomenLowerLeft = "abdomenLowerLeft"
+    abdomenLowerRight = "abdomenLowerRight"
+
+class PainType(str, Enum):
+    sharp = "sharp"
+    dull = "dull"
+    burning = "burning"
+    pressure = "pressure"
+    stabbing = "stabbing"
+    throbbing = "throbbing"
+    cramping = "cramping"
+
+class SymptomDuration(str, Enum):
+    minutes = "minutes"
+    hours = "hours"
+    days = "days"
+    weeks = "weeks"
+    months = "months"
+
+class Onset(str, Enum):
+    sudden = "sudden"
+    gradual = "gradual"
+
+class Trigger(str, Enum):
+    movement = "movement"
+    breathing = "breathing"
+    eating = "eating"
+    stress = "stress"
+    touch = "touch"
+    rest = "rest"
+    none = "none"
+
+class AssociatedSymptom(str, Enum):
+    fever = "fever"
+    nausea = "nausea"
+    vomiting = "vomiting"
+    dizziness = "dizziness"
+    shortnessOfBreath = "shortnessOfBreath"
+    radiatingPain = "radiatingPain"
+    numbness = "numbness"
+    weakness = "weakness"
+    confusion = "confusion"
+    visionChanges = "visionChanges"
+    hearingChanges = "hearingChanges"
+    chestPain = "chestPain"
+    palpitations = "palpitations"
+    sweating = "sweating"
+    chills = "chills"
+    fatigue = "fatigue"
+    lossOfAppetite = "lossOfAppetite"
+    bloodInStool = "bloodInStool"
+    bloodInVomit = "bloodInVomit"
+    severeHeadache = "severeHeadache"
+    neckStiffness = "neckStiffness"
+
+class UrgencyLevel(str, Enum):
+    low = "low"
+    medium = "medium"
+    high = "high"
+    emergency = "emergency"
+
+class EnrichmentStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+# Request Models
+class SymptomDataRequest(BaseModel):
+    bodyRegion: BodyRegion
+    painType: Optional[PainType] = None
+    intensity: Optional[int] = None
+    duration: Optional[SymptomDuration] = None
+    durationValue: Optional[int] = None
+    onset: Optional[Onset] = None
+    triggers: List[Trigger] = []
+    associatedSymptoms: List[AssociatedSymptom] = []
+    ageRange: Optional[str] = None
+    biologicalSex: Optional[str] = None
+    timestamp: str
+
+    if METRICS_ENABLED:
+        @model_validator(mode="wrap")
+        @classmethod
+        def _time_validation(cls, data: Any, handler: Any) -> "SymptomDataRequest":
+            # Records request parsing under the "validation" analysis stage
+            start = time.perf_counter()
+            try:
+                return handler(data)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, "validation")
+
+# Response Models
+class PossibleCause(BaseModel):
+    name: str
+    description: str
+    probability: float
+    matchingSymptoms: List[str]
+
+class AnalysisResult(BaseModel):
+    urgencyLevel: UrgencyLevel
+    possibleCauses: List[PossibleCause]
+    guidance: str
+    redFlags: List[str]
+    aiExplanation: str
+    isEmergency: bool
+    # Version of the rule set that produced the result (see rules.py)
+    ruleSetVersion: Optional[str] = None
+
+class EnrichedAnalysisResult(AnalysisResult):
+    enrichmentJobId: Optional[str] = None
+
+class EnrichmentJob(BaseModel):
+    jobId: str
+    status: EnrichmentStatus
+    aiExplanation: Optional[str] = None
+    error: Optional[str] = None
+    createdAt: float
+    completedAt: Optional[float] = None
+
+# Session Models
+class SessionUpdate(BaseModel):
+    """
+    A partial update to a symptom session
+
+    Scalar fields present in the body replace the session's value (null
+    clears it); absent fields are left alone. Symptoms and triggers are
+    removed, then added, one by one.
+    """
+    bodyRegion: Optional[BodyRegion] = None
+    painType: Optional[PainType] = None
+    intensity: Optional[int] = None
+    duration: Optional[SymptomDuration] = None
+    durationValue: Optional[int] = None
+    onset: Optional[Onset] = None
+    ageRange: Optional[str] = None
+    biologicalSex: Optional[str] = None
+    timestamp: Optional[str] = None
+    addSymptoms: List[AssociatedSymptom] = []
+    removeSymptoms: List[AssociatedSymptom] = []
+    addTriggers: List[Trigger] = []
+    removeTriggers: List[Trigger] = []
+
+class SymptomDraft(BaseModel):
+    """The symptoms collected so far; any field may still be missing"""
+    bodyRegion: Optional[BodyRegion] = None
+    painType: Optional[PainType] = None
+    intensity: Optional[int] = None
+    duration: Optional[SymptomDuration] = None
+    durationValue: Optional[int] = None
+    onset: Optional[Onset] = None
+    triggers: List[Trigger] = []
+    associatedSymptoms: List[AssociatedSymptom] = []
+    ageRange: Optional[str] = None
+    biologicalSex: Optional[str] = None
+    timestamp: Optional[str] = None
+
+class SessionState(BaseModel):
+    sessionId: str
+    revision: int
+    symptoms: SymptomDraft
+    urgencyLevel: UrgencyLevel
+    isEmergency: bool
+    redFlags: List[str]
+    # The analysis so far: a red flag result as soon as one fires, else
+    # available once bodyRegion is known
+    result: Optional[AnalysisResult] = None
+    ruleSetVersion: Optional[str] = None
@@ -0,0 +1,230 @@
+"""
+Prompt Templates for AI Symptom Analysis
+Static sections are built and interned once at import time; per-request
+prompts only format the fields that are present and join the pieces
+
+The safety instructions go to the provider once, as the system message.
+The user message is a compact `key=value` encoding of the symptoms, and
+is trimmed to fit the prompt token budget (see build_prompt).
+"""
+
+import os
+import re
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+# Estimated tokens allowed per prompt (system + user message)
+PROMPT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "512"))
+# Tokens a provider may generate per explanation (max_tokens / maxOutputTokens)
+COMPLETION_TOKEN_BUDGET = int(os.getenv("AI_COMPLETION_TOKEN_BUDGET", "500"))
+
+# Safety prompt that MUST be included in all AI requests
+SAFETY_PROMPT = sys.intern("""
+        CRITICAL SAFETY INSTRUCTIONS:
+        
+        You are an educational health information assistant. You MUST follow these rules:
+        
+        1. NEVER provide a diagnosis
+        2. NEVER recommend specific medications
+        3. NEVER provide treatment plans
+        4. ALWAYS use probabilistic language (may, might, could, possibly)
+        5. ALWAYS include uncertainty in your responses
+        6. ALWAYS encourage consulting healthcare professionals
+        7. NEVER claim certainty about medical conditions
+        8. Focus on education and awareness, not diagnosis
+        
+        Your role is to:
+        - Explain possible causes in educational terms
+        - Help users understand when to seek professional care
+        - Provide general health information
+        - Encourage appropriate medical consultation
+        
+        Format your response as:
+        {
+            "explanation": "Educational explanation with probabilistic language",
+            "possible_causes": [
+                {
+                    "name": "Condition name",
+                    "description": "Educational description",
+                    "probability": 0.0-1.0,
+                    "matching_symptoms": ["symptom1", "symptom2"]
+                }
+            ],
+            "disclaimer": "This is not medical advice..."
+        }
+        """)
+
+# The same instructions word for word, without the indentation and blank
+# lines, which only cost tokens
+SYSTEM_PROMPT = sys.intern("\n".join(
+    line.strip() for line in SAFETY_PROMPT.splitlines() if line.strip()
+))
+
+# Verbose layout used before compaction: the safety prompt repeated at the
+# top of the user message. Kept for size comparisons (prompt_sizes)
+PROMPT_HEADER = sys.intern(f"{SAFETY_PROMPT}\n\nSYMPTOM INFORMATION:\n")
+PROMPT_FOOTER = sys.intern("\nProvide an educational explanation of possible causes with appropriate uncertainty.")
+
+COMPACT_HEADER = sys.intern("Symptoms: ")
+COMPACT_FOOTER = sys.intern("\nExplain possible causes educationally, with appropriate uncertainty.")
+
+# Words, runs of digits and single punctuation marks; most BPE vocabularies
+# split longer words into pieces of about four characters
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def _join_unique(values: List[str]) -> str:
+    # Sorted and de-duplicated so equivalent inputs produce identical
+    # prompts (and share response cache entries)
+    return ", ".join(sorted(set(values)))
+
+
+# Optional prompt lines, in output order: (field, formatter). A line is
+# emitted only when the field is present and truthy.
+OPTIONAL_LINES: Tuple[Tuple[str, Callable[[Dict[str, Any]], str]], ...] = (
+    ("painType", lambda d: f"Pain Type: {d['painType']}\n"),
+    ("intensity", lambda d: f"Pain Intensity: {d['intensity']}/10\n"),
+    ("duration", lambda d: f"Duration: {d.get('durationValue', '')} {d['duration']}\n"),
+    ("onset", lambda d: f"Onset: {d['onset']}\n"),
+    ("triggers", lambda d: f"Triggers: {_join_unique(d['triggers'])}\n"),
+    ("associatedSymptoms", lambda d: f"Associated Symptoms: {_join_unique(d['associatedSymptoms'])}\n"),
+)
+
+
+# Compact encoding, in output order: (field, formatter)
+COMPACT_FIELDS: Tuple[Tuple[str, Callable[[Dict[str, Any]], str]], ...] = (
+    ("painType", lambda d: f"pain={d['painType']}"),
+    ("intensity", lambda d: f"intensity={d['intensity']}/10"),
+    ("duration", lambda d: "duration=" + " ".join(
+        str(value) for value in (d.get("durationValue"), d["duration"]) if value
+    )),
+    ("onset", lambda d: f"onset={d['onset']}"),
+    ("triggers", lambda d: "triggers=" + ",".join(sorted(set(d["triggers"])))),
+    ("associatedSymptoms", lambda d: "symptoms=" + ",".join(sorted(set(d["associatedSymptoms"])))),
+)
+
+# Fields dropped, in this order, when a prompt is over budget; the body
+# region is always kept
+DROP_ORDER = ("triggers", "onset", "associatedSymptoms", "duration", "painType", "intensity")
+
+
+class BuiltPrompt(NamedTuple):
+    system: str
+    user: str
+    tokens: int
+    dropped: Tuple[str, ...]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate provider token count without a tokenizer
+
+    Each letter run counts one token per started four characters, digit
+    runs one per started three, and every punctuation mark one. Good
+    enough to budget with; providers bill by their own tokenizer.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece[0].isalpha():
+            tokens += (len(piece) + 3) // 4
+        elif piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        else:
+            tokens += 1
+    return tokens
+
+
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+
+def _compact_user_message(symptom_data: Dict[str, Any], fields: Tuple[str, ...]) -> str:
+    parts = [f"region={symptom_data.get('bodyRegion', 'unknown')}"]
+    for field, render in COMPACT_FIELDS:
+        if field in fields:
+            parts.append(render(symptom_data))
+    return COMPACT_HEADER + "; ".join(parts) + COMPACT_FOOTER
+
+
+def build_prompt(symptom_data: Dict[str, Any], budget: int = PROMPT_TOKEN_BUDGET) -> BuiltPrompt:
+    """
+    System and user messages for one explanation, within `budget` tokens
+
+    Optional fields are dropped in DROP_ORDER until the estimate fits. The
+    safety instructions are never cut, so a budget smaller than the system
+    prompt leaves just the body region.
+    """
+    fields = tuple(field for field, _ in COMPACT_FIELDS if symptom_data.get(field))
+    dropped: List[str] = []
+    user = _compact_user_message(symptom_data, fields)
+    tokens = SYSTEM_PROMPT_TOKENS + estimate_tokens(user)
+    for field in DROP_ORDER:
+        if tokens <= budget:
+            break
+        if field in fields:
+            fields = tuple(name for name in fields if name != field)
+            dropped.append(field)
+            user = _compact_user_message(symptom_data, fields)
+            tokens = SYSTEM_PROMPT_TOKENS + estimate_tokens(user)
+    return BuiltPrompt(SYSTEM_PROMPT, user, tokens, tuple(dropped))
+
+
+# Compact keys whose value is copied as is: key -> request field
+_COMPACT_SCALARS = {"region": "bodyRegion", "pain": "painType", "onset": "onset"}
+_COMPACT_LISTS = {"triggers": "triggers", "symptoms": "associatedSymptoms"}
+
+
+def parse_compact_prompt(user: str) -> Dict[str, Any]:
+    """
+    Symptom fields of a build_prompt user message, for generators that run
+    on the prompt itself (see local_provider.py)
+
+    Values come back as strings, unvalidated; unknown keys are ignored and
+    fields dropped for the budget are simply absent.
+    """
+    if user.startswith(COMPACT_HEADER):
+        user = user[len(COMPACT_HEADER):]
+    data: Dict[str, Any] = {}
+    # The footer starts on a new line
+    for part in user.split("\n", 1)[0].split("; "):
+        key, separator, value = part.partition("=")
+        if not separator:
+            continue
+        if key in _COMPACT_SCALARS:
+            data[_COMPACT_SCALARS[key]] = value
+        elif key in _COMPACT_LISTS:
+            data[_COMPACT_LISTS[key]] = [item for item in value.split(",") if item]
+        elif key == "intensity":
+            data["intensity"] = value.partition("/")[0]
+        elif key == "duration":
+            amount, _, unit = value.rpartition(" ")
+            data["duration"] = unit
+            if amount:
+                data["durationValue"] = amount
+    return data
+
+
+def build_symptom_prompt(symptom_data: Dict[str, Any], header: str = PROMPT_HEADER) -> str:
+    """Build the verbose, pre-compaction prompt from symptom data"""
+    parts = [header, f"Body Region: {symptom_data.get('bodyRegion', 'Unknown')}\n"]
+    for field, render in OPTIONAL_LINES:
+        if symptom_data.get(field):
+            parts.append(render(symptom_data))
+    parts.append(PROMPT_FOOTER)
+    return "".join(parts)
+
+
+def prompt_sizes(symptom_data: Dict[str, Any], budget: int = PROMPT_TOKEN_BUDGET) -> Dict[str, int]:
+    """
+    Characters and estimated tokens sent per call before and after compaction
+
+    Before: the safety prompt as the system message and again at the top of
+    the verbose user message. After: build_prompt's messages.
+    """
+    verbose = build_symptom_prompt(symptom_data)
+    compact = build_prompt(symptom_data, budget)
+    return {
+        "beforeChars": len(SAFETY_PROMPT) + len(verbose),
+        "beforeTokens": estimate_tokens(SAFETY_PROMPT) + estimate_tokens(verbose),
+        "afterChars": len(compact.system) + len(compact.user),
+        "afterTokens": compact.tokens,
+    }
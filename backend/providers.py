@@ -0,0 +1,331 @@
+"""
+Async AI Provider Clients
+Pooled, concurrency-limited HTTP clients for the LLM providers used by AIService
+
+httpx is imported on first use rather than at import time: it is the
+largest dependency the API does not need to answer a rule-based request.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import sys
+from typing import Any, AsyncIterator, Dict, Optional
+
+
+def _lazy_import(name: str):
+    """Module object whose real import runs on first attribute access"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+httpx = _lazy_import("httpx")
+
+from metrics import PROVIDER_REQUESTS_TOTAL, PROVIDER_SECONDS
+from prompts import COMPLETION_TOKEN_BUDGET
+
+# Statuses worth retrying: rate limiting and transient upstream failures
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """Raised when a provider call fails after all retries"""
+
+
+class ProviderConfig:
+    """Connection settings for one provider, read from the environment by default"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: str = "",
+        model: str = "",
+        timeout: float = 30.0,
+        max_concurrency: int = 32,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        max_output_tokens: int = COMPLETION_TOKEN_BUDGET,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_output_tokens = max_output_tokens
+
+    @classmethod
+    def from_env(cls, name: str, default_base_url: str, default_model: str) -> "ProviderConfig":
+        prefix = name.upper()
+        return cls(
+            name=name,
+            base_url=os.getenv(f"{prefix}_BASE_URL", default_base_url),
+            api_key=os.getenv(f"{prefix}_API_KEY", ""),
+            model=os.getenv(f"{prefix}_MODEL", default_model),
+            timeout=float(os.getenv(f"{prefix}_TIMEOUT", "30")),
+            max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "32")),
+            max_retries=int(os.getenv(f"{prefix}_MAX_RETRIES", "2")),
+            max_output_tokens=int(os.getenv(f"{prefix}_MAX_OUTPUT_TOKENS", str(COMPLETION_TOKEN_BUDGET))),
+        )
+
+
+class AsyncProviderClient:
+    """
+    Base class for async provider clients
+
+    Each client owns one keep-alive connection pool shared by every request,
+    and a semaphore that caps in-flight calls to the provider. Failed calls
+    are retried with full-jitter exponential backoff.
+    """
+
+    # Fallback providers are routed to only after every healthy primary one
+    fallback = False
+
+    def __init__(self, config: ProviderConfig, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.config = config
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.config.base_url,
+                timeout=self.config.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.config.max_concurrency,
+                    max_keepalive_connections=self.config.max_concurrency,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        return self._semaphore
+
+    @property
+    def configured(self) -> bool:
+        """True when the provider has credentials to make real calls"""
+        return bool(self.config.api_key)
+
+    def prepare(self) -> None:
+        """Create the connection pool now rather than on the first call"""
+        self.client
+
+    def build_request(self, system_prompt: str, prompt: str) -> Dict[str, Any]:
+        """Return keyword arguments for httpx.AsyncClient.post"""
+        raise NotImplementedError
+
+    def parse_response(self, payload: Dict[str, Any]) -> str:
+        """Extract the generated text from a provider response body"""
+        raise NotImplementedError
+
+    def build_stream_request(self, system_prompt: str, prompt: str) -> Dict[str, Any]:
+        """Return keyword arguments for httpx.AsyncClient.stream for a streamed completion"""
+        raise NotImplementedError
+
+    def parse_stream_event(self, payload: Dict[str, Any]) -> str:
+        """Extract the text delta from one streamed server-sent event"""
+        raise NotImplementedError
+
+    def backoff_delay(self, attempt: int) -> float:
+        ceiling = min(self.config.backoff_max, self.config.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    async def complete(self, system_prompt: str, prompt: str) -> str:
+        """Send one completion request, retrying transient failures"""
+        with PROVIDER_SECONDS.time(self.config.name):
+            return await self._complete(system_prompt, prompt)
+
+    async def _complete(self, system_prompt: str, prompt: str) -> str:
+        name = self.config.name
+        request = self.build_request(system_prompt, prompt)
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.config.max_retries + 1):
+            if attempt:
+                PROVIDER_REQUESTS_TOTAL.inc(name, "retry")
+                await asyncio.sleep(self.backoff_delay(attempt - 1))
+            try:
+                async with self.semaphore:
+                    response = await self.client.post(**request)
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    last_error = ProviderError(
+                        f"{self.config.name} returned HTTP {response.status_code}"
+                    )
+                    continue
+                response.raise_for_status()
+                text = self.parse_response(response.json())
+                PROVIDER_REQUESTS_TOTAL.inc(name, "success")
+                return text
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                last_error = e
+            except (httpx.HTTPStatusError, ValueError, KeyError, IndexError) as e:
+                # Non-retryable: bad request, auth failure or malformed body
+                PROVIDER_REQUESTS_TOTAL.inc(name, "error")
+                raise ProviderError(f"{self.config.name} call failed: {e}") from e
+
+        PROVIDER_REQUESTS_TOTAL.inc(name, "error")
+        raise ProviderError(
+            f"{self.config.name} call failed after {self.config.max_retries + 1} attempts: {last_error}"
+        ) from last_error
+
+    async def stream(self, system_prompt: str, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream a completion as text deltas
+
+        Streams are not retried: once text has been delivered to the caller
+        a retry would repeat it. The concurrency slot is held until the
+        stream is exhausted or closed.
+        """
+        request = self.build_stream_request(system_prompt, prompt)
+        try:
+            async with self.semaphore:
+                async with self.client.stream("POST", **request) as response:
+                    if response.status_code >= 400:
+                        PROVIDER_REQUESTS_TOTAL.inc(self.config.name, "error")
+                        raise ProviderError(f"{self.config.name} returned HTTP {response.status_code}")
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        text = self.parse_stream_event(json.loads(data))
+                        if text:
+                            yield text
+            PROVIDER_REQUESTS_TOTAL.inc(self.config.name, "success")
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            PROVIDER_REQUESTS_TOTAL.inc(self.config.name, "error")
+            raise ProviderError(f"{self.config.name} stream failed: {e}") from e
+        except (ValueError, KeyError, IndexError) as e:
+            PROVIDER_REQUESTS_TOTAL.inc(self.config.name, "error")
+            raise ProviderError(f"{self.config.name} sent a malformed stream event: {e}") from e
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class OpenAIProvider(AsyncProviderClient):
+    """OpenAI chat completions API"""
+
+    def build_request(self, system_prompt: str, prompt: str) -> Dict[str, Any]:
+        return {
+            "url": "/v1/chat/completions",
+            "headers": {"Authorization": f"Bearer {self.config.api_key}"},
+            "json": {
+                "model": self.config.model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                "temperature": 0.3,  # Lower temperature for more consistent, safer responses
+                "max_tokens": self.config.max_output_tokens,
+            },
+        }
+
+    def parse_response(self, payload: Dict[str, Any]) -> str:
+        return payload["choices"][0]["message"]["content"]
+
+    def build_stream_request(self, system_prompt: str, prompt: str) -> Dict[str, Any]:
+        request = self.build_request(system_prompt, prompt)
+        request["json"]["stream"] = True
+        return request
+
+    def parse_stream_event(self, payload: Dict[str, Any]) -> str:
+        return payload["choices"][0]["delta"].get("content") or ""
+
+
+class GeminiProvider(AsyncProviderClient):
+    """Google Gemini generateContent API"""
+
+    def build_request(self, system_prompt: str, prompt: str) -> Dict[str, Any]:
+        return {
+            "url": f"/v1beta/models/{self.config.model}:generateContent",
+            "params": {"key": self.config.api_key},
+            "json": {
+                "systemInstruction": {"parts": [{"text": system_prompt}]},
+                "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                "generationConfig": {
+                    "temperature": 0.3,
+                    "maxOutputTokens": self.config.max_output_tokens,
+                },
+            },
+        }
+
+    def parse_response(self, payload: Dict[str, Any]) -> str:
+        return payload["candidates"][0]["content"]["parts"][0]["text"]
+
+    def build_stream_request(self, system_prompt: str, prompt: str) -> Dict[str, Any]:
+        request = self.build_request(system_prompt, prompt)
+        request["url"] = f"/v1beta/models/{self.config.model}:streamGenerateContent"
+        request["params"] = {"key": self.config.api_key, "alt": "sse"}
+        return request
+
+    def parse_stream_event(self, payload: Dict[str, Any]) -> str:
+        return self.parse_response(payload)
+
+
+PROVIDER_DEFAULTS = {
+    "openai": (OpenAIProvider, "https://api.openai.com", "gpt-4"),
+    "gemini": (GeminiProvider, "https://generativelanguage.googleapis.com", "gemini-pro"),
+}
+
+# CPU-only provider that needs no credentials or network (see local_provider.py)
+LOCAL_PROVIDER = "local"
+
+# One shared client (and connection pool) per provider per process
+_provider_clients: Dict[str, AsyncProviderClient] = {}
+
+
+def get_provider_client(name: str) -> AsyncProviderClient:
+    """Return the shared client for a provider, creating it on first use"""
+    client = _provider_clients.get(name)
+    if client is None and name == LOCAL_PROVIDER:
+        # Imported on first use, like httpx: it loads the knowledge base
+        from local_provider import LocalProvider
+        client = LocalProvider(ProviderConfig.from_env(name, "", ""))
+        _provider_clients[name] = client
+    if client is None:
+        if name not in PROVIDER_DEFAULTS:
+            raise ValueError(f"Unsupported AI provider: {name}")
+        provider_class, base_url, model = PROVIDER_DEFAULTS[name]
+        client = provider_class(ProviderConfig.from_env(name, base_url, model))
+        _provider_clients[name] = client
+    return client
+
+
+def register_provider_client(name: str, client: AsyncProviderClient) -> None:
+    """Install a client for a provider, e.g. one pointed at a local stub server"""
+    _provider_clients[name] = client
+
+
+async def close_provider_clients() -> None:
+    """Close every shared connection pool; call on application shutdown"""
+    clients = list(_provider_clients.values())
+    _provider_clients.clear()
+    for client in clients:
+        await client.aclose()
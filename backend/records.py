@@ -0,0 +1,156 @@
+"""
+Compact Symptom Records
+The internal form of a symptom report: a flat tuple of enum members and
+bitsets that the rule engines, the scorer and the caches work on directly
+
+A request is decoded into a SymptomRecord once. Valid JSON bodies are
+decoded straight from the parsed JSON without building a SymptomDataRequest;
+anything decode_record does not accept is left to Pydantic, so error
+responses are unchanged.
+"""
+
+import json
+import time
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from metrics import METRICS_ENABLED, STAGE_SECONDS
+from models import (
+    BodyRegion,
+    Onset,
+    PainType,
+    SymptomDataRequest,
+    SymptomDuration,
+)
+from rules import SYMPTOM_BITS, TRIGGER_BITS
+
+# Leading record fields that make up the cache key; only the timestamp is left out
+KEY_FIELDS = 10
+
+_REGIONS: Dict[str, BodyRegion] = {region.value: region for region in BodyRegion}
+_PAIN_TYPES: Dict[str, PainType] = {pain.value: pain for pain in PainType}
+_DURATIONS: Dict[str, SymptomDuration] = {duration.value: duration for duration in SymptomDuration}
+_ONSETS: Dict[str, Onset] = {onset.value: onset for onset in Onset}
+_NO_VALUES: List[Any] = []
+
+
+class SymptomRecord(NamedTuple):
+    """
+    A validated symptom report
+
+    Triggers and associated symptoms are bitsets (rules.TRIGGER_BITS and
+    rules.SYMPTOM_BITS), so their order and duplicates are already gone.
+    """
+    region: BodyRegion
+    pain_type: Optional[PainType]
+    intensity: Optional[int]
+    duration: Optional[SymptomDuration]
+    duration_value: Optional[int]
+    onset: Optional[Onset]
+    triggers: int
+    symptoms: int
+    age_range: Optional[str]
+    biological_sex: Optional[str]
+    timestamp: str
+
+    def key(self) -> Tuple[Hashable, ...]:
+        """Canonical cache key: every field except the timestamp"""
+        return self[:KEY_FIELDS]
+
+
+# Builds a record from a tuple of its fields in order, skipping the
+# Python-level __new__ that NamedTuple generates (about half the cost)
+_new_record = tuple.__new__
+
+
+def _bitset(values: Any, bits: Dict[Any, int]) -> int:
+    if type(values) is not list:
+        raise TypeError("expected a list")
+    mask = 0
+    for value in values:
+        mask |= bits[value]
+    return mask
+
+
+def record_from_request(data: SymptomDataRequest) -> SymptomRecord:
+    """Record for an already validated request"""
+    triggers = 0
+    for trigger in data.triggers:
+        triggers |= TRIGGER_BITS[trigger]
+    symptoms = 0
+    for symptom in data.associatedSymptoms:
+        symptoms |= SYMPTOM_BITS[symptom]
+    return _new_record(SymptomRecord, (
+        data.bodyRegion,
+        data.painType,
+        data.intensity,
+        data.duration,
+        data.durationValue,
+        data.onset,
+        triggers,
+        symptoms,
+        data.ageRange,
+        data.biologicalSex,
+        data.timestamp,
+    ))
+
+
+def _decode(body: bytes) -> Optional[SymptomRecord]:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    if type(payload) is not dict:
+        return None
+    get = payload.get
+    try:
+        region = _REGIONS[get("bodyRegion")]
+        pain_type = get("painType")
+        if pain_type is not None:
+            pain_type = _PAIN_TYPES[pain_type]
+        duration = get("duration")
+        if duration is not None:
+            duration = _DURATIONS[duration]
+        onset = get("onset")
+        if onset is not None:
+            onset = _ONSETS[onset]
+        triggers = _bitset(get("triggers", _NO_VALUES), TRIGGER_BITS)
+        symptoms = _bitset(get("associatedSymptoms", _NO_VALUES), SYMPTOM_BITS)
+    except (KeyError, TypeError):
+        return None
+
+    # Exact types only: anything Pydantic would coerce (5.0, "5") or
+    # reject takes the Pydantic path
+    intensity = get("intensity")
+    duration_value = get("durationValue")
+    age_range = get("ageRange")
+    biological_sex = get("biologicalSex")
+    timestamp = get("timestamp")
+    if (type(timestamp) is not str
+            or (intensity is not None and type(intensity) is not int)
+            or (duration_value is not None and type(duration_value) is not int)
+            or (age_range is not None and type(age_range) is not str)
+            or (biological_sex is not None and type(biological_sex) is not str)):
+        return None
+
+    return _new_record(SymptomRecord, (
+        region, pain_type, intensity, duration, duration_value, onset,
+        triggers, symptoms, age_range, biological_sex, timestamp,
+    ))
+
+
+def decode_record(body: bytes) -> Optional[SymptomRecord]:
+    """
+    Decode a JSON SymptomDataRequest body straight into a record
+
+    Returns None for any body this decoder does not accept, including
+    bodies Pydantic would coerce rather than reject; validate those with
+    SymptomDataRequest for the usual result or error. A decoded body is
+    recorded under the "validation" analysis stage.
+    """
+    if not METRICS_ENABLED:
+        return _decode(body)
+    start = time.perf_counter()
+    record = _decode(body)
+    if record is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - start, "validation")
+    return record
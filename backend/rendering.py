@@ -0,0 +1,194 @@
+"""
+Pre-rendered JSON Responses
+Analysis results are written as bytes from fragments serialized once per
+rule set; only the dynamic fields are encoded per response
+
+The output is byte-for-byte what FastAPI's JSONResponse produces for the
+same AnalysisResult: compact separators, UTF-8, non-ASCII unescaped.
+"""
+
+import functools
+import json
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import Response
+
+from analysis import Triage
+from knowledge_base import KNOWLEDGE_BASE
+from models import AnalysisResult, PossibleCause, UrgencyLevel
+from rules import RULE_SET_HISTORY, RULE_SETS, RuleSet
+
+# Same settings as starlette.responses.JSONResponse.render
+_encode = json.JSONEncoder(
+    ensure_ascii=False,
+    allow_nan=False,
+    separators=(",", ":"),
+).encode
+
+JSON_MEDIA_TYPE = "application/json"
+
+# Largest number of distinct cause fragments kept; causes outside the
+# knowledge base are rare, so this only guards against unbounded growth
+MAX_CAUSE_FRAGMENTS = 4096
+
+
+def _field(name: str) -> str:
+    return _encode(name) + ":"
+
+
+def _render_generic(result: AnalysisResult) -> bytes:
+    """Reference path: the full result through the JSON encoder"""
+    return _encode(result.model_dump(mode="json")).encode("utf-8")
+
+
+class _UrgencyFragments:
+    """The fixed text around the dynamic fields of a result at one urgency level"""
+
+    def __init__(self, level: UrgencyLevel, guidance: str, version: str):
+        self.head = ("{" + _field("urgencyLevel") + _encode(level.value) + ","
+                     + _field("possibleCauses") + "[").encode("utf-8")
+        self.guidance = ("]," + _field("guidance")).encode("utf-8")
+        self.explanation = ("," + _field("redFlags")).encode("utf-8")
+        self.tail = ("," + _field("aiExplanation")).encode("utf-8")
+        self.is_emergency = _tail(level == UrgencyLevel.emergency, version)
+        # The rule set's guidance text for this level, already encoded
+        self.default_guidance = _encode(guidance).encode("utf-8")
+
+
+def _tail(is_emergency: bool, version: Optional[str]) -> bytes:
+    return ("," + _field("isEmergency") + _encode(is_emergency) + ","
+            + _field("ruleSetVersion") + _encode(version) + "}").encode("utf-8")
+
+
+def _cause_key(cause: PossibleCause) -> Tuple[str, str, Tuple[str, ...]]:
+    return cause.name, cause.description, tuple(cause.matchingSymptoms)
+
+
+class ResultRenderer:
+    """
+    Writes AnalysisResult JSON from cached fragments
+
+    Emergency results are shared rule templates and are rendered whole,
+    once. Other results splice the probabilities and the explanation into
+    fragments prepared per urgency level and per cause. The templates, the
+    default guidance and the version come from one rule set; get the
+    renderer for a rule set with renderer_for.
+
+    `causes` are the knowledge base conditions in order followed by the
+    fallback, so that analysis.Triage cause indexes address them directly.
+    """
+
+    def __init__(self, rules: RuleSet, causes: List[PossibleCause]):
+        self.rules = rules
+        self._templates: Dict[int, Tuple[AnalysisResult, bytes]] = {}
+        for rule in rules.red_flags.rules:
+            self._templates[id(rule.result)] = (rule.result, _render_generic(rule.result))
+        self._levels = {
+            level: _UrgencyFragments(level, rules.guidance[level], rules.version) for level in UrgencyLevel
+        }
+        self._causes: Dict[Tuple[str, str, Tuple[str, ...]], Tuple[bytes, bytes]] = {}
+        self._indexed_causes = [self._cause_fragments(cause) for cause in causes]
+
+    def _cause_fragments(self, cause: PossibleCause) -> Tuple[bytes, bytes]:
+        key = _cause_key(cause)
+        fragments = self._causes.get(key)
+        if fragments is None:
+            head = ("{" + _field("name") + _encode(cause.name) + ","
+                    + _field("description") + _encode(cause.description) + ","
+                    + _field("probability"))
+            tail = "," + _field("matchingSymptoms") + _encode(list(cause.matchingSymptoms)) + "}"
+            fragments = (head.encode("utf-8"), tail.encode("utf-8"))
+            if len(self._causes) < MAX_CAUSE_FRAGMENTS:
+                self._causes[key] = fragments
+        return fragments
+
+    def render(self, result: AnalysisResult) -> bytes:
+        template = self._templates.get(id(result))
+        if template is not None and template[0] is result:
+            return template[1]
+
+        fragments = self._levels[result.urgencyLevel]
+        parts: List[bytes] = [fragments.head]
+        for index, cause in enumerate(result.possibleCauses):
+            head, tail = self._cause_fragments(cause)
+            if index:
+                parts.append(b",")
+            parts.append(head)
+            parts.append(_encode(cause.probability).encode("ascii"))
+            parts.append(tail)
+        parts.append(fragments.guidance)
+        if result.guidance == self.rules.guidance[result.urgencyLevel]:
+            parts.append(fragments.default_guidance)
+        else:
+            parts.append(_encode(result.guidance).encode("utf-8"))
+        parts.append(fragments.explanation)
+        parts.append(_encode(result.redFlags).encode("utf-8") if result.redFlags else b"[]")
+        parts.append(fragments.tail)
+        parts.append(_encode(result.aiExplanation).encode("utf-8"))
+        if (result.isEmergency == (result.urgencyLevel == UrgencyLevel.emergency)
+                and result.ruleSetVersion == self.rules.version):
+            parts.append(fragments.is_emergency)
+        else:
+            parts.append(_tail(result.isEmergency, result.ruleSetVersion))
+        return b"".join(parts)
+
+    def render_triage(self, result: Triage) -> bytes:
+        """
+        The same bytes as render(triage_result(result)), without building the
+        models; result must have been computed under this renderer's rule set
+        """
+        if result.rule:
+            return self._templates[id(result.rule.result)][1]
+
+        fragments = self._levels[result.urgency]
+        causes = self._indexed_causes
+        parts: List[bytes] = [fragments.head]
+        for position, (index, probability) in enumerate(result.causes):
+            head, tail = causes[index]
+            if position:
+                parts.append(b",")
+            parts.append(head)
+            parts.append(_encode(probability).encode("ascii"))
+            parts.append(tail)
+        parts.append(fragments.guidance)
+        parts.append(fragments.default_guidance)
+        parts.append(fragments.explanation)
+        parts.append(b"[]")
+        parts.append(fragments.tail)
+        parts.append(_encode(result.explanation).encode("utf-8"))
+        parts.append(fragments.is_emergency)
+        return b"".join(parts)
+
+    def render_enriched(self, result: AnalysisResult, job_id: Optional[str]) -> bytes:
+        """An EnrichedAnalysisResult: the result with enrichmentJobId appended"""
+        body = self.render(result)
+        return body[:-1] + b',"enrichmentJobId":' + _encode(job_id).encode("utf-8") + b"}"
+
+    def render_list(self, results: List[AnalysisResult]) -> bytes:
+        return b"[" + b",".join(self.render(result) for result in results) + b"]"
+
+
+def json_response(body: bytes) -> Response:
+    """Pre-rendered JSON body as a response; FastAPI skips response_model validation for it"""
+    return Response(content=body, media_type=JSON_MEDIA_TYPE)
+
+
+# The knowledge base conditions followed by the fallback, as ResultRenderer expects
+CAUSES: List[PossibleCause] = [
+    PossibleCause(
+        name=condition.name,
+        description=condition.description,
+        probability=condition.probability,
+        matchingSymptoms=condition.matchingSymptoms,
+    )
+    for condition in KNOWLEDGE_BASE.conditions
+] + [KNOWLEDGE_BASE.fallback]
+
+
+@functools.lru_cache(maxsize=RULE_SET_HISTORY + 2)
+def renderer_for(rules: RuleSet) -> ResultRenderer:
+    """The renderer for a rule set; built when the rule set is activated"""
+    return ResultRenderer(rules, CAUSES)
+
+
+RULE_SETS.on_activate(renderer_for)
@@ -0,0 +1,197 @@
+"""
+NDJSON Bulk Triage Replay
+Re-scores intake logs line by line with constant memory
+
+Output is flushed every chunk_size input lines, valid or not, and no line
+is buffered beyond MAX_LINE_BYTES: a longer line is answered with an error
+and the rest of it is skipped.
+
+Usage:
+    python replay.py intake.jsonl -o results.jsonl --chunk-size 1000
+    cat intake.jsonl | python replay.py > results.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple, Union
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from batch import analyze_batch
+from models import SymptomDataRequest
+
+DEFAULT_CHUNK_SIZE = 1000
+# Longest input line accepted, in bytes (characters for text input)
+MAX_LINE_BYTES = int(os.getenv("REPLAY_MAX_LINE_BYTES", str(1 << 20)))
+
+
+class OversizedLine:
+    """Stands in for an input line longer than the limit, whose content was dropped"""
+
+
+OVERSIZED_LINE = OversizedLine()
+
+Line = Union[str, bytes, OversizedLine]
+
+
+def _error_line(line_number: int, message: str) -> str:
+    return json.dumps({"line": line_number, "error": message}) + "\n"
+
+
+def _result_line(line_number: int, result_json: str) -> str:
+    return f'{{"line":{line_number},"result":{result_json}}}\n'
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+
+class ReplayChunker:
+    """
+    Accumulates parsed input lines into chunks of at most chunk_size records
+
+    Every input line produces exactly one output line, in input order:
+        {"line": n, "result": {...AnalysisResult...}}
+        {"line": n, "error": "..."}
+    Blank lines are skipped but still counted for line numbers. A chunk is
+    ready after chunk_size output lines, errors included, so invalid input
+    is streamed out as it arrives rather than held until enough valid
+    records turn up.
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, max_line_bytes: int = MAX_LINE_BYTES):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.chunk_size = chunk_size
+        self.max_line_bytes = max_line_bytes
+        self.line_number = 0
+        self.pending: List[Tuple[int, Union[SymptomDataRequest, str]]] = []
+
+    def add(self, line: Line) -> bool:
+        """Parse one input line; returns True when a chunk is ready to flush"""
+        self.line_number += 1
+        if line is OVERSIZED_LINE or len(line) > self.max_line_bytes:
+            self.pending.append((self.line_number, f"line is longer than {self.max_line_bytes} bytes"))
+        elif not line.strip():
+            return False
+        else:
+            try:
+                data = SymptomDataRequest.model_validate_json(line)
+            except ValidationError as e:
+                self.pending.append((self.line_number, _format_validation_error(e)))
+            else:
+                self.pending.append((self.line_number, data))
+        return len(self.pending) >= self.chunk_size
+
+    def flush(self) -> str:
+        """Analyze the pending chunk and render it as NDJSON"""
+        cases = [item for _, item in self.pending if isinstance(item, SymptomDataRequest)]
+        results = iter(analyze_batch(cases))
+        out = []
+        for line_number, item in self.pending:
+            if isinstance(item, SymptomDataRequest):
+                out.append(_result_line(line_number, next(results).model_dump_json()))
+            else:
+                out.append(_error_line(line_number, item))
+        self.pending = []
+        return "".join(out)
+
+
+def replay_lines(lines: Iterable[Line], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_line_bytes: int = MAX_LINE_BYTES) -> Iterator[str]:
+    """Score an iterable of NDJSON lines, yielding NDJSON output one chunk at a time"""
+    chunker = ReplayChunker(chunk_size, max_line_bytes)
+    for line in lines:
+        if chunker.add(line):
+            yield chunker.flush()
+    if chunker.pending:
+        yield chunker.flush()
+
+
+async def split_lines(stream: AsyncIterator[bytes],
+                      max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[Union[bytes, OversizedLine]]:
+    """
+    Split an async byte stream (e.g. a request body) into lines
+
+    A line longer than max_line_bytes comes out as OVERSIZED_LINE once it
+    passes the limit; the rest of it is dropped rather than buffered.
+    """
+    buffer = b""
+    # Inside a line already reported as oversized
+    skipping = False
+    async for block in stream:
+        buffer += block
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                # The end of the oversized line
+                skipping = False
+                continue
+            yield line if len(line) <= max_line_bytes else OVERSIZED_LINE
+        if len(buffer) > max_line_bytes:
+            if not skipping:
+                yield OVERSIZED_LINE
+                skipping = True
+            buffer = b""
+    if buffer and not skipping:
+        yield buffer
+
+
+async def replay_stream(stream: AsyncIterator[bytes], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[str]:
+    """Async counterpart of replay_lines for streaming HTTP bodies"""
+    chunker = ReplayChunker(chunk_size, max_line_bytes)
+    async for line in split_lines(stream, max_line_bytes):
+        if chunker.add(line):
+            # Scoring a chunk is CPU-bound; keep it off the event loop
+            yield await run_in_threadpool(chunker.flush)
+    if chunker.pending:
+        yield await run_in_threadpool(chunker.flush)
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    Streaming response whose iterator consumes the request body
+
+    StreamingResponse normally reads receive() in parallel to watch for a
+    client disconnect, which would swallow the request body chunks. Here the
+    body iterator is the only reader; a disconnect surfaces from
+    request.stream() as ClientDisconnect instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-score an NDJSON intake log")
+    parser.add_argument("input", nargs="?", default="-", help="NDJSON input file (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"records analyzed per batch (default: {DEFAULT_CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for block in replay_lines(source, args.chunk_size):
+            sink.write(block)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+Adaptive Provider Router
+Spreads AI completions over several providers using their recent latency
+and error history
+
+- Providers are tried in order of health: degraded ones (high recent error
+  rate) last, then fallback providers (the local one), otherwise fastest
+  median latency first. Providers without samples yet sort first so they
+  get measured.
+- When the running call is slower than that provider's recent p95, the
+  same prompt is sent to the next provider (a hedged request); the first
+  successful answer wins and the other call is cancelled.
+- A call that fails moves on to the next provider straight away.
+- Repeated failures open a provider's circuit breaker: it is skipped until
+  a cool-down has passed, then a single probe call decides whether it is
+  closed again.
+
+When no provider can be called, AllProvidersUnavailable is raised and
+AIService falls back to the deterministic explanation.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from metrics import PROVIDER_ROUTER_EVENTS_TOTAL
+from providers import AsyncProviderClient, ProviderError, get_provider_client
+
+# Rolling window of calls kept per provider
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "200"))
+# Latency samples needed before a provider's own p95 is trusted
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "20"))
+# Hedge delay used until a provider has ROUTER_MIN_SAMPLES samples
+ROUTER_HEDGE_SECONDS = float(os.getenv("ROUTER_HEDGE_SECONDS", "2.0"))
+ROUTER_HEDGE_QUANTILE = float(os.getenv("ROUTER_HEDGE_QUANTILE", "0.95"))
+# Error rate over the window above which a provider is tried last
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+
+# Consecutive failures that open a circuit breaker
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class AllProvidersUnavailable(ProviderError):
+    """Raised when every provider is failing or has an open circuit breaker"""
+
+
+class ProviderStats:
+    """Latency and outcome of a provider's most recent calls"""
+
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+
+    def record(self, latency: Optional[float], success: bool) -> None:
+        if latency is not None:
+            self.latencies.append(latency)
+        self.outcomes.append(success)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failures` consecutive failures; open -> half-open
+    once `cooldown` seconds have passed. A half-open breaker lets one probe
+    call through: success closes it, failure opens it again.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._clock = clock
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.cooldown:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def available(self) -> bool:
+        """True if a call may be started now; does not claim the half-open probe"""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self._probing)
+
+    def begin(self) -> None:
+        if self.state == HALF_OPEN:
+            self._probing = True
+
+    def cancelled(self) -> None:
+        """A call was abandoned before it finished; it counts as neither outcome"""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self) -> bool:
+        """Count a failure; True if this opened the breaker"""
+        self._consecutive_failures += 1
+        self._probing = False
+        if self._state == HALF_OPEN or (
+            self._state == CLOSED and self._consecutive_failures >= self.failures
+        ):
+            self._state = OPEN
+            self._opened_at = self._clock()
+            return True
+        return False
+
+
+class ProviderRouter:
+    """Routes completions over the configured providers with hedging and circuit breakers"""
+
+    def __init__(self, names: Sequence[str],
+                 resolve: Callable[[str], AsyncProviderClient] = get_provider_client,
+                 hedge_quantile: float = ROUTER_HEDGE_QUANTILE,
+                 default_hedge_seconds: float = ROUTER_HEDGE_SECONDS,
+                 min_samples: int = ROUTER_MIN_SAMPLES,
+                 breaker_failures: int = BREAKER_FAILURES,
+                 breaker_cooldown: float = BREAKER_COOLDOWN_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.names = list(dict.fromkeys(names))
+        self._resolve = resolve
+        self.hedge_quantile = hedge_quantile
+        self.default_hedge_seconds = default_hedge_seconds
+        self.min_samples = min_samples
+        self._clock = clock
+        self.stats_by_provider = {name: ProviderStats() for name in self.names}
+        self.breakers = {
+            name: CircuitBreaker(breaker_failures, breaker_cooldown, clock) for name in self.names
+        }
+
+    def client(self, name: str) -> AsyncProviderClient:
+        # Resolved per call so clients registered later (e.g. stubs) are used
+        return self._resolve(name)
+
+    @property
+    def configured(self) -> bool:
+        """True when at least one provider has credentials"""
+        return any(self.client(name).configured for name in self.names)
+
+    def hedge_delay(self, name: str) -> float:
+        stats = self.stats_by_provider[name]
+        if len(stats.latencies) < self.min_samples:
+            return self.default_hedge_seconds
+        return stats.quantile(self.hedge_quantile)
+
+    def candidates(self) -> List[str]:
+        """Configured providers whose breaker allows a call, best first"""
+        ranked = []
+        for position, name in enumerate(self.names):
+            client = self.client(name)
+            if not self.breakers[name].available() or not client.configured:
+                continue
+            stats = self.stats_by_provider[name]
+            median = stats.quantile(0.5) if len(stats.latencies) >= self.min_samples else None
+            ranked.append((stats.error_rate > ROUTER_MAX_ERROR_RATE, client.fallback, median or 0.0,
+                           position, name))
+        ranked.sort()
+        return [entry[-1] for entry in ranked]
+
+    async def _attempt(self, name: str, system_prompt: str, prompt: str) -> str:
+        breaker = self.breakers[name]
+        stats = self.stats_by_provider[name]
+        breaker.begin()
+        start = self._clock()
+        try:
+            text = await self.client(name).complete(system_prompt, prompt)
+        except ProviderError:
+            stats.record(None, False)
+            if breaker.record_failure():
+                PROVIDER_ROUTER_EVENTS_TOTAL.inc(name, "circuit_open")
+            raise
+        except asyncio.CancelledError:
+            # Lost a hedge race; the time so far is a lower bound on its
+            # latency, and keeps a slow provider from looking fast forever
+            stats.latencies.append(self._clock() - start)
+            breaker.cancelled()
+            raise
+        stats.record(self._clock() - start, True)
+        breaker.record_success()
+        return text
+
+    async def complete(self, system_prompt: str, prompt: str) -> Tuple[str, str]:
+        """
+        Completion text and the name of the provider that produced it
+
+        Raises:
+            AllProvidersUnavailable: if no provider could be called or every
+                provider tried failed
+        """
+        remaining = self.candidates()
+        if not remaining:
+            raise AllProvidersUnavailable("every AI provider has an open circuit breaker")
+
+        pending: Dict["asyncio.Task[str]", str] = {}
+        errors: List[str] = []
+        last_started = 0.0
+        last_name = ""
+
+        def launch() -> None:
+            nonlocal last_started, last_name
+            last_name = remaining.pop(0)
+            last_started = self._clock()
+            task = asyncio.ensure_future(self._attempt(last_name, system_prompt, prompt))
+            pending[task] = last_name
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if remaining:
+                    timeout = max(0.0, last_started + self.hedge_delay(last_name) - self._clock())
+                done, _ = await asyncio.wait(pending, timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    PROVIDER_ROUTER_EVENTS_TOTAL.inc(last_name, "hedged")
+                    launch()
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        return task.result(), name
+                    except ProviderError as e:
+                        errors.append(f"{name}: {e}")
+                # Everything that finished failed: don't wait for the hedge delay
+                if remaining:
+                    PROVIDER_ROUTER_EVENTS_TOTAL.inc(remaining[0], "failover")
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise AllProvidersUnavailable("; ".join(errors))
+
+    def pick(self) -> str:
+        """
+        The provider a stream started now would use
+
+        Raises:
+            AllProvidersUnavailable: if no provider can be called
+        """
+        candidates = self.candidates()
+        if not candidates:
+            raise AllProvidersUnavailable("every AI provider has an open circuit breaker")
+        return candidates[0]
+
+    async def stream(self, system_prompt: str, prompt: str, name: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream from `name` (a provider returned by pick), or the best
+        available provider
+
+        Streams are neither hedged nor failed over, since text may already
+        have reached the client; their outcome still feeds the breaker.
+        Stream durations are not comparable with completion latencies and
+        are not recorded.
+
+        Raises:
+            AllProvidersUnavailable: if no provider can be called
+        """
+        name = name or self.pick()
+        breaker = self.breakers[name]
+        stats = self.stats_by_provider[name]
+        breaker.begin()
+        chunks = self.client(name).stream(system_prompt, prompt)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except ProviderError:
+            stats.record(None, False)
+            if breaker.record_failure():
+                PROVIDER_ROUTER_EVENTS_TOTAL.inc(name, "circuit_open")
+            raise
+        except BaseException:
+            # Closed early by the consumer (e.g. a safety abort)
+            breaker.cancelled()
+            raise
+        finally:
+            await chunks.aclose()
+        stats.record(None, True)
+        breaker.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        result = {}
+        for name in self.names:
+            stats = self.stats_by_provider[name]
+            result[name] = {
+                "state": self.breakers[name].state,
+                "calls": len(stats.outcomes),
+                "errorRate": stats.error_rate,
+                "p50Seconds": stats.quantile(0.5),
+                "p95Seconds": stats.quantile(0.95),
+                "hedgeDelaySeconds": self.hedge_delay(name),
+            }
+        return result
@@ -0,0 +1,516 @@
+"""
+Red Flag Rule Engine
+Declarative emergency and urgency rules, loaded from a versioned rule set
+file (data/rules.json) and compiled into integer bitmasks
+
+A compiled RuleSet is immutable. RULE_SETS holds the active one and
+replaces it whole: requests read RULE_SETS.current once and use that rule
+set to the end, so a swap never mixes two versions in one result and
+requests already running finish on the version they started with.
+Everything derived from a rule set (response fragments, decision tables,
+session dependencies) is built by activation hooks before the swap, off
+the request path. Previous rule sets are kept for rollback.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator, model_validator
+
+from metrics import RULE_SET_CHANGES_TOTAL
+from models import (
+    AnalysisResult,
+    AssociatedSymptom,
+    BodyRegion,
+    PossibleCause,
+    SymptomDataRequest,
+    SymptomDuration,
+    Trigger,
+    UrgencyLevel,
+)
+
+RULES_PATH = os.getenv(
+    "RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rules.json"),
+)
+# Previously active rule sets kept for rollback
+RULE_SET_HISTORY = int(os.getenv("RULE_SET_HISTORY", "5"))
+# Seconds between checks of RULES_PATH for a new rule set; 0 turns the watcher off
+RULES_WATCH_INTERVAL = float(os.getenv("RULES_WATCH_INTERVAL", "0"))
+# Token for the /api/admin/rules endpoints (X-Admin-Token); empty disables them
+RULES_ADMIN_TOKEN = os.getenv("RULES_ADMIN_TOKEN", "")
+
+# Intensity is reported on a 0-10 scale; out-of-range values are clamped
+# before being mapped to a bit so threshold semantics are preserved
+MAX_INTENSITY = 10
+
+
+class RuleSetError(ValueError):
+    """A rule set that cannot be loaded or activated"""
+
+
+class EmergencyResult(BaseModel):
+    """The fixed answer of a red flag rule"""
+    possibleCauses: List[PossibleCause]
+    guidance: str
+    redFlags: List[str]
+    aiExplanation: str
+
+    @field_validator("redFlags")
+    @classmethod
+    def has_red_flags(cls, red_flags: List[str]) -> List[str]:
+        # Sessions and the enriched/stream routes tell emergencies apart by them
+        if not red_flags:
+            raise ValueError("an emergency result must list at least one red flag")
+        return red_flags
+
+
+class RedFlagRule(BaseModel):
+    """
+    One red flag rule; rules are evaluated in order and the first match wins
+
+    A rule may constrain:
+      regions       - body regions the rule applies to (omit for any region)
+      allSymptoms   - associated symptoms that must ALL be present
+      anySymptoms   - associated symptoms of which at least one must be present
+      minIntensity  - minimum reported pain intensity
+    """
+    id: str
+    regions: List[BodyRegion] = []
+    allSymptoms: List[AssociatedSymptom] = []
+    anySymptoms: List[AssociatedSymptom] = []
+    minIntensity: Optional[int] = None
+    result: EmergencyResult
+
+    @model_validator(mode="after")
+    def constrained(self) -> "RedFlagRule":
+        # A rule without conditions would make every report an emergency
+        if not (self.regions or self.allSymptoms or self.anySymptoms or self.minIntensity):
+            raise ValueError(f"red flag rule {self.id!r} has no conditions")
+        return self
+
+
+class UrgencyRule(BaseModel):
+    """
+    One urgency level for non-emergency requests; levels are checked from
+    most to least urgent, and a level applies when ANY of its conditions holds:
+      minIntensity  - reported pain intensity at or above this value
+      anySymptoms   - at least one of these associated symptoms is present
+      durations     - the symptom duration is one of these values
+    """
+    level: UrgencyLevel
+    minIntensity: Optional[int] = None
+    anySymptoms: List[AssociatedSymptom] = []
+    durations: List[SymptomDuration] = []
+
+
+class RuleSetFile(BaseModel):
+    """
+    A versioned rule set artifact (data/rules.json)
+
+    Bump `version` on every edit: it is returned with every result and keys
+    the analysis cache, and a loaded version cannot be reused for different rules.
+    """
+    version: str
+    redFlagRules: List[RedFlagRule]
+    urgencyRules: List[UrgencyRule]
+    guidance: Dict[UrgencyLevel, str]
+
+    @model_validator(mode="after")
+    def consistent(self) -> "RuleSetFile":
+        if not self.version:
+            raise ValueError("version must not be empty")
+        ids = [rule.id for rule in self.redFlagRules]
+        duplicates = sorted({rule_id for rule_id in ids if ids.count(rule_id) > 1})
+        if duplicates:
+            raise ValueError(f"duplicate red flag rule ids: {', '.join(duplicates)}")
+        missing = [level.value for level in UrgencyLevel if level not in self.guidance]
+        if missing:
+            raise ValueError(f"guidance missing for urgency levels: {', '.join(missing)}")
+        return self
+
+
+# Bit assignments - one bit per enum member, in declaration order
+REGION_BITS: Dict[BodyRegion, int] = {region: 1 << i for i, region in enumerate(BodyRegion)}
+SYMPTOM_BITS: Dict[AssociatedSymptom, int] = {symptom: 1 << i for i, symptom in enumerate(AssociatedSymptom)}
+DURATION_BITS: Dict[SymptomDuration, int] = {duration: 1 << i for i, duration in enumerate(SymptomDuration)}
+TRIGGER_BITS: Dict[Trigger, int] = {trigger: 1 << i for i, trigger in enumerate(Trigger)}
+ALL_REGIONS_MASK = (1 << len(BodyRegion)) - 1
+ALL_INTENSITIES_MASK = (1 << (MAX_INTENSITY + 1)) - 1
+
+
+class FrozenAnalysisResult(AnalysisResult):
+    """Immutable analysis result used for pre-built emergency templates"""
+
+    model_config = ConfigDict(frozen=True)
+
+
+class CompiledRule(NamedTuple):
+    rule_id: str
+    region_mask: int
+    all_mask: int
+    any_mask: int
+    intensity_mask: int
+    result: FrozenAnalysisResult
+
+
+def region_mask(regions: Iterable[str]) -> int:
+    """Encode body regions as a bitmask"""
+    mask = 0
+    for region in regions:
+        mask |= REGION_BITS[region]
+    return mask
+
+
+def symptom_mask(symptoms: Iterable[str]) -> int:
+    """Encode associated symptoms as a bitmask"""
+    mask = 0
+    for symptom in symptoms:
+        mask |= SYMPTOM_BITS[symptom]
+    return mask
+
+
+def duration_mask(durations: Iterable[str]) -> int:
+    """Encode symptom durations as a bitmask"""
+    mask = 0
+    for duration in durations:
+        mask |= DURATION_BITS[duration]
+    return mask
+
+
+def duration_bit(duration: Optional[str]) -> int:
+    """Encode a reported duration (missing counts as no bits set)"""
+    return DURATION_BITS[duration] if duration else 0
+
+
+def intensity_bit(intensity: Optional[int]) -> int:
+    """Encode a reported intensity (missing counts as 0) as a single bit"""
+    value = min(max(intensity or 0, 0), MAX_INTENSITY)
+    return 1 << value
+
+
+def intensity_mask(min_intensity: int) -> int:
+    """Bitmask of every intensity value at or above the threshold"""
+    value = min(max(min_intensity, 0), MAX_INTENSITY)
+    return ALL_INTENSITIES_MASK & ~((1 << value) - 1)
+
+
+def compile_rule(rule: RedFlagRule, version: str) -> CompiledRule:
+    """Compile a declarative rule into bitmasks and an immutable result template"""
+    return CompiledRule(
+        rule_id=rule.id,
+        region_mask=region_mask(rule.regions) if rule.regions else ALL_REGIONS_MASK,
+        all_mask=symptom_mask(rule.allSymptoms),
+        any_mask=symptom_mask(rule.anySymptoms),
+        intensity_mask=intensity_mask(rule.minIntensity or 0),
+        result=FrozenAnalysisResult(
+            urgencyLevel="emergency",
+            isEmergency=True,
+            ruleSetVersion=version,
+            **rule.result.model_dump()
+        ),
+    )
+
+
+class RedFlagEngine:
+    """
+    Compiled red flag rule table
+
+    Matching a request costs a handful of integer operations per rule,
+    and matching rules return a shared pre-built result template.
+    """
+
+    def __init__(self, rules: List[RedFlagRule], version: str):
+        self.rules = tuple(compile_rule(rule, version) for rule in rules)
+
+    def match(self, region_bit: int, symptoms: int, intensity: int) -> Optional[CompiledRule]:
+        """Return the first rule matching the encoded request, if any"""
+        for rule in self.rules:
+            if (rule.region_mask & region_bit and
+                symptoms & rule.all_mask == rule.all_mask and
+                (not rule.any_mask or symptoms & rule.any_mask) and
+                rule.intensity_mask & intensity):
+                return rule
+        return None
+
+    def evaluate(self, data: SymptomDataRequest) -> Optional[AnalysisResult]:
+        """Run the rule table against a request"""
+        rule = self.match(
+            REGION_BITS[data.bodyRegion],
+            symptom_mask(data.associatedSymptoms),
+            intensity_bit(data.intensity),
+        )
+        return rule.result if rule else None
+
+
+class CompiledUrgencyRule(NamedTuple):
+    level: UrgencyLevel
+    intensity_mask: int
+    symptom_mask: int
+    duration_mask: int
+
+
+def compile_urgency_rule(rule: UrgencyRule) -> CompiledUrgencyRule:
+    """Compile a declarative urgency level into bitmasks"""
+    return CompiledUrgencyRule(
+        level=rule.level,
+        intensity_mask=intensity_mask(rule.minIntensity) if rule.minIntensity is not None else 0,
+        symptom_mask=symptom_mask(rule.anySymptoms),
+        duration_mask=duration_mask(rule.durations),
+    )
+
+
+class UrgencyEngine:
+    """Compiled urgency table; requests matching no level are low urgency"""
+
+    def __init__(self, rules: List[UrgencyRule]):
+        self.rules = tuple(compile_urgency_rule(rule) for rule in rules)
+
+    def match(self, symptoms: int, intensity: int, duration: int) -> UrgencyLevel:
+        """Return the urgency level for an encoded request"""
+        for rule in self.rules:
+            if (rule.intensity_mask & intensity or
+                rule.symptom_mask & symptoms or
+                rule.duration_mask & duration):
+                return rule.level
+        return UrgencyLevel.low
+
+    def evaluate(self, data: SymptomDataRequest) -> UrgencyLevel:
+        """Run the urgency table against a request"""
+        return self.match(
+            symptom_mask(data.associatedSymptoms),
+            intensity_bit(data.intensity),
+            duration_bit(data.duration),
+        )
+
+
+class RuleSet:
+    """
+    A validated, compiled rule set
+
+    `digest` identifies the content: two rule sets with the same version
+    must have the same digest. Rule sets are compared by identity, so an
+    object built from a rule set (a renderer, a decision table) can tell
+    whether it belongs to the one a request is using.
+    """
+
+    def __init__(self, spec: RuleSetFile, source: str = "inline"):
+        self.spec = spec
+        self.version = spec.version
+        self.source = source
+        self.digest = hashlib.sha256(spec.model_dump_json().encode("utf-8")).hexdigest()
+        self.red_flags = RedFlagEngine(spec.redFlagRules, spec.version)
+        self.urgency = UrgencyEngine(spec.urgencyRules)
+        self.guidance: Dict[UrgencyLevel, str] = dict(spec.guidance)
+        self.loaded_at = time.time()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "digest": self.digest,
+            "source": self.source,
+            "loadedAt": self.loaded_at,
+            "redFlagRules": len(self.red_flags.rules),
+            "urgencyRules": len(self.urgency.rules),
+        }
+
+
+def parse_rule_set(payload: Any, source: str = "inline") -> RuleSet:
+    """
+    Validate and compile a rule set document
+
+    Raises:
+        RuleSetError: if the document is not a valid rule set
+    """
+    try:
+        spec = RuleSetFile.model_validate(payload)
+    except ValidationError as e:
+        raise RuleSetError(f"invalid rule set: {e}") from None
+    return RuleSet(spec, source)
+
+
+def load_rule_set(path: str = RULES_PATH) -> RuleSet:
+    """
+    Load, validate and compile a rule set file
+
+    Raises:
+        RuleSetError: if the file cannot be read or is not a valid rule set
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuleSetError(f"cannot read rule set {path}: {e}") from None
+    return parse_rule_set(payload, path)
+
+
+def write_rule_set(rules: RuleSet, path: str = RULES_PATH) -> None:
+    """Write a rule set's document to path atomically"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rules.spec.model_dump(mode="json", exclude_defaults=True), f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+class RuleSetRegistry:
+    """
+    The active rule set and the ones it replaced
+
+    A swap is a single reference assignment made after every activation
+    hook has prepared the incoming rule set. Activations are serialized;
+    readers never lock. A version already seen (active or in the history)
+    is only accepted again with the same content, and then the existing
+    object is reused, so whatever was built for it still applies.
+    """
+
+    def __init__(self, initial: RuleSet, history: int = RULE_SET_HISTORY):
+        self.current = initial
+        self.history: Deque[RuleSet] = deque(maxlen=max(history, 0))
+        self._hooks: List[Callable[[RuleSet], None]] = []
+        self._lock = threading.Lock()
+        self.activated_at = time.time()
+        self.activations = 0
+        self.rollbacks = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+
+    def on_activate(self, hook: Callable[[RuleSet], None]) -> None:
+        """
+        Run hook(rules) before any rule set becomes active, and now for the current one
+
+        A hook that raises rejects the activation.
+        """
+        with self._lock:
+            self._hooks.append(hook)
+            hook(self.current)
+
+    def _known(self, rules: RuleSet) -> RuleSet:
+        for known in (self.current, *self.history):
+            if known.version == rules.version:
+                if known.digest != rules.digest:
+                    raise RuleSetError(f"rule set version {rules.version} is already in use with different rules")
+                return known
+        return rules
+
+    def _swap(self, rules: RuleSet) -> None:
+        for hook in self._hooks:
+            hook(rules)
+        if rules in self.history:
+            self.history.remove(rules)
+        self.current = rules
+        self.activated_at = time.time()
+        self.last_error = None
+
+    def _reject(self, error: Exception) -> None:
+        self.rejected += 1
+        self.last_error = str(error)
+        RULE_SET_CHANGES_TOTAL.inc("rejected")
+
+    def activate(self, rules: RuleSet) -> RuleSet:
+        """
+        Make rules the active rule set; returns the rule set now active
+
+        Activating the version that is already active is a no-op.
+
+        Raises:
+            RuleSetError: if the version is known with different rules, or a hook failed
+        """
+        with self._lock:
+            try:
+                rules = self._known(rules)
+                if rules is self.current:
+                    return rules
+                previous = self.current
+                self._swap(rules)
+            except Exception as e:
+                self._reject(e)
+                if isinstance(e, RuleSetError):
+                    raise
+                raise RuleSetError(f"rule set {rules.version} failed to activate: {e}") from e
+            self.history.append(previous)
+            self.activations += 1
+            RULE_SET_CHANGES_TOTAL.inc("activated")
+            return rules
+
+    def rollback(self) -> RuleSet:
+        """
+        Reactivate the most recently replaced rule set; the active one is dropped
+
+        Raises:
+            RuleSetError: if there is nothing to roll back to, or a hook failed
+        """
+        with self._lock:
+            if not self.history:
+                raise RuleSetError("no previous rule set to roll back to")
+            rules = self.history[-1]
+            try:
+                self._swap(rules)
+            except Exception as e:
+                self._reject(e)
+                raise RuleSetError(f"rule set {rules.version} failed to activate: {e}") from e
+            self.rollbacks += 1
+            RULE_SET_CHANGES_TOTAL.inc("rolled_back")
+            return rules
+
+    def reload(self, path: str = RULES_PATH) -> RuleSet:
+        """Load the rule set file at path and activate it"""
+        try:
+            rules = load_rule_set(path)
+        except RuleSetError as e:
+            with self._lock:
+                self._reject(e)
+            raise
+        return self.activate(rules)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "current": self.current.describe(),
+                "activatedAt": self.activated_at,
+                # Most recent first; rollback() returns to the first entry
+                "history": [rules.describe() for rules in reversed(self.history)],
+                "activations": self.activations,
+                "rollbacks": self.rollbacks,
+                "rejected": self.rejected,
+                "lastError": self.last_error,
+            }
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+async def watch_rule_file(registry: "RuleSetRegistry", path: str = RULES_PATH,
+                          interval: float = RULES_WATCH_INTERVAL) -> None:
+    """
+    Background task: activate the rule set file whenever it changes
+
+    The file is loaded and compiled in a worker thread. A file that does
+    not validate is recorded in registry.stats() and otherwise ignored;
+    the active rule set stays in place until a valid one is written.
+    """
+    last = _file_stamp(path)
+    while True:
+        await asyncio.sleep(interval)
+        stamp = _file_stamp(path)
+        if stamp is None or stamp == last:
+            continue
+        last = stamp
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, registry.reload, path)
+        except RuleSetError:
+            pass
+
+
+RULE_SETS = RuleSetRegistry(load_rule_set())
@@ -0,0 +1,181 @@
+"""
+AI Response Safety Validator
+Checks AI output for diagnostic claims, medication advice and missing
+disclaimers; the forbidden phrase list is matched in a single regex pass
+whose cost does not grow with the number of phrases
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# Phrases that indicate a diagnosis or certainty. Matched anywhere in the
+# lowercased explanation.
+FORBIDDEN_DIAGNOSIS_PHRASES: List[str] = [
+    "you have",
+    "you are diagnosed",
+    "this is definitely",
+    "the diagnosis is",
+    "you definitely have",
+    "you are suffering from",
+    "this confirms",
+    "it is certainly",
+]
+
+# Phrases that recommend medication or treatment
+FORBIDDEN_MEDICATION_PHRASES: List[str] = [
+    "you need to take",
+    "take this medication",
+    "you should take",
+    "start taking",
+    "stop taking",
+    "increase your dose",
+]
+
+# Regular expressions for dosing instructions, matched against the
+# lowercased explanation. Keep this list short: unlike literal phrases,
+# each pattern adds to the cost of every scan.
+MEDICATION_PATTERNS: List[str] = [
+    r"\b\d+(?:\.\d+)?\s?(?:mg|mcg|µg|ml|iu)\b",
+    r"\b(?:once|twice|three times|four times)\s+(?:a|per)\s+day\b",
+    r"\bevery\s+\d+\s+hours\b",
+]
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """
+    Compile literal phrases into a prefix-sharing regex
+
+    The regex engine then walks at most one branch per character, so the
+    cost of a scan does not grow with the number of phrases. Phrases that
+    extend a shorter phrase are dropped: the shorter one already matches.
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase.lower():
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: Dict[str, Any]) -> str:
+        if "" in node:
+            return ""
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return render(trie) if trie else ""
+
+
+class SafetyValidator:
+    """
+    Precompiled validator for AI responses
+
+    Literal phrases are folded into one prefix-sharing regex, so checking an
+    explanation is one scan regardless of how many phrases are configured.
+    Medication patterns are combined into a second regex. The explanation
+    is lowercased once and both scans run over that copy.
+    """
+
+    def __init__(
+        self,
+        forbidden_phrases: Iterable[str] = (),
+        medication_patterns: Iterable[str] = (),
+        required_fields: Iterable[str] = ("disclaimer",),
+    ):
+        self.forbidden_phrases = list(forbidden_phrases)
+        self.medication_patterns = list(medication_patterns)
+        self.required_fields = tuple(required_fields)
+
+        phrase_pattern = _trie_pattern(self.forbidden_phrases)
+        self._phrase_pattern: Optional[re.Pattern] = (
+            re.compile(phrase_pattern) if phrase_pattern else None
+        )
+        self._medication_pattern: Optional[re.Pattern] = (
+            re.compile("|".join(f"(?:{pattern})" for pattern in self.medication_patterns))
+            if self.medication_patterns else None
+        )
+        # Longest literal phrase; used by streaming callers to size the
+        # window they must keep across chunk boundaries
+        self.max_phrase_length = max((len(phrase) for phrase in self.forbidden_phrases), default=0)
+
+    def extend(self, forbidden_phrases: Iterable[str] = (),
+               medication_patterns: Iterable[str] = ()) -> "SafetyValidator":
+        """Return a new validator with additional phrases or patterns"""
+        return SafetyValidator(
+            self.forbidden_phrases + list(forbidden_phrases),
+            self.medication_patterns + list(medication_patterns),
+            self.required_fields,
+        )
+
+    def find_violation(self, text: str) -> Optional[str]:
+        """Return the first forbidden phrase or dosing instruction found in the text, if any"""
+        lowered = text.lower()
+        for pattern in (self._phrase_pattern, self._medication_pattern):
+            if pattern is not None:
+                match = pattern.search(lowered)
+                if match:
+                    return match.group(0)
+        return None
+
+    def is_safe_text(self, text: str) -> bool:
+        return self.find_violation(text) is None
+
+    def validate(self, response: Dict[str, Any]) -> bool:
+        """
+        Validate an AI response dict
+
+        Fails on any forbidden phrase or medication pattern in the explanation,
+        or when a required field (the disclaimer) is missing or empty.
+        """
+        for field in self.required_fields:
+            if not response.get(field):
+                return False
+        return self.is_safe_text(response.get("explanation", ""))
+
+
+class UnsafeContentError(Exception):
+    """Raised when streamed AI output fails the safety validator"""
+
+
+# Characters held back for dosing patterns that may span a chunk boundary
+MEDICATION_PATTERN_WINDOW = 32
+
+
+class IncrementalSafetyFilter:
+    """
+    Chunk-by-chunk version of SafetyValidator for streamed explanations
+
+    The last `window` characters are held back after each chunk, so any
+    forbidden phrase that starts in text already released is guaranteed to
+    have been fully visible when it was scanned. Text is released only after
+    it has passed the validator; a violation raises UnsafeContentError and
+    the caller must abort the stream.
+    """
+
+    def __init__(self, validator: SafetyValidator):
+        self.validator = validator
+        self.window = max(validator.max_phrase_length, MEDICATION_PATTERN_WINDOW)
+        self._held = ""
+
+    def feed(self, chunk: str) -> str:
+        """Scan a new chunk; returns the text that is now safe to emit"""
+        text = self._held + chunk
+        violation = self.validator.find_violation(text)
+        if violation is not None:
+            self._held = ""
+            raise UnsafeContentError(f"Streamed explanation contained forbidden content: {violation!r}")
+        if len(text) <= self.window:
+            self._held = text
+            return ""
+        self._held = text[-self.window:]
+        return text[:-self.window]
+
+    def finish(self) -> str:
+        """Release the held-back tail at the end of the stream"""
+        text, self._held = self._held, ""
+        return text
+
+
+DEFAULT_VALIDATOR = SafetyValidator(
+    FORBIDDEN_DIAGNOSIS_PHRASES + FORBIDDEN_MEDICATION_PHRASES,
+    MEDICATION_PATTERNS,
+)
@@ -0,0 +1,176 @@
+"""
+Probabilistic Cause Scoring
+Naive-Bayes log-odds scorer over the knowledge base; the likelihood
+tables are dense NumPy arrays indexed by the request enums, so scoring a
+request is one array gather, a sum and a top-k partial sort
+"""
+
+import heapq
+import math
+from typing import Dict, List, Sequence, Tuple, Type
+
+import numpy as np
+
+from knowledge_base import KNOWLEDGE_BASE, IntensityBucket, KnowledgeBase, intensity_bucket
+from models import (
+    AssociatedSymptom,
+    Onset,
+    PainType,
+    PossibleCause,
+    SymptomDuration,
+    Trigger,
+)
+from records import SymptomRecord
+
+# Most causes returned for one request
+MAX_CAUSES = 5
+
+# Probabilities are rounded so equal evidence always yields equal output
+PROBABILITY_DECIMALS = 4
+
+
+def _enum_index(enum: Type) -> Dict:
+    return {member: index for index, member in enumerate(enum)}
+
+
+PAIN_TYPE_INDEX = _enum_index(PainType)
+ONSET_INDEX = _enum_index(Onset)
+DURATION_INDEX = _enum_index(SymptomDuration)
+INTENSITY_INDEX = _enum_index(IntensityBucket)
+TRIGGER_INDEX = _enum_index(Trigger)
+SYMPTOM_INDEX = _enum_index(AssociatedSymptom)
+
+PRIOR_ROW = 0
+
+# Evidence fields in table row order
+FINDING_INDEXES = (
+    ("painType", PAIN_TYPE_INDEX),
+    ("onset", ONSET_INDEX),
+    ("duration", DURATION_INDEX),
+    ("intensity", INTENSITY_INDEX),
+    ("triggers", TRIGGER_INDEX),
+    ("associatedSymptoms", SYMPTOM_INDEX),
+)
+
+
+def _log_odds(probability: float) -> float:
+    probability = min(max(probability, 1e-6), 1 - 1e-6)
+    return float(np.log(probability / (1 - probability)))
+
+
+class ProbabilisticScorer:
+    """
+    Scores knowledge base candidates from the evidence in a request
+
+    Each condition's `probability` is its prior; every reported finding adds
+    the log of its likelihood ratio to the prior log-odds and the posterior
+    is the logistic of the sum. Findings that are not reported, or that a
+    condition does not list, contribute nothing, so a condition without
+    evidence keeps its prior.
+
+    All terms live in one dense [finding, condition] table: row 0 holds the
+    prior log-odds, followed by a block of rows per enum. A request maps to
+    a list of rows, and scoring gathers those rows, keeps the candidate
+    columns and sums them. Two take() calls are used rather than a 2-D
+    fancy index (np.ix_), which is much slower in NumPy on arrays this small.
+    """
+
+    def __init__(self, kb: KnowledgeBase, max_causes: int = MAX_CAUSES):
+        self.kb = kb
+        self.max_causes = max_causes
+        conditions = kb.conditions
+
+        # Row offset of each enum's block in the table; row 0 is the prior
+        self.offsets: Dict[str, int] = {}
+        height = 1
+        for field, index in FINDING_INDEXES:
+            self.offsets[field] = height
+            height += len(index)
+
+        self.table = np.zeros((height, len(conditions)), dtype=np.float64)
+        for column, condition in enumerate(conditions):
+            self.table[PRIOR_ROW, column] = _log_odds(condition.probability)
+            evidence = condition.evidence
+            for field, index in FINDING_INDEXES:
+                offset = self.offsets[field]
+                for finding, ratio in getattr(evidence, field).items():
+                    self.table[offset + index[finding], column] = np.log(ratio)
+
+        # Causes are rebuilt per request with the scored probability; the
+        # static fields are looked up once here
+        self._cause_fields = [
+            (c.name, c.description, list(c.matchingSymptoms)) for c in conditions
+        ]
+
+    def rows(self, record: SymptomRecord) -> List[int]:
+        """Table rows for a record: the prior plus each reported finding"""
+        offsets = self.offsets
+        rows = [PRIOR_ROW]
+        if record.pain_type:
+            rows.append(offsets["painType"] + PAIN_TYPE_INDEX[record.pain_type])
+        if record.onset:
+            rows.append(offsets["onset"] + ONSET_INDEX[record.onset])
+        if record.duration:
+            rows.append(offsets["duration"] + DURATION_INDEX[record.duration])
+        bucket = intensity_bucket(record.intensity)
+        if bucket:
+            rows.append(offsets["intensity"] + INTENSITY_INDEX[bucket])
+        # Triggers and symptoms are bitsets in enum order, so a set bit's
+        # position is the finding's index; a finding reported twice counts once
+        for offset, bits in ((offsets["triggers"], record.triggers),
+                             (offsets["associatedSymptoms"], record.symptoms)):
+            while bits:
+                low_bit = bits & -bits
+                rows.append(offset + low_bit.bit_length() - 1)
+                bits ^= low_bit
+        return rows
+
+    def log_odds(self, record: SymptomRecord, candidates: Sequence[int]) -> np.ndarray:
+        """Posterior log-odds of each candidate given the record's findings, in the given order"""
+        terms = self.table.take(self.rows(record), axis=0).take(candidates, axis=1)
+        return np.add.reduce(terms, axis=0)
+
+    def probabilities(self, record: SymptomRecord, candidates: Sequence[int]) -> List[float]:
+        """Rounded posterior probability of each candidate, in the given order"""
+        return [
+            round(1.0 / (1.0 + math.exp(-score)), PROBABILITY_DECIMALS)
+            for score in self.log_odds(record, candidates).tolist()
+        ]
+
+    def scores(self, record: SymptomRecord) -> List[Tuple[int, float]]:
+        """
+        (condition index, probability) of the top candidates, most likely
+        first; ties keep knowledge base order
+        """
+        candidates = self.kb.candidate_indices(record)
+        if not candidates:
+            return []
+
+        probabilities = self.probabilities(record, candidates)
+        # Partial sort: only the best max_causes are ordered. candidate_indices
+        # is in knowledge base order, so the position breaks ties the same
+        # way a stable sort would
+        top = heapq.nsmallest(
+            self.max_causes,
+            range(len(candidates)),
+            key=lambda position: (-probabilities[position], position),
+        )
+        return [(candidates[position], probabilities[position]) for position in top]
+
+    def cause(self, index: int, probability: float) -> PossibleCause:
+        """The condition at a knowledge base index as a PossibleCause"""
+        # Every field was validated when the knowledge base was loaded
+        name, description, matching = self._cause_fields[index]
+        return PossibleCause.model_construct(
+            name=name,
+            description=description,
+            probability=probability,
+            matchingSymptoms=list(matching),
+        )
+
+    def rank(self, record: SymptomRecord) -> List[PossibleCause]:
+        """Top candidates by posterior probability as PossibleCauses"""
+        return [self.cause(index, probability) for index, probability in self.scores(record)]
+
+
+SCORER = ProbabilisticScorer(KNOWLEDGE_BASE)
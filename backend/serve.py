@@ -0,0 +1,162 @@
+"""
+Multi-process Server
+Pre-forks N uvicorn workers that share one listening socket
+
+The application, compiled rule tables and knowledge base are loaded once in
+the parent before forking, and the dense NumPy tables are moved into a
+read-only memory-mapped file (see shared_tables.py), so workers share those
+pages instead of rebuilding them. Workers publish metrics snapshots to a
+shared directory that /metrics merges, and enrichment jobs go to a shared
+file store so any worker can answer a poll; a long-poll for a job another
+worker is running re-reads the store until it finishes. The analysis cache
+stays per worker: only its hit and miss counters are merged.
+
+Usage:
+    python serve.py --workers 4 [--host 0.0.0.0] [--port 8000] [--state-dir DIR]
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict
+
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1)))
+
+# Respawning faster than this means workers are crashing on startup
+MIN_WORKER_LIFETIME_SECONDS = 1.0
+
+
+def configure_environment(state_dir: str) -> None:
+    """
+    Point the cross-worker state at state_dir
+
+    Must run before the application is imported: these settings are read at
+    import time. Values already set in the environment win.
+    """
+    metrics_dir = os.path.join(state_dir, "metrics")
+    os.makedirs(metrics_dir, exist_ok=True)
+    os.environ.setdefault("METRICS_MULTIPROC_DIR", metrics_dir)
+    os.environ.setdefault("ENRICHMENT_JOB_DIR", os.path.join(state_dir, "jobs"))
+
+    # Counters from a previous run would otherwise be merged into this one
+    for filename in os.listdir(os.environ["METRICS_MULTIPROC_DIR"]):
+        if filename.endswith(".json"):
+            os.remove(os.path.join(os.environ["METRICS_MULTIPROC_DIR"], filename))
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload(state_dir: str):
+    """Import the app and share its tables; everything here is inherited by the workers"""
+    import main
+    from shared_tables import share_tables
+
+    share_tables(os.path.join(state_dir, "tables.bin"))
+    # Objects that exist now are never freed by the workers; moving them
+    # out of the collector's generations keeps GC passes from touching
+    # (and so copying) the inherited pages
+    gc.collect()
+    gc.freeze()
+    return main.app
+
+
+def run_worker(app, sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+
+    # Let uvicorn install its own graceful-shutdown handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+class Supervisor:
+    """Forks the workers, replaces any that exit and stops them all on SIGTERM/SIGINT"""
+
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app, self.sock, self.log_level)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        print(f"[serve] worker {pid} started", file=sys.stderr)
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"[serve] worker {pid} exited with status {os.waitstatus_to_exitcode(status)}",
+                  file=sys.stderr)
+            if time.monotonic() - started < MIN_WORKER_LIFETIME_SECONDS:
+                time.sleep(MIN_WORKER_LIFETIME_SECONDS)
+            self.spawn()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--state-dir", help="directory for shared tables, metrics and jobs (default: a new temp dir)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    state_dir = args.state_dir or tempfile.mkdtemp(prefix="symptom-checker-")
+    os.makedirs(state_dir, exist_ok=True)
+    configure_environment(state_dir)
+
+    sock = bind_socket(args.host, args.port)
+    app = preload(state_dir)
+    print(f"[serve] {args.workers} workers on {args.host}:{args.port}, state in {state_dir}",
+          file=sys.stderr)
+    Supervisor(app, sock, args.workers, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Symptom Sessions
+Multi-step symptom intake: partial updates accumulate in a bounded
+in-memory session store and are triaged as they arrive
+
+The app collects a report over several screens. Each screen sends a
+SessionUpdate and gets back the triage so far, so an emergency (chest pain
+with shortness of breath, say) is reported as soon as its last symptom is
+added rather than at the final submit.
+
+An update re-evaluates only what it can change. Which red flag rules,
+urgency levels and cause rankings read each field (and each symptom and
+trigger) is derived once per rule set and from the knowledge base;
+the session keeps the state of every rule and re-checks just the rules
+that depend on the fields the update changed. Until the body region is
+known only the rules that apply to every region can fire.
+
+A session is evaluated under one rule set at a time. When a new rule set
+has been activated, the session's next request re-checks every rule and
+the urgency under it before applying anything.
+
+Sessions live per process, like the analysis cache; under serve.py a
+client must keep talking to the same worker. Idle sessions expire after
+SESSION_TTL seconds, and the least recently used are evicted beyond
+SESSION_MAX_ENTRIES.
+"""
+
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from analysis import generate_ai_explanation, generate_possible_causes
+from knowledge_base import KNOWLEDGE_BASE
+from metrics import SESSION_EVALUATIONS_TOTAL
+from models import (
+    AnalysisResult,
+    AssociatedSymptom,
+    PossibleCause,
+    SessionState,
+    SessionUpdate,
+    SymptomDataRequest,
+    SymptomDraft,
+    Trigger,
+    UrgencyLevel,
+)
+from rules import (
+    ALL_INTENSITIES_MASK,
+    ALL_REGIONS_MASK,
+    REGION_BITS,
+    RULE_SET_HISTORY,
+    RULE_SETS,
+    SYMPTOM_BITS,
+    CompiledRule,
+    RuleSet,
+    duration_bit,
+    intensity_bit,
+    symptom_mask,
+)
+
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+# Seconds a session is kept after its last update
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+
+SCALAR_FIELDS = (
+    "bodyRegion", "painType", "intensity", "duration", "durationValue",
+    "onset", "ageRange", "biologicalSex", "timestamp",
+)
+
+
+# What each part of the pipeline reads
+
+class RuleDependencies(NamedTuple):
+    """Which red flag rules (by position) and urgency inputs of a rule set read each field"""
+    rules_by_region: FrozenSet[int]
+    rules_by_intensity: FrozenSet[int]
+    rules_by_symptom: Dict[AssociatedSymptom, FrozenSet[int]]
+    urgency_fields: FrozenSet[str]
+    urgency_symptoms: FrozenSet[AssociatedSymptom]
+
+
+@functools.lru_cache(maxsize=RULE_SET_HISTORY + 2)
+def rule_dependencies(rules: RuleSet) -> RuleDependencies:
+    """Derived once per rule set, when it is activated"""
+    red_flags = rules.red_flags.rules
+    urgency = rules.urgency.rules
+    return RuleDependencies(
+        rules_by_region=frozenset(i for i, rule in enumerate(red_flags) if rule.region_mask != ALL_REGIONS_MASK),
+        rules_by_intensity=frozenset(
+            i for i, rule in enumerate(red_flags) if rule.intensity_mask != ALL_INTENSITIES_MASK
+        ),
+        rules_by_symptom={
+            symptom: frozenset(
+                i for i, rule in enumerate(red_flags) if (rule.all_mask | rule.any_mask) & SYMPTOM_BITS[symptom]
+            )
+            for symptom in AssociatedSymptom
+        },
+        urgency_fields=frozenset(
+            field for field, used in (
+                ("intensity", any(rule.intensity_mask for rule in urgency)),
+                ("duration", any(rule.duration_mask for rule in urgency)),
+            ) if used
+        ),
+        urgency_symptoms=frozenset(
+            symptom for symptom in AssociatedSymptom
+            if any(rule.symptom_mask & SYMPTOM_BITS[symptom] for rule in urgency)
+        ),
+    )
+
+
+RULE_SETS.on_activate(rule_dependencies)
+
+_conditions = KNOWLEDGE_BASE.conditions
+CAUSE_FIELDS = frozenset(
+    field for field, used in (
+        ("bodyRegion", True),
+        ("painType", any(c.painTypes or c.evidence.painType for c in _conditions)),
+        ("intensity", any(c.minIntensity is not None or c.evidence.intensity for c in _conditions)),
+        ("duration", any(c.evidence.duration for c in _conditions)),
+        ("onset", any(c.evidence.onset for c in _conditions)),
+    ) if used
+)
+CAUSE_SYMPTOMS = frozenset(
+    symptom for symptom in AssociatedSymptom
+    if any(symptom in c.requiredSymptoms or symptom in c.evidence.associatedSymptoms for c in _conditions)
+)
+CAUSE_TRIGGERS = frozenset(
+    trigger for trigger in Trigger if any(trigger in c.evidence.triggers for c in _conditions)
+)
+
+
+def _apply_delta(current: Dict[Any, None], remove: List[Any], add: List[Any]) -> Dict[Any, None]:
+    removed = set(remove)
+    result = {item: None for item in current if item not in removed}
+    for item in add:
+        result.setdefault(item, None)
+    return result
+
+
+def _rule_matches(rule: CompiledRule, region: Optional[str], symptoms: int, intensity: int) -> bool:
+    """RedFlagEngine.match for one rule; with no region yet, only unrestricted rules can match"""
+    if region is None:
+        region_matches = rule.region_mask == ALL_REGIONS_MASK
+    else:
+        region_matches = bool(rule.region_mask & REGION_BITS[region])
+    return (region_matches and
+            symptoms & rule.all_mask == rule.all_mask and
+            (not rule.any_mask or bool(symptoms & rule.any_mask)) and
+            bool(rule.intensity_mask & intensity))
+
+
+class Session:
+    """One intake session: the fields reported so far and their incremental triage"""
+
+    def __init__(self, session_id: str, rules: RuleSet):
+        self.session_id = session_id
+        self.rules = rules
+        self.dependencies = rule_dependencies(rules)
+        self.revision = 0
+        self.fields: Dict[str, Any] = dict.fromkeys(SCALAR_FIELDS)
+        # Dicts rather than sets so the draft lists keep the order of entry
+        self.symptoms: Dict[AssociatedSymptom, None] = {}
+        self.triggers: Dict[Trigger, None] = {}
+        self.symptom_bits = 0
+        self.rule_matches = [_rule_matches(rule, None, 0, intensity_bit(None)) for rule in rules.red_flags.rules]
+        self.urgency = self._urgency()
+        # Ranked causes, computed when first needed after they go stale
+        self.causes: Optional[List[PossibleCause]] = None
+
+    def _urgency(self) -> UrgencyLevel:
+        return self.rules.urgency.match(
+            self.symptom_bits, intensity_bit(self.fields["intensity"]), duration_bit(self.fields["duration"])
+        )
+
+    def rebase(self, rules: RuleSet) -> None:
+        """Move the session to another rule set, re-evaluating every rule and the urgency"""
+        if rules is self.rules:
+            return
+        self.rules = rules
+        self.dependencies = rule_dependencies(rules)
+        region = self.fields["bodyRegion"]
+        intensity = intensity_bit(self.fields["intensity"])
+        self.rule_matches = [
+            _rule_matches(rule, region, self.symptom_bits, intensity) for rule in rules.red_flags.rules
+        ]
+        self.urgency = self._urgency()
+        SESSION_EVALUATIONS_TOTAL.inc("red_flag_rule", amount=len(self.rule_matches))
+        SESSION_EVALUATIONS_TOTAL.inc("urgency")
+
+    def _changes(self, update: SessionUpdate) -> Tuple[
+            Dict[str, Any], Dict[AssociatedSymptom, None], Dict[Trigger, None]]:
+        """Changed fields and the resulting symptoms and triggers, without applying the update"""
+        fields = {
+            field: getattr(update, field)
+            for field in update.model_fields_set.intersection(SCALAR_FIELDS)
+            if getattr(update, field) != self.fields[field]
+        }
+        return (
+            fields,
+            _apply_delta(self.symptoms, update.removeSymptoms, update.addSymptoms),
+            _apply_delta(self.triggers, update.removeTriggers, update.addTriggers),
+        )
+
+    def would_be_emergency(self, update: SessionUpdate) -> bool:
+        """True if the session would have a red flag after the update"""
+        fields, symptoms, _ = self._changes(update)
+        region = fields.get("bodyRegion", self.fields["bodyRegion"])
+        intensity = intensity_bit(fields.get("intensity", self.fields["intensity"]))
+        bits = symptom_mask(symptoms)
+        return any(_rule_matches(rule, region, bits, intensity) for rule in self.rules.red_flags.rules)
+
+    def apply(self, update: SessionUpdate) -> None:
+        """Apply an update and re-evaluate the parts of the pipeline it affects"""
+        fields, symptoms, triggers = self._changes(update)
+        changed_symptoms = set(self.symptoms).symmetric_difference(symptoms)
+        changed_triggers = set(self.triggers).symmetric_difference(triggers)
+        self.fields.update(fields)
+        self.symptoms = symptoms
+        self.triggers = triggers
+        for symptom in changed_symptoms:
+            self.symptom_bits ^= SYMPTOM_BITS[symptom]
+        self.revision += 1
+
+        dependencies = self.dependencies
+        stale_rules = set()
+        if "bodyRegion" in fields:
+            stale_rules |= dependencies.rules_by_region
+        if "intensity" in fields:
+            stale_rules |= dependencies.rules_by_intensity
+        for symptom in changed_symptoms:
+            stale_rules |= dependencies.rules_by_symptom[symptom]
+        if stale_rules:
+            region = self.fields["bodyRegion"]
+            intensity = intensity_bit(self.fields["intensity"])
+            rules = self.rules.red_flags.rules
+            for i in stale_rules:
+                self.rule_matches[i] = _rule_matches(rules[i], region, self.symptom_bits, intensity)
+            SESSION_EVALUATIONS_TOTAL.inc("red_flag_rule", amount=len(stale_rules))
+
+        if (dependencies.urgency_fields.intersection(fields)
+                or dependencies.urgency_symptoms.intersection(changed_symptoms)):
+            self.urgency = self._urgency()
+            SESSION_EVALUATIONS_TOTAL.inc("urgency")
+
+        if (CAUSE_FIELDS.intersection(fields) or CAUSE_SYMPTOMS.intersection(changed_symptoms)
+                or CAUSE_TRIGGERS.intersection(changed_triggers)):
+            self.causes = None
+
+    def red_flag_result(self) -> Optional[AnalysisResult]:
+        """The first matching rule's result, as check_red_flags would return it"""
+        for rule, matched in zip(self.rules.red_flags.rules, self.rule_matches):
+            if matched:
+                return rule.result
+        return None
+
+    def draft(self) -> SymptomDraft:
+        return SymptomDraft.model_construct(
+            **self.fields, triggers=list(self.triggers), associatedSymptoms=list(self.symptoms)
+        )
+
+    def _request(self) -> SymptomDataRequest:
+        """The draft as a request for the pipeline functions; bodyRegion must be set"""
+        return SymptomDataRequest.model_construct(
+            **self.fields, triggers=list(self.triggers), associatedSymptoms=list(self.symptoms)
+        )
+
+    def to_request(self, default_timestamp: str) -> SymptomDataRequest:
+        """
+        The complete report, validated
+
+        Raises:
+            pydantic.ValidationError: if a required field (bodyRegion) is missing
+        """
+        data = {**self.fields, "triggers": list(self.triggers), "associatedSymptoms": list(self.symptoms)}
+        data["timestamp"] = data["timestamp"] or default_timestamp
+        return SymptomDataRequest.model_validate(data)
+
+    def result(self) -> Optional[AnalysisResult]:
+        """What analysis.analyze returns for the draft, or None before a region is known"""
+        red_flag = self.red_flag_result()
+        if red_flag is not None:
+            return red_flag
+        if self.fields["bodyRegion"] is None:
+            return None
+        data = self._request()
+        if self.causes is None:
+            self.causes = generate_possible_causes(data)
+            SESSION_EVALUATIONS_TOTAL.inc("causes")
+        return AnalysisResult(
+            urgencyLevel=self.urgency,
+            possibleCauses=self.causes,
+            guidance=self.rules.guidance[self.urgency],
+            redFlags=[],
+            aiExplanation=generate_ai_explanation(data, self.causes),
+            isEmergency=self.urgency == UrgencyLevel.emergency,
+            ruleSetVersion=self.rules.version,
+        )
+
+    def state(self) -> SessionState:
+        result = self.result()
+        red_flag = result is not None and bool(result.redFlags)
+        return SessionState(
+            sessionId=self.session_id,
+            revision=self.revision,
+            symptoms=self.draft(),
+            urgencyLevel=result.urgencyLevel if red_flag else self.urgency,
+            isEmergency=result.isEmergency if red_flag else self.urgency == UrgencyLevel.emergency,
+            redFlags=result.redFlags if red_flag else [],
+            result=result,
+            ruleSetVersion=self.rules.version,
+        )
+
+
+class SessionStore:
+    """
+    Thread-safe LRU store of sessions with a sliding TTL
+
+    Entries are kept in order of last use, which is also the order they
+    expire in, so expired sessions are swept from the front.
+    """
+
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, ttl_seconds: float = SESSION_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Session]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.updated = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _sweep(self, now: float) -> None:
+        while self._entries:
+            expires_at, _ = next(iter(self._entries.values()))
+            if expires_at > now:
+                break
+            self._entries.popitem(last=False)
+            self.expired += 1
+
+    def _touch(self, session_id: str) -> Optional[Session]:
+        now = self._clock()
+        self._sweep(now)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        session = entry[1]
+        self._entries[session_id] = (now + self.ttl_seconds, session)
+        self._entries.move_to_end(session_id)
+        session.rebase(RULE_SETS.current)
+        return session
+
+    def create(self, update: Optional[SessionUpdate] = None) -> Session:
+        session = Session(uuid.uuid4().hex, RULE_SETS.current)
+        if update is not None:
+            session.apply(update)
+        with self._lock:
+            now = self._clock()
+            self._sweep(now)
+            self._entries[session.session_id] = (now + self.ttl_seconds, session)
+            self.created += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            return self._touch(session_id)
+
+    def update(self, session_id: str, update: SessionUpdate) -> Optional[Session]:
+        with self._lock:
+            session = self._touch(session_id)
+            if session is not None:
+                session.apply(update)
+                self.updated += 1
+            return session
+
+    def delete(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            return entry[1] if entry else None
+
+    def would_be_emergency(self, session_id: Optional[str], update: SessionUpdate) -> bool:
+        """True if the update would leave the session (or a new one) with a red flag"""
+        with self._lock:
+            session = self._touch(session_id) if session_id else Session("", RULE_SETS.current)
+            return session is not None and session.would_be_emergency(update)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "created": self.created,
+                "updated": self.updated,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+SESSIONS = SessionStore()
@@ -0,0 +1,100 @@
+"""
+Shared Read-only Tables
+Dense NumPy lookup tables written once to a file and memory-mapped by
+every worker process
+
+File layout: an 8-byte little-endian header length, a JSON header mapping
+table names to dtype, shape and offset, then the raw arrays, each aligned
+to ALIGNMENT bytes.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+ALIGNMENT = 64
+_LENGTH = struct.Struct("<Q")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_tables(path: str, tables: Dict[str, np.ndarray]) -> None:
+    """Write tables to path atomically"""
+    arrays = {name: np.ascontiguousarray(table) for name, table in tables.items()}
+
+    # Offsets are relative to the end of the header, so the header can be
+    # sized before they are known
+    index: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        index[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    header = json.dumps(index).encode("utf-8")
+    data_start = _align(_LENGTH.size + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b"\0" * (data_start + index[name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def map_tables(path: str) -> Dict[str, np.ndarray]:
+    """
+    Read-only array views over a memory-mapped table file
+
+    Every process mapping the same file shares the same physical pages;
+    writing to a returned array raises ValueError.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    (header_length,) = _LENGTH.unpack_from(mapped, 0)
+    index = json.loads(mapped[_LENGTH.size:_LENGTH.size + header_length].decode("utf-8"))
+    data_start = _align(_LENGTH.size + header_length)
+
+    tables = {}
+    for name, entry in index.items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        count = int(np.prod(shape)) if shape else 1
+        tables[name] = np.frombuffer(
+            mapped, dtype=dtype, count=count, offset=data_start + entry["offset"]
+        ).reshape(shape)
+    return tables
+
+
+def shared_table_owners() -> List[Tuple[Any, str, str]]:
+    """
+    (owner, attribute, table name) for every table that is worth sharing
+
+    Owners look their tables up through the attribute on every call, so
+    rebinding the attribute to a mapped view switches them over.
+    """
+    import batch
+    from scoring import SCORER
+
+    return [
+        (SCORER, "table", "scoring.table"),
+        (batch, "REGION_BIT_TABLE", "batch.region_bits"),
+        (batch, "DURATION_BIT_TABLE", "batch.duration_bits"),
+    ]
+
+
+def share_tables(path: str) -> Dict[str, np.ndarray]:
+    """Write the current tables to path and rebind their owners to mapped views"""
+    owners = shared_table_owners()
+    write_tables(path, {name: getattr(owner, attribute) for owner, attribute, name in owners})
+    tables = map_tables(path)
+    for owner, attribute, name in owners:
+        setattr(owner, attribute, tables[name])
+    return tables
@@ -0,0 +1,61 @@
+"""
+Single-flight Call Coalescing
+Concurrent callers asking for the same key share one in-flight call
+instead of each starting their own
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    At most one running call per key and event loop
+
+    The first caller for a key (the leader) starts the call as its own task;
+    callers arriving while it runs (followers) await that task. The task is
+    shielded, so a caller that is cancelled (e.g. its client disconnected)
+    does not cancel the call for the others. Once the call finishes the key
+    is forgotten: the next caller starts a new one.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Result of call(), shared with concurrent callers of the same key
+
+        Returns (result, shared); shared is True when this caller joined a
+        call another caller started. Exceptions from the call are raised in
+        every caller.
+        """
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        shared = task is not None and task.get_loop() is loop and not task.done()
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            task = loop.create_task(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.followers
+        return {
+            "inFlight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalescedRate": self.followers / calls if calls else 0.0,
+        }
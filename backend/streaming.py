@@ -0,0 +1,59 @@
+"""
+Server-Sent Events for Streamed Analysis
+The rule-based result is sent first, then safety-filtered AI explanation chunks
+"""
+
+import json
+from typing import Any, AsyncIterator, Optional
+
+from ai_service import STREAM_DISCLAIMER, AIService
+from models import AnalysisResult, SymptomDataRequest
+from providers import ProviderError
+from safety import UnsafeContentError
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Stop nginx from buffering the stream
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def analysis_events(data: SymptomDataRequest, result: AnalysisResult,
+                          ai_service: Optional[AIService]) -> AsyncIterator[str]:
+    """
+    Event sequence for /api/analyze/stream
+
+        triage       the full rule-based AnalysisResult
+        explanation  {"text": ...} chunks of AI explanation (non-emergency only)
+        abort        {"reason": ...} when a chunk fails validation, the provider
+                     fails, or no ai_service is given (AI work shed under load)
+        disclaimer   {"text": ...} after a complete explanation
+        done         end of stream
+    """
+    yield sse_event("triage", result.model_dump(mode="json"))
+
+    # Emergency guidance is fixed text and is never sent to the AI provider
+    if result.isEmergency:
+        yield sse_event("done", {})
+        return
+
+    if ai_service is None:
+        yield sse_event("abort", {"reason": "AI explanation unavailable: server busy"})
+        return
+
+    try:
+        async for chunk in ai_service.stream_explanation(data.model_dump(mode="json")):
+            yield sse_event("explanation", {"text": chunk})
+    except UnsafeContentError:
+        yield sse_event("abort", {"reason": "AI explanation failed safety validation"})
+        return
+    except ProviderError as e:
+        yield sse_event("abort", {"reason": f"AI explanation unavailable: {str(e)}"})
+        return
+
+    yield sse_event("disclaimer", {"text": STREAM_DISCLAIMER})
+    yield sse_event("done", {})
@@ -0,0 +1,119 @@
+"""
+Local Stub AI Provider
+Minimal OpenAI/Gemini-compatible server for development and load testing
+
+Usage:
+    STUB_LATENCY_MS=200 STUB_FAILURE_RATE=0.05 uvicorn stub_provider:app --port 9000
+    OPENAI_BASE_URL=http://127.0.0.1:9000 OPENAI_API_KEY=stub python main.py
+
+FakeProvider is an in-process provider client with injected latency and
+failures and no HTTP at all, for exercising the provider router.
+"""
+
+import asyncio
+import json
+import os
+import random
+from typing import AsyncIterator, Callable, Optional, Union
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from metrics import PROVIDER_REQUESTS_TOTAL
+from providers import AsyncProviderClient, ProviderConfig, ProviderError
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+STUB_FAILURE_RATE = float(os.getenv("STUB_FAILURE_RATE", "0"))
+# Delay between streamed chunks
+STUB_CHUNK_DELAY_MS = float(os.getenv("STUB_CHUNK_DELAY_MS", "0"))
+
+STUB_EXPLANATION = (
+    "Based on the symptoms described, several common conditions could possibly explain "
+    "this discomfort. This is educational information only and not a diagnosis. "
+    "Please consult a healthcare professional for proper evaluation."
+)
+
+app = FastAPI(title="Stub AI Provider")
+
+
+async def _simulate() -> None:
+    if STUB_LATENCY_MS:
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    if random.random() < STUB_FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Simulated provider failure")
+
+
+async def _sse(events):
+    for event in events:
+        if STUB_CHUNK_DELAY_MS:
+            await asyncio.sleep(STUB_CHUNK_DELAY_MS / 1000)
+        data = event if isinstance(event, str) else json.dumps(event)
+        yield f"data: {data}\n\n"
+
+
+def _words(text: str):
+    words = text.split(" ")
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await _simulate()
+    if body.get("stream"):
+        events = [{"choices": [{"delta": {"content": word}}]} for word in _words(STUB_EXPLANATION)]
+        return StreamingResponse(_sse(events + ["[DONE]"]), media_type="text/event-stream")
+    return {"choices": [{"message": {"role": "assistant", "content": STUB_EXPLANATION}}]}
+
+
+@app.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str, request: Request):
+    await request.json()
+    await _simulate()
+    return {"candidates": [{"content": {"parts": [{"text": STUB_EXPLANATION}]}}]}
+
+
+@app.post("/v1beta/models/{model}:streamGenerateContent")
+async def stream_generate_content(model: str, request: Request):
+    await request.json()
+    await _simulate()
+    events = [{"candidates": [{"content": {"parts": [{"text": word}]}}]} for word in _words(STUB_EXPLANATION)]
+    return StreamingResponse(_sse(events), media_type="text/event-stream")
+
+
+class FakeProvider(AsyncProviderClient):
+    """
+    Provider client that sleeps instead of calling out
+
+    latency is seconds per call, or a function returning them (e.g. a
+    random draw for a long-tailed provider). failure_rate is the share of
+    calls that raise ProviderError after their latency.
+    """
+
+    def __init__(self, name: str, latency: Union[float, Callable[[], float]] = 0.0,
+                 failure_rate: float = 0.0, text: str = STUB_EXPLANATION,
+                 rng: Optional[random.Random] = None):
+        super().__init__(ProviderConfig(name, "http://fake", api_key="fake", model="fake"))
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.text = text
+        self.rng = rng or random.Random()
+        self.calls = 0
+
+    async def _simulate(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.latency() if callable(self.latency) else self.latency)
+        if self.rng.random() < self.failure_rate:
+            PROVIDER_REQUESTS_TOTAL.inc(self.config.name, "error")
+            raise ProviderError(f"{self.config.name} simulated failure")
+
+    async def _complete(self, system_prompt: str, prompt: str) -> str:
+        await self._simulate()
+        PROVIDER_REQUESTS_TOTAL.inc(self.config.name, "success")
+        return self.text
+
+    async def stream(self, system_prompt: str, prompt: str) -> AsyncIterator[str]:
+        await self._simulate()
+        for word in _words(self.text):
+            yield word
+        PROVIDER_REQUESTS_TOTAL.inc(self.config.name, "success")
@@ -0,0 +1,43 @@
+"""Rate limit client identity and bounded body inspection"""
+
+import asyncio
+
+from admission import _read_body, _replay, client_id
+
+
+def _scope(key=None):
+    headers = [(b"x-api-key", key.encode())] if key else []
+    return {"headers": headers, "client": ("203.0.113.7", 5000)}
+
+
+def test_unknown_api_keys_share_the_peer_bucket():
+    keys = frozenset({"partner"})
+    assert client_id(_scope("partner"), keys) == "key:partner"
+    assert client_id(_scope("rotated-1"), keys) == "ip:203.0.113.7"
+    assert client_id(_scope("rotated-2"), keys) == "ip:203.0.113.7"
+    assert client_id(_scope("partner"), frozenset()) == "ip:203.0.113.7"
+
+
+def test_read_body_stops_at_the_limit():
+    messages = [{"type": "http.request", "body": b"x" * 100, "more_body": True} for _ in range(50)]
+    messages.append({"type": "http.request", "body": b"end", "more_body": False})
+    stream = iter(messages)
+
+    async def receive():
+        return next(stream)
+
+    async def read_all(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message["body"])
+            if not message["more_body"]:
+                return b"".join(chunks)
+
+    async def run():
+        body, complete, disconnect = await _read_body(receive, limit=250)
+        assert (len(body), complete, disconnect) == (300, False, None)
+        # The application still sees the whole body
+        return await read_all(_replay(body, complete, disconnect, receive))
+
+    assert asyncio.run(run()) == b"x" * 5000 + b"end"
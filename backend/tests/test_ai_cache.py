@@ -0,0 +1,33 @@
+"""SQLite AI response cache eviction"""
+
+from ai_cache import SQLiteResponseCache
+
+
+def test_limits_are_enforced_every_few_puts(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.db"), max_entries=10, evict_every=4)
+    try:
+        for i in range(13):
+            cache.put(f"key{i}", "openai", {"explanation": str(i)})
+        # Evicted at the 12th put; the 13th waits for the next pass
+        assert cache.stats()["entries"] == 11
+        for i in range(13, 16):
+            cache.put(f"key{i}", "openai", {"explanation": str(i)})
+        assert cache.stats()["entries"] == 10
+        assert cache.get("key15") == {"explanation": "15"}
+        assert cache.get("key5") is None
+    finally:
+        cache.close()
+
+
+def test_hits_refresh_last_access_at_most_every_touch_interval(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.db"), touch_seconds=3600)
+    try:
+        cache.put("key", "openai", {"explanation": "x"})
+        stored = cache._conn.execute("SELECT last_access FROM responses").fetchone()[0]
+        assert cache.get("key") == {"explanation": "x"}
+        assert cache._conn.execute("SELECT last_access FROM responses").fetchone()[0] == stored
+        cache.touch_seconds = 0
+        cache.get("key")
+        assert cache._conn.execute("SELECT last_access FROM responses").fetchone()[0] > stored
+    finally:
+        cache.close()
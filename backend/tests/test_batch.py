@@ -0,0 +1,17 @@
+"""Batch analysis against the single-request pipeline"""
+
+from analysis import analyze
+from batch import analyze_batch
+from benchmarks.workload import generate_requests
+
+# Off the 0-10 scale, or past what an int64 matrix cell holds
+EDGE_INTENSITIES = (None, -3, 0, 10, 11, 999, 2 ** 63, 10 ** 30)
+
+
+def test_batch_matches_single_requests():
+    cases = generate_requests(2000)
+    # The same profiles again with every edge intensity, so rows off the
+    # scale share a profile with rows on it
+    cases += [case.model_copy(update={"intensity": intensity})
+              for case in cases[:50] for intensity in EDGE_INTENSITIES]
+    assert analyze_batch(cases) == [analyze(case) for case in cases]
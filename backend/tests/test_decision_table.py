@@ -0,0 +1,66 @@
+"""Compiled decision table against the live pipeline"""
+
+import numpy as np
+import pytest
+
+from decision_table import (
+    DecisionTable,
+    TableTooLarge,
+    _index_dtype,
+    compile_decision_table,
+    compile_tables,
+    load_decision_table,
+    verify,
+)
+from models import BodyRegion
+from rules import RULE_SETS, parse_rule_set
+
+
+def test_table_matches_pipeline(tmp_path):
+    path = str(tmp_path / "decision_table.bin")
+    compile_decision_table(path, RULE_SETS.current)
+    report = verify(load_decision_table(path, RULE_SETS.current), samples=20000)
+    assert report["mismatches"] == 0, report["examples"]
+
+
+def many_rules():
+    """The shipped rule set behind 324 reachable rules, so rule indices go past 255"""
+    spec = RULE_SETS.current.spec.model_dump(mode="json", exclude_defaults=True)
+    symptoms = sorted({symptom for rule in spec["redFlagRules"]
+                       for symptom in rule.get("allSymptoms", []) + rule.get("anySymptoms", [])})
+    result = spec["redFlagRules"][0]["result"]
+    extra = []
+    # Higher thresholds first, so every rule is the first match for its own intensity
+    for min_intensity in (10, 9, 8, 7):
+        for region in BodyRegion:
+            for symptom in symptoms:
+                extra.append({
+                    "id": f"extra_{min_intensity}_{region.value}_{symptom}",
+                    "regions": [region.value],
+                    "allSymptoms": [symptom],
+                    "minIntensity": min_intensity,
+                    "result": {**result, "redFlags": [f"extra {len(extra)}"]},
+                })
+    spec["redFlagRules"] = extra + spec["redFlagRules"]
+    spec["version"] = "test-many-rules"
+    return parse_rule_set(spec)
+
+
+def test_table_matches_pipeline_past_int8_rule_indices():
+    rules = many_rules()
+    assert len(rules.red_flags.rules) > 255
+    tables = compile_tables(rules)
+    assert tables["red_flags"].max() > 255
+    report = verify(DecisionTable(tables, rules), samples=20000)
+    assert report["mismatches"] == 0, report["examples"]
+
+
+def test_cell_budget():
+    with pytest.raises(TableTooLarge):
+        compile_tables(RULE_SETS.current, max_cells=1000)
+
+
+@pytest.mark.parametrize("count", [1, 127, 128, 129, 255, 256, 32768, 32769])
+def test_index_dtype_holds_every_index(count):
+    dtype = _index_dtype(count)
+    assert np.array([count - 1, -1], dtype=dtype).tolist() == [count - 1, -1]
@@ -0,0 +1,95 @@
+"""Enrichment queue workers and job stores"""
+
+import asyncio
+
+from enrichment import EnrichmentQueue, FileJobStore, InMemoryJobStore
+from models import EnrichmentStatus, SymptomDataRequest
+
+DATA = SymptomDataRequest(bodyRegion="chest", timestamp="2024-01-01T00:00:00Z")
+
+
+class StubAIService:
+    async def analyze_symptoms_async(self, data):
+        return {"explanation": "It may be muscular."}
+
+    def validate_response(self, response):
+        return True
+
+
+class FlakyStore(InMemoryJobStore):
+    """Fails every write of a running or finished job while `failing` is set"""
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.failing = True
+
+    def put(self, job):
+        if self.failing and job.status != EnrichmentStatus.pending:
+            raise OSError("disk full")
+        super().put(job)
+
+
+def test_store_failures_do_not_stop_the_workers():
+    store = FlakyStore()
+    queue = EnrichmentQueue(StubAIService(), store, workers=1)
+
+    async def run():
+        await queue.start()
+        try:
+            first = await queue.submit(DATA)
+            job = await queue.wait(first, 5)
+            assert job.status == EnrichmentStatus.pending
+            store.failing = False
+            second = await queue.submit(DATA)
+            return await queue.wait(second, 5)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(run())
+    assert job.status == EnrichmentStatus.completed
+    assert job.aiExplanation == "It may be muscular."
+
+
+def test_file_store_round_trip(tmp_path):
+    queue = EnrichmentQueue(StubAIService(), FileJobStore(str(tmp_path), max_jobs=2), workers=2)
+
+    async def run():
+        await queue.start()
+        try:
+            ids, jobs = [], []
+            for _ in range(3):
+                ids.append(await queue.submit(DATA))
+                jobs.append(await queue.wait(ids[-1], 5))
+            return ids, jobs
+        finally:
+            await queue.stop()
+
+    ids, jobs = asyncio.run(run())
+    assert [job.status for job in jobs[1:]] == [EnrichmentStatus.completed] * 2
+    assert sorted(path.stem for path in tmp_path.glob("*.json")) == sorted(ids[1:])
+
+
+class SlowAIService(StubAIService):
+    async def analyze_symptoms_async(self, data):
+        await asyncio.sleep(0.3)
+        return await super().analyze_symptoms_async(data)
+
+
+def test_long_poll_waits_for_a_job_run_by_another_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr("enrichment.ENRICHMENT_POLL_SECONDS", 0.02)
+    running = EnrichmentQueue(SlowAIService(), FileJobStore(str(tmp_path)), workers=1)
+    # Shares the directory but never ran the job
+    other = EnrichmentQueue(SlowAIService(), FileJobStore(str(tmp_path)), workers=1)
+
+    async def run():
+        await running.start()
+        try:
+            job_id = await running.submit(DATA)
+            assert (await other.wait(job_id, 0)).status == EnrichmentStatus.pending
+            return await other.wait(job_id, 5)
+        finally:
+            await running.stop()
+
+    assert asyncio.run(run()).status == EnrichmentStatus.completed
@@ -0,0 +1,22 @@
+"""Condition index lookups"""
+
+from knowledge_base import KnowledgeBase, KnowledgeBaseFile
+from models import BodyRegion, SymptomDataRequest
+from records import record_from_request
+
+
+def _condition(condition_id, **fields):
+    return {"id": condition_id, "name": condition_id, "description": "", "probability": 0.3,
+            "matchingSymptoms": [], **fields}
+
+
+def test_conditions_without_regions_match_every_region():
+    kb = KnowledgeBase(KnowledgeBaseFile.model_validate({
+        "version": "test",
+        "conditions": [_condition("anywhere"), _condition("chest_only", regions=["chest"])],
+        "fallback": _condition("fallback"),
+    }))
+    for region in BodyRegion:
+        record = record_from_request(SymptomDataRequest(bodyRegion=region, timestamp="2024-01-01T00:00:00Z"))
+        expected = [0, 1] if region == BodyRegion.chest else [0]
+        assert kb.candidate_indices(record) == expected
@@ -0,0 +1,49 @@
+"""Merging per-worker metric snapshots"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import metrics
+from metrics import merge_snapshots
+
+
+def _snapshot(directory, pid, requests, in_flight):
+    families = [
+        ["requests_total", "counter", "Requests", [[{"path": "/api/analyze"}, requests]]],
+        ["in_flight", "gauge", "Requests in flight", [[{}, in_flight]]],
+    ]
+    with open(os.path.join(directory, f"{pid}.json"), "w", encoding="utf-8") as f:
+        json.dump(families, f)
+
+
+def test_counters_are_summed_and_gauges_kept_per_running_worker(tmp_path):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    _snapshot(tmp_path, os.getpid(), 5, 3)
+    _snapshot(tmp_path, exited.pid, 7, 40)
+
+    merged = {name: (kind, samples) for name, kind, _, samples in merge_snapshots(str(tmp_path))}
+    assert merged["requests_total"] == ("counter", [({"path": "/api/analyze"}, 12.0)])
+    assert merged["in_flight"] == ("gauge", [({"pid": str(os.getpid())}, 3)])
+
+
+def test_snapshot_flush_survives_failed_writes(tmp_path, monkeypatch):
+    calls = []
+
+    def write_snapshot(directory):
+        calls.append(directory)
+        if len(calls) == 1:
+            raise OSError("disk full")
+
+    monkeypatch.setattr(metrics.REGISTRY, "write_snapshot", write_snapshot)
+
+    async def run():
+        task = asyncio.ensure_future(metrics.flush_snapshots(str(tmp_path), interval=0.01))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(calls) > 2
@@ -0,0 +1,133 @@
+"""Async provider clients against the stub server and scripted transports"""
+
+import asyncio
+import random
+
+import httpx
+import pytest
+
+import providers
+import stub_provider
+from providers import GeminiProvider, OpenAIProvider, ProviderConfig, ProviderError
+
+
+def _config(**overrides):
+    settings = {"api_key": "stub", "model": "stub", "backoff_base": 0.0, "backoff_max": 0.0}
+    settings.update(overrides)
+    return ProviderConfig("openai", "http://stub", **settings)
+
+
+async def _run(client, coroutine):
+    try:
+        return await coroutine
+    finally:
+        await client.aclose()
+
+
+@pytest.mark.parametrize("provider_class", [OpenAIProvider, GeminiProvider])
+def test_complete_and_stream_against_the_stub_server(provider_class):
+    client = provider_class(_config(), transport=httpx.ASGITransport(app=stub_provider.app))
+
+    async def calls():
+        text = await client.complete("system", "prompt")
+        streamed = "".join([chunk async for chunk in client.stream("system", "prompt")])
+        return text, streamed
+
+    assert asyncio.run(_run(client, calls())) == (stub_provider.STUB_EXPLANATION,) * 2
+
+
+def _scripted(statuses):
+    """Transport answering with the given statuses in turn; records each request"""
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        status = statuses[min(len(seen), len(statuses)) - 1]
+        return httpx.Response(status, json={"choices": [{"message": {"content": "ok"}}]})
+
+    return httpx.MockTransport(handler), seen
+
+
+def test_retryable_statuses_are_retried_with_backoff(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(providers.asyncio, "sleep", sleep)
+    transport, seen = _scripted([503, 429, 200])
+    client = OpenAIProvider(_config(max_retries=2, backoff_base=0.5, backoff_max=0.75), transport=transport)
+    assert asyncio.run(_run(client, client.complete("system", "prompt"))) == "ok"
+    assert len(seen) == 3
+    # Full jitter under min(backoff_max, backoff_base * 2 ** attempt)
+    assert len(delays) == 2 and 0 <= delays[0] <= 0.5 and 0 <= delays[1] <= 0.75
+
+
+def test_retries_are_bounded():
+    transport, seen = _scripted([503])
+    client = OpenAIProvider(_config(max_retries=2), transport=transport)
+    with pytest.raises(ProviderError, match="after 3 attempts"):
+        asyncio.run(_run(client, client.complete("system", "prompt")))
+    assert len(seen) == 3
+
+
+def test_client_errors_are_not_retried():
+    transport, seen = _scripted([401])
+    client = OpenAIProvider(_config(max_retries=2), transport=transport)
+    with pytest.raises(ProviderError):
+        asyncio.run(_run(client, client.complete("system", "prompt")))
+    assert len(seen) == 1
+
+
+def test_backoff_delay_is_jittered_under_the_ceiling():
+    client = OpenAIProvider(_config(backoff_base=0.25, backoff_max=1.0))
+    random.seed(3)
+    delays = [client.backoff_delay(attempt) for attempt in range(6) for _ in range(50)]
+    ceilings = [min(1.0, 0.25 * 2 ** attempt) for attempt in range(6) for _ in range(50)]
+    assert all(0 <= delay <= ceiling for delay, ceiling in zip(delays, ceilings))
+    assert len(set(delays)) == len(delays)
+
+
+def test_timeouts_are_retried_then_reported():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    client = OpenAIProvider(_config(max_retries=1), transport=httpx.MockTransport(handler))
+    with pytest.raises(ProviderError, match="timed out"):
+        asyncio.run(_run(client, client.complete("system", "prompt")))
+    assert len(attempts) == 2
+
+
+def test_configured_timeout_is_applied():
+    client = OpenAIProvider(_config(timeout=0.05))
+    assert client.client.timeout == httpx.Timeout(0.05)
+    asyncio.run(client.aclose())
+
+
+def test_semaphore_caps_calls_in_flight():
+    in_flight = [0, 0]
+
+    async def handler(request):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    client = OpenAIProvider(_config(max_concurrency=3), transport=httpx.MockTransport(handler))
+
+    async def burst():
+        return await asyncio.gather(*(client.complete("system", "prompt") for _ in range(20)))
+
+    assert asyncio.run(_run(client, burst())) == ["ok"] * 20
+    assert in_flight[1] == 3
+
+
+def test_fake_provider_failures_raise_provider_errors():
+    client = stub_provider.FakeProvider("fake", failure_rate=1.0)
+    with pytest.raises(ProviderError):
+        asyncio.run(client.complete("system", "prompt"))
+    assert client.calls == 1
@@ -0,0 +1,50 @@
+"""NDJSON replay chunking and line splitting"""
+
+import asyncio
+import json
+
+from replay import OVERSIZED_LINE, replay_lines, replay_stream, split_lines
+
+VALID = json.dumps({"bodyRegion": "headFront", "intensity": 4, "timestamp": "2024-01-01T00:00:00"})
+
+
+async def _blocks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+def _output(blocks):
+    return [json.loads(line) for block in blocks for line in block.splitlines()]
+
+
+def test_invalid_only_input_is_flushed_per_chunk():
+    blocks = list(replay_lines(("not json" for _ in range(5000)), chunk_size=10))
+    assert len(blocks) == 500
+    lines = _output(blocks)
+    assert [line["line"] for line in lines] == list(range(1, 5001))
+    assert all("error" in line for line in lines)
+
+
+def test_mixed_input_keeps_line_numbers():
+    lines = _output(replay_lines([VALID, "{", "", VALID], chunk_size=2))
+    assert [line["line"] for line in lines] == [1, 2, 4]
+    assert "result" in lines[0] and "error" in lines[1] and "result" in lines[2]
+
+
+def test_split_lines_caps_line_length():
+    data = b"a\n" + b"x" * 100 + b"\nb\n" + b"y" * 30 + b"\nc"
+    lines = asyncio.run(_collect(split_lines(_blocks(data, 7), max_line_bytes=20)))
+    assert lines == [b"a", OVERSIZED_LINE, b"b", OVERSIZED_LINE, b"c"]
+
+
+def test_oversized_line_is_answered_with_an_error():
+    data = (VALID + "\n" + "x" * 5000 + "\n" + VALID + "\n").encode()
+    blocks = asyncio.run(_collect(replay_stream(_blocks(data, 64), chunk_size=10, max_line_bytes=1000)))
+    lines = _output(blocks)
+    assert [line["line"] for line in lines] == [1, 2, 3]
+    assert "result" in lines[0] and "result" in lines[2]
+    assert lines[1]["error"] == "line is longer than 1000 bytes"
@@ -0,0 +1,120 @@
+"""Circuit breakers, failover and caching of routed AI responses"""
+
+import asyncio
+
+from ai_cache import SQLiteResponseCache
+from ai_service import AIService
+from metrics import AI_RESPONSES_TOTAL
+from router import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderRouter
+from safety import UnsafeContentError
+from stub_provider import FakeProvider
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, cooldown=10, clock=Clock())
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    breaker.record_success()
+    # A success resets the count
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.available()
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failures=1, cooldown=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 9.9
+    assert breaker.state == OPEN
+    clock.now = 10.0
+    assert breaker.state == HALF_OPEN and breaker.available()
+
+    breaker.begin()
+    assert not breaker.available()
+    # An abandoned probe frees the slot for another
+    breaker.cancelled()
+    assert breaker.available()
+
+    breaker.begin()
+    assert breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now = 20.0
+    breaker.begin()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.available()
+
+
+def _service(tmp_path, primary, fallback):
+    clients = {"primary": primary, "fallback": fallback}
+    router = ProviderRouter(list(clients), resolve=clients.__getitem__,
+                            breaker_failures=1, breaker_cooldown=60)
+    cache = SQLiteResponseCache(str(tmp_path / "cache.db"))
+    return AIService(provider="primary", response_cache=cache, router=router)
+
+
+SYMPTOMS = {"bodyRegion": "chest", "intensity": 4}
+TEXT = "This may possibly be muscular. Please consult a healthcare professional."
+
+
+def test_fallback_answers_are_not_cached_under_the_primary(tmp_path):
+    primary = FakeProvider("primary", failure_rate=1.0, text=TEXT)
+    fallback = FakeProvider("fallback", text=TEXT.replace("muscular", "tension"))
+    service = _service(tmp_path, primary, fallback)
+    before = AI_RESPONSES_TOTAL.values().get(("fallback", "provider"), 0)
+
+    response = asyncio.run(service.analyze_symptoms_async(SYMPTOMS))
+    assert "tension" in response["explanation"]
+    assert service.router.breakers["primary"].state == OPEN
+    assert AI_RESPONSES_TOTAL.values()[("fallback", "provider")] == before + 1
+    assert service.response_cache.stats()["entries"] == 0
+
+    # Once the primary is healthy again, its answer is the one cached
+    primary.failure_rate = 0.0
+    service.router.breakers["primary"].record_success()
+    service.router.stats_by_provider["primary"].outcomes.clear()
+    response = asyncio.run(service.analyze_symptoms_async(SYMPTOMS))
+    assert "muscular" in response["explanation"]
+    assert service.response_cache.stats()["entries"] == 1
+    service.response_cache.close()
+
+
+def test_streams_from_a_fallback_are_labelled_and_not_cached(tmp_path):
+    primary = FakeProvider("primary", text=TEXT)
+    fallback = FakeProvider("fallback", text=TEXT)
+    service = _service(tmp_path, primary, fallback)
+    service.router.breakers["primary"].record_failure()
+    before = AI_RESPONSES_TOTAL.values().get(("fallback", "provider"), 0)
+
+    async def collect():
+        return "".join([chunk async for chunk in service.stream_explanation(SYMPTOMS)])
+
+    assert asyncio.run(collect()) == TEXT
+    assert (primary.calls, fallback.calls) == (0, 1)
+    assert AI_RESPONSES_TOTAL.values()[("fallback", "provider")] == before + 1
+    assert service.response_cache.stats()["entries"] == 0
+    service.response_cache.close()
+
+
+def test_unsafe_responses_are_rejected_for_every_coalesced_caller(tmp_path):
+    primary = FakeProvider("primary", latency=0.05, text="You have a fracture. Take 400 mg twice a day.")
+    service = _service(tmp_path, primary, FakeProvider("fallback", failure_rate=1.0))
+
+    async def burst():
+        return await asyncio.gather(*(service.analyze_symptoms_async(SYMPTOMS) for _ in range(5)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert all(isinstance(result, UnsafeContentError) for result in results)
+    assert primary.calls == 1
+    assert service.response_cache.stats()["entries"] == 0
+    service.response_cache.close()
@@ -0,0 +1,73 @@
+"""Bitmask rule engines against a direct reading of the rule set file"""
+
+import random
+
+import pytest
+
+from models import AssociatedSymptom, BodyRegion, SymptomDataRequest, SymptomDuration, UrgencyLevel
+from rules import (
+    REGION_BITS,
+    RULE_SETS,
+    RedFlagRule,
+    RuleSetError,
+    intensity_bit,
+    parse_rule_set,
+    symptom_mask,
+)
+
+
+def random_request(rng: random.Random) -> SymptomDataRequest:
+    return SymptomDataRequest(
+        bodyRegion=rng.choice(list(BodyRegion)),
+        intensity=rng.choice([None, rng.randint(-2, 14)]),
+        duration=rng.choice([None, *SymptomDuration]),
+        associatedSymptoms=[s for s in AssociatedSymptom if rng.random() < 0.15],
+        timestamp="",
+    )
+
+
+def reference_red_flag(spec, data):
+    symptoms = set(data.associatedSymptoms)
+    intensity = data.intensity or 0
+    for rule in spec.redFlagRules:
+        if ((not rule.regions or data.bodyRegion in rule.regions)
+                and set(rule.allSymptoms) <= symptoms
+                and (not rule.anySymptoms or symptoms & set(rule.anySymptoms))
+                and (rule.minIntensity is None or intensity >= rule.minIntensity)):
+            return rule.id
+    return None
+
+
+def reference_urgency(spec, data):
+    intensity = data.intensity or 0
+    for rule in spec.urgencyRules:
+        if ((rule.minIntensity is not None and intensity >= rule.minIntensity)
+                or set(rule.anySymptoms) & set(data.associatedSymptoms)
+                or data.duration in rule.durations):
+            return rule.level
+    return UrgencyLevel.low
+
+
+def test_engines_match_reference():
+    rules = RULE_SETS.current
+    rng = random.Random(5)
+    for _ in range(20000):
+        data = random_request(rng)
+        rule = rules.red_flags.match(REGION_BITS[data.bodyRegion], symptom_mask(data.associatedSymptoms),
+                                     intensity_bit(data.intensity))
+        assert (rule.rule_id if rule else None) == reference_red_flag(rules.spec, data)
+        assert rules.urgency.evaluate(data) == reference_urgency(rules.spec, data)
+
+
+def test_rule_without_conditions_is_rejected():
+    with pytest.raises(ValueError):
+        RedFlagRule.model_validate({"id": "empty", "result": {
+            "possibleCauses": [], "guidance": "g", "redFlags": ["x"], "aiExplanation": "e",
+        }})
+
+
+def test_duplicate_rule_ids_are_rejected():
+    spec = RULE_SETS.current.spec.model_dump(mode="json")
+    spec["redFlagRules"].append(spec["redFlagRules"][0])
+    with pytest.raises(RuleSetError):
+        parse_rule_set(spec)
@@ -0,0 +1,63 @@
+"""Safety validator and the incremental filter for streamed explanations"""
+
+import random
+
+import pytest
+
+from safety import (
+    DEFAULT_VALIDATOR,
+    FORBIDDEN_DIAGNOSIS_PHRASES,
+    FORBIDDEN_MEDICATION_PHRASES,
+    IncrementalSafetyFilter,
+    UnsafeContentError,
+)
+
+SAFE = ("Chest discomfort like this may have several possible causes, some of them muscular. "
+        "It could also be related to posture or recent exercise. Please consult a "
+        "healthcare professional for a proper evaluation. ")
+UNSAFE = FORBIDDEN_DIAGNOSIS_PHRASES + FORBIDDEN_MEDICATION_PHRASES + [
+    "400 mg", "twice a day", "every 6 hours",
+]
+
+
+def _chunks(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, min(40, len(text) - 1))))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def _stream(chunks):
+    """Text released before the stream ended or was aborted, and whether it was aborted"""
+    safety_filter = IncrementalSafetyFilter(DEFAULT_VALIDATOR)
+    released = []
+    try:
+        for chunk in chunks:
+            released.append(safety_filter.feed(chunk))
+    except UnsafeContentError:
+        return "".join(released), True
+    return "".join(released) + safety_filter.finish(), False
+
+
+def test_safe_text_is_released_unchanged():
+    rng = random.Random(1)
+    for _ in range(200):
+        assert _stream(_chunks(SAFE * 3, rng)) == (SAFE * 3, False)
+
+
+@pytest.mark.parametrize("phrase", UNSAFE)
+def test_no_part_of_an_unsafe_phrase_is_released(phrase):
+    text = SAFE + "Honestly, " + phrase.capitalize() + " for now. " + SAFE
+    start = len(SAFE) + len("Honestly, ")
+    rng = random.Random(phrase)
+    chunkings = [[text[:cut], text[cut:]] for cut in range(start, start + len(phrase) + 1)]
+    chunkings += [_chunks(text, rng) for _ in range(200)]
+    for chunks in chunkings:
+        released, aborted = _stream(chunks)
+        assert aborted
+        assert len(released) <= start
+        assert DEFAULT_VALIDATOR.is_safe_text(released)
+
+
+def test_validator_requires_a_disclaimer():
+    assert DEFAULT_VALIDATOR.validate({"explanation": SAFE, "disclaimer": "Not medical advice."})
+    assert not DEFAULT_VALIDATOR.validate({"explanation": SAFE, "disclaimer": ""})
+    assert not DEFAULT_VALIDATOR.validate({"explanation": "You have angina.", "disclaimer": "x"})
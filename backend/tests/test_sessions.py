@@ -0,0 +1,48 @@
+"""Incremental session triage against the full pipeline"""
+
+import random
+
+from analysis import analyze
+from models import AssociatedSymptom, BodyRegion, Onset, PainType, SessionUpdate, SymptomDuration, Trigger
+from rules import RULE_SETS
+from sessions import Session
+
+TIMESTAMP = "2024-01-01T00:00:00Z"
+
+
+def _random_update(rng):
+    fields = {}
+    if rng.random() < 0.4:
+        fields["bodyRegion"] = rng.choice(list(BodyRegion))
+    if rng.random() < 0.3:
+        fields["painType"] = rng.choice([None, *PainType])
+    if rng.random() < 0.4:
+        fields["intensity"] = rng.choice([None, *range(1, 11)])
+    if rng.random() < 0.3:
+        fields["duration"] = rng.choice([None, *SymptomDuration])
+    if rng.random() < 0.2:
+        fields["onset"] = rng.choice([None, *Onset])
+    symptoms = list(AssociatedSymptom)
+    triggers = list(Trigger)
+    fields["addSymptoms"] = rng.sample(symptoms, rng.randint(0, 2))
+    fields["removeSymptoms"] = rng.sample(symptoms, rng.randint(0, 2))
+    fields["addTriggers"] = rng.sample(triggers, rng.randint(0, 1))
+    fields["removeTriggers"] = rng.sample(triggers, rng.randint(0, 1))
+    return SessionUpdate(**fields)
+
+
+def test_incremental_result_matches_full_analysis():
+    rng = random.Random(7)
+    for n in range(200):
+        session = Session(f"s{n}", RULE_SETS.current)
+        for _ in range(rng.randint(1, 8)):
+            update = _random_update(rng)
+            predicted = session.would_be_emergency(update)
+            session.apply(update)
+            result = session.result()
+            if session.fields["bodyRegion"] is None:
+                assert predicted == (result is not None and bool(result.redFlags))
+                continue
+            expected = analyze(session.to_request(TIMESTAMP))
+            assert result == expected
+            assert predicted == bool(expected.redFlags)
@@ -0,0 +1,70 @@
+"""Call coalescing for concurrent identical requests"""
+
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", call) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+    assert flight.stats() == {"inFlight": 0, "leaders": 1, "followers": 4, "coalescedRate": 0.8}
+
+
+def test_errors_reach_every_waiter_and_the_key_is_forgotten():
+    flight = SingleFlight()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def succeeding():
+        return "recovered"
+
+    async def run():
+        outcomes = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+        return outcomes, await flight.do("key", succeeding)
+
+    outcomes, after = asyncio.run(run())
+    assert calls == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert after == ("recovered", False)
+
+
+def test_cancelled_caller_does_not_cancel_the_call():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def run():
+        leader = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == ("answer", True)
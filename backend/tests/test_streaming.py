@@ -0,0 +1,63 @@
+"""Server-sent event sequence for streamed analyses"""
+
+import asyncio
+import json
+
+from ai_service import AIService
+from analysis import analyze
+from models import SymptomDataRequest
+from router import ProviderRouter
+from streaming import analysis_events
+from stub_provider import STUB_EXPLANATION, FakeProvider
+
+DATA = SymptomDataRequest(bodyRegion="headFront", intensity=3, timestamp="2024-01-01T00:00:00Z")
+UNSAFE = STUB_EXPLANATION + " You have a migraine, so take 400 mg of ibuprofen every 6 hours."
+
+
+def _service(provider):
+    router = ProviderRouter(["stub"], resolve=lambda name: provider)
+    return AIService(provider="stub", router=router)
+
+
+def _events(data, service):
+    async def collect():
+        return [event async for event in analysis_events(data, analyze(data), service)]
+
+    parsed = []
+    for event in asyncio.run(collect()):
+        name, payload = event.strip().split("\n")
+        parsed.append((name[len("event: "):], json.loads(payload[len("data: "):])))
+    return parsed
+
+
+def test_complete_stream():
+    events = _events(DATA, _service(FakeProvider("stub")))
+    names = [name for name, _ in events]
+    assert names[0] == "triage" and names[-2:] == ["disclaimer", "done"]
+    assert "".join(payload["text"] for name, payload in events if name == "explanation") == STUB_EXPLANATION
+
+
+def test_unsafe_explanation_aborts_before_the_unsafe_text():
+    events = _events(DATA, _service(FakeProvider("stub", text=UNSAFE)))
+    names = [name for name, _ in events]
+    assert names[-1] == "abort" and "done" not in names
+    assert events[-1][1] == {"reason": "AI explanation failed safety validation"}
+    released = "".join(payload["text"] for name, payload in events if name == "explanation")
+    assert UNSAFE.startswith(released)
+    assert len(released) <= UNSAFE.index("You have")
+
+
+def test_provider_failure_aborts():
+    events = _events(DATA, _service(FakeProvider("stub", failure_rate=1.0)))
+    assert [name for name, _ in events] == ["triage", "abort"]
+    assert events[-1][1]["reason"].startswith("AI explanation unavailable")
+
+
+def test_shed_and_emergency_streams_skip_the_provider():
+    provider = FakeProvider("stub")
+    assert [name for name, _ in _events(DATA, None)] == ["triage", "abort"]
+    emergency = SymptomDataRequest(bodyRegion="chest", intensity=9, associatedSymptoms=["shortnessOfBreath"],
+                                   timestamp="2024-01-01T00:00:00Z")
+    events = _events(emergency, _service(provider))
+    assert [name for name, _ in events] == ["triage", "done"]
+    assert events[0][1]["isEmergency"] and provider.calls == 0